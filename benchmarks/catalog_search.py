@@ -0,0 +1,98 @@
+"""
+Benchmark building, refreshing and searching the song catalog
+
+Usage:
+    python benchmarks/catalog_search.py [<numsongs>]
+
+Writes a temporary library of songs (10000 by default), each with a title,
+lyrics and comments drawn from a small vocabulary, and catalogs it.  It
+prints the time taken to build the catalog from scratch, to refresh it when
+nothing has changed, to refresh it after one song has changed, to list the
+index, and to run a few searches against it.
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import timeit
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pyleadsheet import catalog  # noqa: E402
+
+WORDS = (
+    'love', 'night', 'river', 'home', 'road', 'blue', 'heart', 'rain', 'morning', 'train',
+    'gold', 'summer', 'dance', 'fire', 'moon', 'whiskey', 'lonesome', 'highway', 'angel',
+    'sweet', 'baby', 'down', 'long', 'time', 'wind', 'mountain', 'sea', 'dream', 'city',
+)
+QUERIES = ('love', 'lonesome highway', 'moon river dance', 'song 1234', 'nothing')
+SONG_TEMPLATE = """title: {title}
+key: C
+time: 4/4
+progressions:
+  - name: A
+    chords: "[C][F][G][C]"
+    comment: {comment} over [F]
+form:
+  - progression: A
+    lyrics: |
+      {lyrics1}
+      {lyrics2}
+  - progression: A
+    comment: {comment}
+    lyrics: {lyrics3}
+"""
+
+
+def _words(rand, count):
+    return ' '.join(rand.choice(WORDS) for _ in range(count))
+
+
+def _write_library(dirpath, num_songs):
+    rand = random.Random(0)
+    filepaths = []
+    for i in range(num_songs):
+        filepath = os.path.join(dirpath, 'song_{}.yaml'.format(i))
+        with open(filepath, 'w') as song_file:
+            song_file.write(SONG_TEMPLATE.format(
+                title='{} song {}'.format(_words(rand, 2), i), comment=_words(rand, 3),
+                lyrics1=_words(rand, 8), lyrics2=_words(rand, 8), lyrics3=_words(rand, 8)
+            ))
+        filepaths.append(filepath)
+    return filepaths
+
+
+def _time(name, func):
+    start = time.time()
+    ret = func()
+    print('{:<26}{:10.1f}ms'.format(name + ':', (time.time() - start) * 1000))
+    return ret
+
+
+def main():
+    num_songs = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    dirpath = tempfile.mkdtemp()
+    try:
+        filepaths = _write_library(dirpath, num_songs)
+        song_catalog = catalog.SongCatalog(os.path.join(dirpath, catalog.CATALOG_FILENAME))
+        print('songs:                    {:10d}'.format(num_songs))
+        _time('build', lambda: song_catalog.update(filepaths))
+        _time('refresh (unchanged)', lambda: song_catalog.update(filepaths))
+        with open(filepaths[0], 'a') as song_file:
+            song_file.write('feel: swing\n')
+        _time('refresh (one changed)', lambda: song_catalog.update(filepaths))
+        _time('index entries', lambda: list(song_catalog.iter_index_entries()))
+        for query in QUERIES:
+            msec = min(timeit.repeat(lambda: song_catalog.search(query), number=10, repeat=3))
+            print('{:<26}{:10.2f}ms ({} songs)'.format(
+                'search "{}":'.format(query), msec / 10 * 1000, len(song_catalog.search(query))
+            ))
+        song_catalog.close()
+    finally:
+        shutil.rmtree(dirpath)
+
+
+if __name__ == '__main__':
+    main()
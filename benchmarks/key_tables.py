@@ -0,0 +1,130 @@
+"""
+Benchmark key construction and the key properties used by every song view
+
+Usage:
+    python benchmarks/key_tables.py
+
+Times Key construction, Key.get, relative_major, relative_minor and
+transposable_roots against a copy of the previous implementation.  That
+implementation rebuilt the chromatic scales and searched them for a
+spelling every time a key was made, and tried all 21 roots to find the
+transposable ones.
+"""
+
+import os
+import sys
+import string
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pyleadsheet import models  # noqa: E402
+
+KEYS = ('C', 'G-', 'Bb', 'F#-', 'Db', 'E')
+
+
+def _legacy_chromatic_table(excluded_accidental=None):
+    ret = []
+    for note, index in models.Note._chromatic_index_map.items():
+        if excluded_accidental and excluded_accidental in note:
+            continue
+        if len(ret) == index:
+            ret.append([models.Note(note)])
+        else:
+            ret[-1].append(models.Note(note))
+    return ret
+
+
+def _legacy_diatonic_notes(root, mode, note_lookup_list):
+    ret = []
+    current_note = root
+    next_note_i = root.chromatic_index
+    for half_steps in mode.half_steps_pattern:
+        ret.append(current_note)
+        current_letter_i = string.ascii_uppercase.find(current_note[0])
+        next_note_i = (next_note_i + half_steps) % 12
+        for next_note in note_lookup_list[next_note_i]:
+            good_note = False
+            next_letter_i = string.ascii_uppercase.find(next_note[0])
+            if next_letter_i - current_letter_i in (1, -6):
+                good_note = True
+                break
+        if not good_note:
+            return None
+        current_note = next_note
+    return ret
+
+
+class LegacyKey(object):
+
+    def __init__(self, content, mode=None):
+        self.root, remainder = models.Note.split_str(content)
+        self.mode = mode
+        if not mode:
+            for mode in models.Mode.all():
+                if remainder in mode.shorthand:
+                    self.mode = mode
+        for lookup in (_legacy_chromatic_table('b'), _legacy_chromatic_table('#')):
+            self.diatonic_notes = _legacy_diatonic_notes(self.root, self.mode, lookup)
+            if self.diatonic_notes:
+                break
+        if not self.diatonic_notes:
+            raise ValueError('{} is not a realistic key'.format(content))
+
+    @property
+    def relative_major(self):
+        return LegacyKey(self.diatonic_notes[(1 - self.mode.ionian_interval) % 7])
+
+    @property
+    def relative_minor(self):
+        return LegacyKey(
+            self.diatonic_notes[(6 - self.mode.ionian_interval) % 7], mode=models.Mode.Aeolian
+        )
+
+    @property
+    def transposable_roots(self):
+        ret = []
+        for notes in _legacy_chromatic_table():
+            for note in notes:
+                try:
+                    LegacyKey(note, mode=self.mode)
+                    ret.append(note)
+                except ValueError:
+                    pass
+        return ret
+
+
+def _time(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number / len(KEYS) * 1e6
+
+
+def main():
+    legacy_keys = [LegacyKey(content) for content in KEYS]
+    keys = [models.Key.get(content) for content in KEYS]
+    cases = (
+        ('construct', 200,
+         lambda: [LegacyKey(content) for content in KEYS],
+         lambda: [models.Key(content) for content in KEYS]),
+        ('Key.get', 200,
+         lambda: [LegacyKey(content) for content in KEYS],
+         lambda: [models.Key.get(content) for content in KEYS]),
+        ('relative_major', 200,
+         lambda: [key.relative_major for key in legacy_keys],
+         lambda: [key.relative_major for key in keys]),
+        ('relative_minor', 200,
+         lambda: [key.relative_minor for key in legacy_keys],
+         lambda: [key.relative_minor for key in keys]),
+        ('transposable_roots', 20,
+         lambda: [key.transposable_roots for key in legacy_keys],
+         lambda: [key.transposable_roots for key in keys]),
+    )
+    print('{:>20} {:>14} {:>14} {:>9}'.format(
+        'operation', 'before (usec)', 'after (usec)', 'speedup'
+    ))
+    for name, number, before_func, after_func in cases:
+        before = _time(before_func, number)
+        after = _time(after_func, number * 10)
+        print('{:>20} {:>14.2f} {:>14.2f} {:>8.0f}x'.format(name, before, after, before / after))
+
+
+if __name__ == '__main__':
+    main()
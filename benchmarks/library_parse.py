@@ -0,0 +1,135 @@
+"""
+Benchmark notes and parsing a whole library of songs
+
+Usage:
+    python benchmarks/library_parse.py [<numsongs>]
+
+Times the Note operations used while parsing and transposing, and shows
+the size of a Note instance.  It then writes a temporary library of songs
+(1000 by default), each in its own key and with a varied progression, and
+parses every file without the song cache.  Every lazily parsed field is
+resolved.  It prints the time taken, the memory held by the parsed songs
+(measured with tracemalloc) and the number of distinct Note objects they
+refer to.  To compare two checkouts, run this script from each of them.
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import timeit
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pyleadsheet import models, parser  # noqa: E402
+
+ROOTS = ('A', 'Bb', 'B', 'C', 'C#', 'Db', 'D', 'Eb', 'E', 'F', 'F#', 'Gb', 'G', 'Ab')
+SPECS = ('', '7', '-7', 'maj7', '7b9', '-7b5', 'sus4', '13', 'dim7', '+')
+KEYS = ('C', 'F', 'Bb', 'Eb', 'Ab', 'Db', 'G', 'D', 'A', 'E', 'B', 'F#', 'C-', 'G-', 'D-')
+SONG_TEMPLATE = """title: Benchmark Song {i}
+key: {key}
+time: 4/4
+progressions:
+  - name: A
+    chords: "{a_chords}"
+    comment: watch the {comment_chord}
+  - name: B
+    chords: "{b_chords}"
+form:
+  - progression: A
+    reps: 2
+  - progression: B
+  - progression: A
+"""
+
+
+def _random_chord(rand):
+    chord = rand.choice(ROOTS) + rand.choice(SPECS)
+    if rand.random() < 0.3:
+        chord += '/' + rand.choice(ROOTS)
+    return chord
+
+
+def _random_chords(rand, count):
+    return ''.join('[{}]'.format(_random_chord(rand)) for _ in range(count))
+
+
+def _write_library(dirpath, num_songs):
+    rand = random.Random(0)
+    filepaths = []
+    for i in range(num_songs):
+        filepath = os.path.join(dirpath, 'song_{}.yaml'.format(i))
+        with open(filepath, 'w') as song_file:
+            song_file.write(SONG_TEMPLATE.format(
+                i=i, key=KEYS[i % len(KEYS)], a_chords=_random_chords(rand, 16),
+                b_chords=_random_chords(rand, 8), comment_chord=_random_chords(rand, 1)
+            ))
+        filepaths.append(filepath)
+    return filepaths
+
+
+def _resolve(data, notes):
+    if isinstance(data, models.Note):
+        notes.add(id(data))
+    elif isinstance(data, models.Chord):
+        for part in (data.root, data.base):
+            _resolve(part, notes)
+    elif isinstance(data, models.Key):
+        _resolve(data.root, notes)
+    elif isinstance(data, (dict, models.LazyDict)):
+        for value in data.values():
+            _resolve(value, notes)
+    elif isinstance(data, list):
+        for value in data:
+            _resolve(value, notes)
+
+
+def _time_note_operations():
+    note = models.Note('Eb')
+    cases = (
+        ('Note()', lambda: models.Note('eb')),
+        ('Note.split_str', lambda: models.Note.split_str('Bb-7')),
+        ('chromatic_index', lambda: note.chromatic_index),
+        ('enharmonic', lambda: note.enharmonic_equivalent),
+    )
+    for name, func in cases:
+        usec = min(timeit.repeat(func, number=20000, repeat=3)) / 20000 * 1e6
+        print('{:<17}{:8.3f}usec'.format(name + ':', usec))
+    print('{:<17}{:8d}bytes{}'.format(
+        'Note size:', sys.getsizeof(note), '' if hasattr(note, '__dict__') else ' (no __dict__)'
+    ))
+
+
+def _parse_library(num_songs):
+    dirpath = tempfile.mkdtemp()
+    try:
+        filepaths = _write_library(dirpath, num_songs)
+        notes = set()
+        tracemalloc.start()
+        start = time.time()
+        songs = [parser.parse_file(filepath, use_cache=False) for filepath in filepaths]
+        for song in songs:
+            _resolve(song, notes)
+        seconds = time.time() - start
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print('songs:           {:8d}'.format(num_songs))
+        print('parse time:      {:8.3f}s'.format(seconds))
+        print('retained memory: {:8.1f}MiB (peak {:.1f}MiB)'.format(
+            current / 2 ** 20, peak / 2 ** 20
+        ))
+        print('Note objects:    {:8d}'.format(len(notes)))
+    finally:
+        shutil.rmtree(dirpath)
+
+
+def main():
+    num_songs = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    _time_note_operations()
+    _parse_library(num_songs)
+
+
+if __name__ == '__main__':
+    main()
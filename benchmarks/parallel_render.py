@@ -0,0 +1,115 @@
+"""
+Benchmark rendering a library of songs with increasing numbers of jobs
+
+Usage:
+    python benchmarks/parallel_render.py [<numsongs>] [<maxjobs>]
+
+Writes a temporary library of songs (200 by default) and renders every view
+of each song, the way "pyleadsheet generate --jobs N" does, with 1, 2, 4, ...
+jobs up to maxjobs (by default, the number of CPUs).  Each run starts from an
+empty output directory and a cold song cache.  It prints the time taken and
+the speedup over one job, and checks that every run wrote exactly the same
+files.
+"""
+
+import os
+import sys
+import time
+import random
+import shutil
+import hashlib
+import datetime
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pyleadsheet import parser, renderer  # noqa: E402
+
+ROOTS = ('A', 'Bb', 'B', 'C', 'Db', 'D', 'Eb', 'E', 'F', 'Gb', 'G', 'Ab')
+SPECS = ('', '7', '-7', 'maj7', 'sus4', '13', 'dim7')
+SONG_TEMPLATE = """title: Benchmark Song {i}
+key: {key}
+time: 4/4
+progressions:
+  - name: A
+    chords: "{a_chords}"
+  - name: B
+    chords: "{b_chords}"
+form:
+  - progression: A
+    reps: 2
+    lyrics: |
+      {lyrics}
+  - progression: B
+  - progression: A
+"""
+
+
+def _write_library(dirpath, num_songs):
+    rand = random.Random(0)
+    filepaths = []
+    for i in range(num_songs):
+        filepath = os.path.join(dirpath, 'song_{}.yaml'.format(i))
+        with open(filepath, 'w') as song_file:
+            song_file.write(SONG_TEMPLATE.format(
+                i=i, key=ROOTS[i % len(ROOTS)],
+                a_chords=''.join('[{}{}]'.format(
+                    rand.choice(ROOTS), rand.choice(SPECS)) for _ in range(16)
+                ),
+                b_chords=''.join('[{}{}]'.format(
+                    rand.choice(ROOTS), rand.choice(SPECS)) for _ in range(8)
+                ),
+                lyrics=' '.join('la' for _ in range(24))
+            ))
+        filepaths.append(filepath)
+    return filepaths
+
+
+def _digest(outputdir):
+    digest = hashlib.sha1()
+    for dirpath, dirnames, filenames in sorted(os.walk(outputdir)):
+        for filename in sorted(filenames):
+            filepath = os.path.join(dirpath, filename)
+            digest.update(os.path.relpath(filepath, outputdir).encode('utf-8'))
+            with open(filepath, 'rb') as output_file:
+                digest.update(output_file.read())
+    return digest.hexdigest()
+
+
+def _render(filepaths, jobs, timestamp):
+    outputdir = tempfile.mkdtemp()
+    parser.song_cache.clear()
+    try:
+        html_renderer = renderer.HTMLRenderer(outputdir, timestamp=timestamp)
+        start = time.time()
+        html_renderer.render_songs(((filepath, None) for filepath in filepaths), jobs=jobs)
+        seconds = time.time() - start
+        return seconds, _digest(outputdir)
+    finally:
+        shutil.rmtree(outputdir)
+
+
+def main():
+    num_songs = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    max_jobs = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    dirpath = tempfile.mkdtemp()
+    try:
+        filepaths = _write_library(dirpath, num_songs)
+        timestamp = datetime.datetime(2000, 1, 1)
+        jobs, digests = 1, set()
+        print('{:>5} {:>10} {:>8}'.format('jobs', 'seconds', 'speedup'))
+        while True:
+            seconds, digest = _render(filepaths, jobs, timestamp)
+            if jobs == 1:
+                serial_seconds = seconds
+            digests.add(digest)
+            print('{:>5} {:>10.2f} {:>7.2f}x'.format(jobs, seconds, serial_seconds / seconds))
+            if jobs >= max_jobs:
+                break
+            jobs = min(jobs * 2, max_jobs)
+        print('identical output: {}'.format('yes' if len(digests) == 1 else 'NO'))
+    finally:
+        shutil.rmtree(dirpath)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Benchmark parser.parse_many across worker counts
+
+Usage:
+    python benchmarks/parse_many.py [<numsongs>]
+
+Writes a temporary library of songs (2000 by default) and parses all of
+them with 1, 2, 4 and 8 worker processes.  Caching is disabled between
+runs, so every run parses every file.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pyleadsheet import parser  # noqa: E402
+from song_metadata import _write_library  # noqa: E402
+
+JOBS = (1, 2, 4, 8)
+
+
+def main():
+    num_songs = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    dirpath = tempfile.mkdtemp()
+    try:
+        filepaths = _write_library(dirpath, num_songs)
+        print('songs: {}  cpus: {}'.format(num_songs, os.cpu_count()))
+        baseline = None
+        for jobs in JOBS:
+            parser.song_cache.clear()
+            start = time.time()
+            results = parser.parse_many(filepaths, jobs=jobs, shared=True)
+            seconds = time.time() - start
+            assert not [r for r in results if r.error]
+            baseline = baseline or seconds
+            print('jobs={:<2} {:8.3f}s  ({:.2f}x)'.format(jobs, seconds, baseline / seconds))
+    finally:
+        shutil.rmtree(dirpath)
+
+
+if __name__ == '__main__':
+    main()
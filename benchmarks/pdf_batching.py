@@ -0,0 +1,104 @@
+"""
+Benchmark converting songs to pdf with increasing numbers of pages per converter process
+
+Usage:
+    python benchmarks/pdf_batching.py [<numsongs>] [<converter>]
+
+Writes and renders a temporary library of songs (30 by default), then converts
+every page to its own pdf the way "pyleadsheet generate --pdf --pdf-batch-size N"
+does, with batches of 1 (one converter process per page), 3 (a song's views),
+10 and 30 pages.  Each run starts from an empty pdf directory.  It prints the
+number of converter processes launched, the time taken and the speedup over one
+page per process.
+
+By default the converter is a stub which, like wkhtmltopdf, takes a while to
+start (STUB_STARTUP seconds) and then a little longer for each page; pass the
+path to wkhtmltopdf as <converter> to time the real thing.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pyleadsheet import renderer  # noqa: E402
+
+BATCH_SIZES = (1, 3, 10, 30)
+STUB_STARTUP = 0.3
+STUB_PER_PAGE = 0.05
+STUB_CONVERTER = """#!{python}
+import sys, time, shlex
+time.sleep({startup})
+if sys.argv[1:] == ['--read-args-from-stdin']:
+    documents = [shlex.split(line) for line in sys.stdin if line.strip()]
+else:
+    documents = [sys.argv[1:]]
+for url, outputfilepath in documents:
+    time.sleep({per_page})
+    with open(outputfilepath, 'w') as pdf_file:
+        pdf_file.write('%PDF ' + url)
+"""
+SONG_TEMPLATE = """title: Benchmark Song {0}
+key: C
+time: 4/4
+progressions:
+  - name: A
+    chords: "[C][A-7][D-7][G7] [C][F][G7][C]"
+form:
+  - progression: A
+    lyrics: la la la
+"""
+
+
+def _write_stub(dirpath):
+    command = os.path.join(dirpath, 'stub-converter')
+    with open(command, 'w') as command_file:
+        command_file.write(STUB_CONVERTER.format(
+            python=sys.executable, startup=STUB_STARTUP, per_page=STUB_PER_PAGE
+        ))
+    os.chmod(command, 0o755)
+    return command
+
+
+def _write_library(dirpath, num_songs):
+    songs = []
+    for i in range(num_songs):
+        filepath = os.path.join(dirpath, 'song_{}.yaml'.format(i))
+        with open(filepath, 'w') as song_file:
+            song_file.write(SONG_TEMPLATE.format(i))
+        songs.append((filepath, None))
+    return songs
+
+
+def main():
+    num_songs = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    dirpath = tempfile.mkdtemp()
+    try:
+        command = sys.argv[2] if len(sys.argv) > 2 else _write_stub(dirpath)
+        outputdir = os.path.join(dirpath, 'output')
+        renderer.HTMLRenderer(outputdir).render_songs(_write_library(dirpath, num_songs))
+        print('songs: {0}, converter: {1}'.format(num_songs, command))
+        print('{:>10}{:>10}{:>10}{:>10}'.format('batch', 'launches', 'secs', 'speedup'))
+        base_secs = None
+        for batch_size in BATCH_SIZES:
+            shutil.rmtree(os.path.join(outputdir, renderer.HTMLToPDFConverter.OUTPUT_SUBDIR),
+                          ignore_errors=True)
+            pdf_converter = renderer.HTMLToPDFConverter(
+                outputdir, command=command, batch_size=batch_size
+            )
+            start = time.time()
+            num_errors = pdf_converter.convert_songs()
+            secs = time.time() - start
+            base_secs = base_secs or secs
+            print('{:>10}{:>10}{:>10.2f}{:>9.1f}x{}'.format(
+                batch_size, pdf_converter.num_launches, secs, base_secs / secs,
+                ' ({} errors)'.format(num_errors) if num_errors else ''
+            ))
+    finally:
+        shutil.rmtree(dirpath)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+"""
+Benchmark progression parsing across progression lengths
+
+Usage:
+    python benchmarks/progression_parser.py
+
+Parses progressions of 10 to 100k chord directives with
+parser._parse_progression_str and prints the time per directive for each size.
+Linear scaling shows up as a roughly constant per-directive cost.
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pyleadsheet import parser  # noqa: E402
+
+SIZES = (10, 100, 1000, 10000, 100000)
+DIRECTIVE_CYCLE = ('[G]', '[C:2b]', '[D7:2b]', '/', '{2 [E-7] [A7]}', '(coda [?G/B])')
+
+
+def _make_progression_str(num_directives):
+    parts = []
+    for i in range(num_directives):
+        parts.append(DIRECTIVE_CYCLE[i % len(DIRECTIVE_CYCLE)])
+    return ' '.join(parts)
+
+
+def main():
+    print('{:>10} {:>12} {:>16}'.format('directives', 'seconds', 'usec/directive'))
+    for size in SIZES:
+        progression_str = _make_progression_str(size)
+        number = max(1, 10000 // size)
+        seconds = min(timeit.repeat(
+            lambda: parser._parse_progression_str(progression_str), number=number, repeat=3
+        )) / number
+        print('{:>10} {:>12.6f} {:>16.3f}'.format(size, seconds, seconds / size * 1e6))
+
+
+if __name__ == '__main__':
+    main()
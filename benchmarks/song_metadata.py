@@ -0,0 +1,82 @@
+"""
+Benchmark reading song titles across a large library
+
+Usage:
+    python benchmarks/song_metadata.py [<numsongs>]
+
+Writes a temporary library of songs (5000 by default) with realistic
+progressions and lyrics.  It then compares loading every file completely
+against parser.get_metadata_from_song_file, which only loads the header.
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from pyleadsheet import parser  # noqa: E402
+
+SONG_TEMPLATE = """title: Benchmark Song {i}
+key: Bb
+time: 4/4
+feel: swing
+progressions:
+  - name: A
+    chords: "{{2 [Bb][G-7] / [C-7][F7]}} [Bb][Eb7][D-7][G7]"
+    comment: watch the [Eb7]
+  - name: B
+    chords: "[D7][G7][C7][F7]"
+form:
+{form}
+"""
+FORM_SECTION = """  - progression: {name}
+    reps: 2
+    lyrics: |
+{lyrics}
+"""
+LYRIC_LINE = '      la la la la la la la la la la la la la la la la la la la la\n'
+
+
+def _write_library(dirpath, num_songs):
+    form = ''.join(
+        FORM_SECTION.format(name=name, lyrics=LYRIC_LINE * 8).rstrip('\n') + '\n'
+        for name in ('A', 'A', 'B', 'A') * 3
+    )
+    filepaths = []
+    for i in range(num_songs):
+        filepath = os.path.join(dirpath, 'song_{}.yaml'.format(i))
+        with open(filepath, 'w') as song_file:
+            song_file.write(SONG_TEMPLATE.format(i=i, form=form))
+        filepaths.append(filepath)
+    return filepaths
+
+
+def _full_load_title(filepath):
+    return parser._load_yaml(parser._get_content_from_song_file(filepath))['title']
+
+
+def _time(func, filepaths):
+    start = time.time()
+    for filepath in filepaths:
+        func(filepath)
+    return time.time() - start
+
+
+def main():
+    num_songs = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    dirpath = tempfile.mkdtemp()
+    try:
+        filepaths = _write_library(dirpath, num_songs)
+        print('songs: {}  loader: {}'.format(num_songs, parser.YAML_LOADER.__name__))
+        full = _time(_full_load_title, filepaths)
+        header = _time(parser.get_title_from_song_file, filepaths)
+        print('full yaml load:   {:8.3f}s'.format(full))
+        print('header-only load: {:8.3f}s  ({:.1f}x)'.format(header, full / header))
+    finally:
+        shutil.rmtree(dirpath)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import os
+import json
+import shutil
+import hashlib
+
+import logging
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+MANIFEST_FILE = 'assets.json'
+FINGERPRINT_LENGTH = 8
+
+# the package's static files never change while it is running, so each process only
+# hashes them once, and only writes them once to each output directory
+_manifest = {}
+_written_dirs = set()
+
+
+def get_fingerprinted_filename(filename, content):
+    """ Put a hash of a file's content into its name, so that the name changes whenever the
+        content does and the file can be cached forever
+
+    .. doctests ::
+
+        >>> get_fingerprinted_filename('pyleadsheet.css', b'body {}')
+        'pyleadsheet.40294f6c.css'
+        >>> get_fingerprinted_filename('README', b'')
+        'README.da39a3ee'
+
+    :param filename: name of the file
+    :param content: bytes in the file
+    :rtype: string
+    """
+    fingerprint = hashlib.sha1(content).hexdigest()[:FINGERPRINT_LENGTH]
+    name, ext = os.path.splitext(filename)
+    return '{0}.{1}{2}'.format(name, fingerprint, ext)
+
+
+def get_manifest():
+    """ Map the name of every static file to its fingerprinted name
+
+    .. doctests ::
+
+        >>> get_manifest()['pyleadsheet.css']  # doctest: +ELLIPSIS
+        'pyleadsheet....css'
+
+    :rtype: dict
+    """
+    if not _manifest:
+        for filename in sorted(os.listdir(STATIC_DIR)):
+            if filename.endswith('jinja2'):
+                continue
+            with open(os.path.join(STATIC_DIR, filename), 'rb') as static_file:
+                _manifest[filename] = get_fingerprinted_filename(filename, static_file.read())
+    return _manifest
+
+
+def get_filename(manifest, fingerprinted_filename):
+    """ Find the static file which a fingerprinted name refers to
+
+    :param manifest: dict, as returned by get_manifest
+    :param fingerprinted_filename: fingerprinted name of a static file
+    :rtype: string, or None if it is not in the manifest
+    """
+    for filename, manifest_filename in manifest.items():
+        if manifest_filename == fingerprinted_filename:
+            return filename
+    return None
+
+
+def write_assets(outputdir):
+    """ Copy every static file into outputdir under its fingerprinted name, along with a
+        manifest (MANIFEST_FILE) mapping original names to fingerprinted ones.  A file
+        which is already there must have the same content, so it is left alone
+
+    .. doctests ::
+
+        >>> import tempfile, shutil
+        >>> outputdir = tempfile.mkdtemp()
+        >>> manifest = write_assets(outputdir)
+        >>> sorted(os.listdir(outputdir)) == sorted(list(manifest.values()) + [MANIFEST_FILE])
+        True
+        >>> shutil.rmtree(outputdir)
+
+    :param outputdir: directory to write the files to
+    :rtype: dict, as returned by get_manifest
+    """
+    manifest = get_manifest()
+    outputdir = os.path.abspath(outputdir)
+    if outputdir in _written_dirs and os.path.isdir(outputdir):
+        return manifest
+    if not os.path.isdir(outputdir):
+        logger.debug('creating outputdir')
+        os.makedirs(outputdir)
+    logged = False
+    for filename, fingerprinted_filename in manifest.items():
+        tofile = os.path.join(outputdir, fingerprinted_filename)
+        if not os.path.exists(tofile):
+            if not logged:
+                logger.info('copying base files into outputdir')
+                logged = True
+            shutil.copy(os.path.join(STATIC_DIR, filename), tofile)
+    with open(os.path.join(outputdir, MANIFEST_FILE), 'w') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    _written_dirs.add(outputdir)
+    return manifest
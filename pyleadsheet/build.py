@@ -0,0 +1,153 @@
+import os
+import json
+import hashlib
+import functools
+from . import assets
+from . import templating
+from . import __version__
+
+import logging
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = 'build.json'
+# bump whenever the set of files a song is rendered into changes, so that older builds are
+# rendered again
+MANIFEST_VERSION = 2
+
+
+@functools.lru_cache(maxsize=None)
+def _get_package_inputs():
+    assets_hash = hashlib.sha1(
+        json.dumps(assets.get_manifest(), sort_keys=True).encode('utf-8')
+    ).hexdigest()
+    return templating.get_templates_stamp(), assets_hash
+
+
+def get_build_inputs(content_hash, options):
+    """ Everything which goes into a song's outputs: the hash of its source, the hashes of
+        the templates and static files, the options it was rendered with and the version
+        of pyleadsheet.  Values are as they would be read back from a manifest
+
+    .. doctests ::
+
+        >>> inputs = get_build_inputs('abc', {'roots': None})
+        >>> sorted(inputs.keys())
+        ['assets', 'options', 'source', 'templates', 'version']
+        >>> inputs == get_build_inputs('abc', {'roots': None})
+        True
+
+    :param content_hash: sha1 hexdigest of the song's source
+    :param options: dict of the options which affect the outputs
+    :rtype: dict
+    """
+    templates_stamp, assets_hash = _get_package_inputs()
+    return json.loads(json.dumps({
+        'source': content_hash,
+        'templates': templates_stamp,
+        'assets': assets_hash,
+        'options': options,
+        'version': __version__
+    }))
+
+
+class BuildManifest(object):
+    """ Record of what a previous build wrote to an output directory, kept in MANIFEST_FILE.
+        For every song, it holds the inputs (see get_build_inputs) its html was rendered
+        from and the html files (by view and key) which were written.  For every pdf, it
+        holds the inputs of the html it was converted from.  A song or pdf whose inputs
+        are unchanged, and whose files are all still there, needn't be built again
+
+    .. doctests ::
+
+        >>> import tempfile, shutil
+        >>> outputdir = tempfile.mkdtemp()
+        >>> manifest = BuildManifest(outputdir)
+        >>> inputs = get_build_inputs('abc', {})
+        >>> manifest.is_song_fresh('some', inputs, outputdir)
+        False
+        >>> open(os.path.join(outputdir, 'some.html'), 'w').close()
+        >>> manifest.record_song('some', 'Some', 'some', inputs, {'complete': 'some.html'}, [])
+        >>> manifest.save()
+        >>> BuildManifest(outputdir).is_song_fresh('some', inputs, outputdir)
+        True
+        >>> BuildManifest(outputdir).is_song_fresh('some', get_build_inputs('def', {}), outputdir)
+        False
+        >>> shutil.rmtree(outputdir)
+    """
+
+    def __init__(self, outputdir):
+        self.filepath = os.path.join(outputdir, MANIFEST_FILE)
+        self.songs = {}
+        self.pdfs = {}
+        self.load()
+
+    def load(self):
+        if not os.path.isfile(self.filepath):
+            return
+        try:
+            with open(self.filepath, 'r') as manifest_file:
+                data = json.load(manifest_file)
+        except ValueError:
+            logger.warning('ignoring unreadable build manifest: ' + self.filepath)
+            return
+        if data.get('version') != MANIFEST_VERSION:
+            logger.debug('ignoring build manifest from another version: ' + self.filepath)
+            return
+        self.songs = data['songs']
+        self.pdfs = data['pdfs']
+
+    def save(self):
+        """ Write the manifest, replacing the previous one only once it is complete """
+        if not os.path.isdir(os.path.dirname(self.filepath)):
+            os.makedirs(os.path.dirname(self.filepath))
+        tmp_filepath = self.filepath + '.tmp'
+        with open(tmp_filepath, 'w') as manifest_file:
+            json.dump({
+                'version': MANIFEST_VERSION,
+                'songs': self.songs,
+                'pdfs': self.pdfs
+            }, manifest_file, indent=1, sort_keys=True)
+        os.replace(tmp_filepath, self.filepath)
+
+    def is_song_fresh(self, song_id, inputs, htmldir):
+        """ Whether a song's html was built from inputs and is all still in htmldir
+
+        :param song_id: id of the song
+        :param inputs: dict, as returned by get_build_inputs
+        :param htmldir: directory the song's html was written to
+        :rtype: bool
+        """
+        song = self.songs.get(song_id)
+        return bool(song) and song['inputs'] == inputs and all(
+            os.path.isfile(os.path.join(htmldir, filename))
+            for filename in song['filenames'].values()
+        )
+
+    def record_song(self, song_id, title, output_name, inputs, filenames, rendered_roots):
+        """ Record the html which has been built for a song
+
+        :param song_id: id of the song
+        :param title: title of the song
+        :param output_name: name which the song's output files are based on
+        :param inputs: dict, as returned by get_build_inputs
+        :param filenames: dict of link id (eg. "D/leadsheet") -> path within the html dir
+        :param rendered_roots: roots of the other keys the song was rendered in
+        """
+        self.songs[song_id] = {
+            'title': title,
+            'output_name': output_name,
+            'inputs': inputs,
+            'filenames': filenames,
+            'rendered_roots': list(rendered_roots)
+        }
+
+    def forget_song(self, song_id):
+        self.songs.pop(song_id, None)
+
+    def is_pdf_fresh(self, pdf_filename, inputs, pdfdir):
+        return self.pdfs.get(pdf_filename) == inputs and os.path.isfile(
+            os.path.join(pdfdir, pdf_filename)
+        )
+
+    def record_pdf(self, pdf_filename, inputs):
+        self.pdfs[pdf_filename] = inputs
@@ -0,0 +1,360 @@
+import os
+import re
+import sqlite3
+import hashlib
+import collections
+import threading
+from . import views
+from . import parser
+
+import logging
+logger = logging.getLogger(__name__)
+
+CATALOG_FILENAME = 'catalog.sqlite3'
+# where the catalog of each input path is kept, under the user's cache dir, when no cache dir
+# is given
+USER_CATALOG_SUBDIR = os.path.join('pyleadsheet', 'catalogs')
+CATALOG_VERSION = 3
+SEARCH_LIMIT = 50
+# how much each occurrence of a word counts towards a song's search score, by field
+SEARCH_FIELD_WEIGHTS = {'title': 10, 'lyrics': 1, 'comment': 1}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    filepath TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS songs (
+    song_id TEXT PRIMARY KEY,
+    filepath TEXT NOT NULL REFERENCES files (filepath) ON DELETE CASCADE,
+    song_index INTEGER,
+    content_hash TEXT,
+    title TEXT NOT NULL,
+    sortable_title TEXT NOT NULL,
+    key TEXT,
+    time TEXT,
+    feel TEXT
+);
+CREATE INDEX IF NOT EXISTS songs_by_sortable_title ON songs (sortable_title, song_id);
+CREATE INDEX IF NOT EXISTS songs_by_filepath ON songs (filepath);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    song_id TEXT NOT NULL REFERENCES songs (song_id) ON DELETE CASCADE,
+    weight INTEGER NOT NULL,
+    PRIMARY KEY (term, song_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_song_id ON postings (song_id);
+"""
+
+_INDEX_QUERY = """
+SELECT songs.song_id, songs.filepath, songs.title, songs.sortable_title,
+       songs.key, songs.time, songs.feel, files.size, files.mtime_ns
+FROM songs INDEXED BY songs_by_sortable_title
+JOIN files ON files.filepath = songs.filepath
+ORDER BY songs.sortable_title, songs.song_id
+"""
+
+# songs holding every term, best scoring first; the query's terms fill in the {0} list
+_SEARCH_QUERY = """
+SELECT songs.song_id, songs.filepath, songs.title, songs.sortable_title,
+       songs.key, songs.time, songs.feel, matches.score
+FROM (
+    SELECT song_id, SUM(weight) AS score FROM postings
+    WHERE term IN ({0})
+    GROUP BY song_id
+    HAVING COUNT(*) = ?
+) AS matches
+JOIN songs ON songs.song_id = matches.song_id
+ORDER BY matches.score DESC, songs.sortable_title, songs.song_id
+LIMIT ?
+"""
+
+
+def _get_stat(filepath):
+    stat = os.stat(filepath)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _to_text(value):
+    return None if value is None else str(value)
+
+
+def tokenize(text):
+    """ Split text into the lowercase words which are searched for
+
+    .. doctests ::
+
+        >>> tokenize("Don't stop, Believin'")
+        ['dont', 'stop', 'believin']
+
+    :param text: any string
+    :rtype: list
+    """
+    return re.findall(r'\w+', text.lower().replace("'", '').replace('\u2019', ''))
+
+
+def get_user_catalog_path(input_path):
+    """ Return where the catalog of the songs in input_path is kept by default: under the
+        user's cache dir ($XDG_CACHE_HOME, or ~/.cache), one catalog per input path, so
+        that catalogs of different libraries don't drop each other's songs
+
+    :param input_path: song file, songbook or directory holding them
+    :rtype: string
+    """
+    user_cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache'
+    )
+    input_hash = hashlib.sha1(os.path.abspath(input_path).encode('utf-8')).hexdigest()
+    return os.path.join(
+        user_cache_dir, USER_CATALOG_SUBDIR, '{0}.{1}'.format(input_hash[:16], CATALOG_FILENAME)
+    )
+
+
+def _get_postings(song_text):
+    weights = collections.Counter()
+    for field, texts in song_text.items():
+        for text in texts:
+            for term in tokenize(text):
+                weights[term] += SEARCH_FIELD_WEIGHTS[field]
+    return weights
+
+
+class SongCatalog(object):
+    """ SQLite catalog of the songs in a set of files: their ids, titles, sortable titles,
+        keys, times and feels, along with the size and mtime of the file they are in.
+        update() stat-diffs the files against the catalog, so only new or changed files
+        are read, and index entries come back ordered by sortable title from an index
+        rather than by loading and sorting every song.  The words of each song's title,
+        lyrics and comments are kept in an inverted index, which search() queries
+
+    .. doctests ::
+
+        >>> import shutil, tempfile
+        >>> song_dir = tempfile.mkdtemp()
+        >>> def write_song(filename, title):
+        ...     with open(os.path.join(song_dir, filename), 'w') as song_file:
+        ...         _ = song_file.write('title: {0}\\nkey: C\\ntime: 4/4\\n'.format(title))
+        ...         _ = song_file.write('form: [{lyrics: "striped zebra"}]\\n')
+        >>> write_song('one.yaml', 'The Zebra'), write_song('two.yaml', 'Aardvark')
+        (None, None)
+        >>> catalog = SongCatalog()
+        >>> filepaths = [os.path.join(song_dir, f) for f in ('one.yaml', 'two.yaml')]
+        >>> catalog.update(filepaths)
+        2
+        >>> [(e['song_id'], e['sortable_title']) for e in catalog.iter_index_entries()]
+        [('two', 'Aardvark'), ('one', 'Zebra')]
+        >>> catalog.update(filepaths)
+        0
+        >>> [(e['song_id'], e['score']) for e in catalog.search('zebra')]
+        [('one', 11), ('two', 1)]
+        >>> [e['song_id'] for e in catalog.search('Striped Aardvark')]
+        ['two']
+        >>> catalog.update(filepaths[:1], prune=False)
+        0
+        >>> catalog.update(filepaths[:1])
+        1
+        >>> catalog.get_song_ref('one').title, catalog.get_song_ref('two')
+        ('The Zebra', None)
+        >>> catalog.close()
+        >>> shutil.rmtree(song_dir)
+    """
+
+    def __init__(self, db_path=':memory:'):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        # the server shares one catalog between its request threads, guarded by self.lock
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        if self.connection.execute('PRAGMA user_version').fetchone()[0] != CATALOG_VERSION:
+            logger.debug('creating song catalog: ' + db_path)
+            self.connection.executescript(
+                'DROP TABLE IF EXISTS postings; DROP TABLE IF EXISTS songs; '
+                'DROP TABLE IF EXISTS files;'
+            )
+        self.connection.executescript(_SCHEMA)
+        self.connection.execute('PRAGMA user_version = {0}'.format(CATALOG_VERSION))
+        self.connection.commit()
+
+    @classmethod
+    def in_dir(cls, cache_dir):
+        """ Open the catalog kept in cache_dir, creating the directory if needed
+
+        :param cache_dir: directory in which to keep the catalog between runs
+        :rtype: SongCatalog
+        """
+        if not os.path.isdir(cache_dir):
+            logger.debug('creating cache dir: ' + cache_dir)
+            os.makedirs(cache_dir)
+        return cls(os.path.join(cache_dir, CATALOG_FILENAME))
+
+    @classmethod
+    def for_input_path(cls, input_path, cache_dir=None):
+        """ Open the catalog for the songs in input_path: the one kept in cache_dir if given,
+            otherwise input_path's own catalog in the user's cache dir (see
+            get_user_catalog_path), so that the library is only read in full the first time.
+            Nothing is written next to the songs.  If the catalog cannot be written, fall
+            back on one in memory
+
+        .. doctests ::
+
+            >>> import shutil, tempfile
+            >>> user_cache_dir, input_dir = tempfile.mkdtemp(), tempfile.mkdtemp()
+            >>> getfixture('monkeypatch').setenv('XDG_CACHE_HOME', user_cache_dir)
+            >>> catalog = SongCatalog.for_input_path(input_dir)
+            >>> catalog.db_path == get_user_catalog_path(input_dir)
+            True
+            >>> catalog.db_path.startswith(user_cache_dir), os.listdir(input_dir)
+            (True, [])
+            >>> catalog.close()
+            >>> shutil.rmtree(user_cache_dir)
+            >>> shutil.rmtree(input_dir)
+
+        :param input_path: song file, songbook or directory holding them
+        :param cache_dir: directory in which to keep the catalog instead
+        :rtype: SongCatalog
+        """
+        try:
+            if cache_dir:
+                return cls.in_dir(cache_dir)
+            db_path = get_user_catalog_path(input_path)
+            if not os.path.isdir(os.path.dirname(db_path)):
+                os.makedirs(os.path.dirname(db_path))
+            return cls(db_path)
+        except (OSError, sqlite3.Error) as e:
+            logger.warning('could not keep a song catalog for {0}, so every song will be read '
+                           'each time: {1}'.format(input_path, e))
+            return cls()
+
+    def is_persistent(self):
+        return self.db_path != ':memory:'
+
+    def _insert_file(self, filepath, stat):
+        self.connection.execute('DELETE FROM files WHERE filepath = ?', (filepath,))
+        self.connection.execute(
+            'INSERT INTO files (filepath, size, mtime_ns) VALUES (?, ?, ?)', (filepath,) + stat
+        )
+        try:
+            songs = list(parser.iter_song_documents(filepath))
+        except Exception as e:
+            # keep the file, so that it is not read again until it changes
+            logger.error('could not catalog {0}: {1}: {2}'.format(
+                filepath, e.__class__.__name__, e
+            ))
+            return
+        for song_ref, document in songs:
+            title = _to_text(song_ref.title)
+            other = self.connection.execute(
+                'SELECT filepath FROM songs WHERE song_id = ?', (song_ref.song_id,)
+            ).fetchone()
+            if other is not None:
+                logger.warning('not cataloging song {0} from {1}: {2} has a song with the '
+                               'same id'.format(song_ref.song_id, filepath, other[0]))
+                # read the file again next time, in case the other song has gone by then
+                self.connection.execute(
+                    'UPDATE files SET mtime_ns = -1 WHERE filepath = ?', (filepath,)
+                )
+                continue
+            self.connection.execute(
+                'INSERT INTO songs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                    song_ref.song_id, filepath, song_ref.index, song_ref.content_hash,
+                    title, views.get_sortable_title(title), _to_text(document.get('key')),
+                    _to_text(document.get('time')), _to_text(document.get('feel'))
+                )
+            )
+            self.connection.executemany(
+                'INSERT INTO postings (term, song_id, weight) VALUES (?, ?, ?)', (
+                    (term, song_ref.song_id, weight)
+                    for term, weight in _get_postings(parser.get_song_text(document)).items()
+                )
+            )
+
+    def update(self, filepaths, prune=True):
+        """ Bring the catalog in line with filepaths: files which are new, or whose size or
+            mtime have changed, are (re)read, and, if prune is set, files which are no
+            longer there are dropped.  A song whose id is already taken by another file's
+            song is left out, with a warning
+
+        :param filepaths: list of paths to song files and/or songbooks
+        :param prune: drop files which are not in filepaths; leave this unset to add
+                      some files to a catalog which holds others too
+        :rtype: int, the number of files which were added, changed or dropped
+        """
+        stats = {}
+        for filepath in filepaths:
+            filepath = os.path.abspath(filepath)
+            try:
+                stats[filepath] = _get_stat(filepath)
+            except OSError:
+                # removed between listing and stat'ing; treat it as gone
+                continue
+        with self.lock, self.connection:
+            cataloged = dict(
+                (row[0], tuple(row[1:]))
+                for row in self.connection.execute('SELECT filepath, size, mtime_ns FROM files')
+            )
+            removed = [
+                filepath for filepath in cataloged
+                if filepath not in stats and (prune or not os.path.isfile(filepath))
+            ]
+            changed = [
+                filepath for filepath, stat in sorted(stats.items())
+                if cataloged.get(filepath) != stat
+            ]
+            for filepath in removed:
+                logger.debug('dropping from catalog: ' + filepath)
+                self.connection.execute('DELETE FROM files WHERE filepath = ?', (filepath,))
+            for filepath in changed:
+                logger.debug('cataloging: ' + filepath)
+                self._insert_file(filepath, stats[filepath])
+        return len(removed) + len(changed)
+
+    def iter_index_entries(self):
+        """ Yield an index entry (see views.compose_index_kwargs) for every song in the
+            catalog, ordered by sortable title
+
+        :rtype: generator
+        """
+        with self.lock:
+            rows = self.connection.execute(_INDEX_QUERY).fetchall()
+        for row in rows:
+            yield dict(zip((
+                'song_id', 'filepath', 'display_title', 'sortable_title',
+                'key', 'time', 'feel', 'size', 'mtime_ns'
+            ), row))
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """ Find the songs whose title, lyrics or comments contain every word in query,
+            best matches (eg. in the title) first.  Only the catalog is read
+
+        :param query: words to search for
+        :param limit: maximum number of songs to return
+        :rtype: list of index entries (see iter_index_entries), each with a score
+        """
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        with self.lock:
+            rows = self.connection.execute(
+                _SEARCH_QUERY.format(', '.join('?' * len(terms))), terms + [len(terms), limit]
+            ).fetchall()
+        return [dict(zip((
+            'song_id', 'filepath', 'display_title', 'sortable_title',
+            'key', 'time', 'feel', 'score'
+        ), row)) for row in rows]
+
+    def get_song_ref(self, song_id):
+        """ Look up a song by id
+
+        :param song_id: id of a song, as returned by parser.iter_song_refs
+        :rtype: parser.SongRef, or None if there is no such song
+        """
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT filepath, song_index, song_id, title, content_hash FROM songs '
+                'WHERE song_id = ?', (song_id,)
+            ).fetchone()
+        return parser.SongRef(*row) if row else None
+
+    def close(self):
+        self.connection.close()
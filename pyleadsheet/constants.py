@@ -18,6 +18,12 @@ SHARP = '&#9839;'
 
 ARG_ROW_BREAK = '/'
 
+# names of the chromatic degrees (half steps above the root of a key)
+NASHVILLE_DEGREES = ('1', 'b2', '2', 'b3', '3', '4', '#4', '5', 'b6', '6', 'b7', '7')
+ROMAN_NUMERAL_DEGREES = (
+    'I', 'bII', 'II', 'bIII', 'III', 'IV', '#IV', 'V', 'bVI', 'VI', 'bVII', 'VII'
+)
+
 DIMINISHED = 1
 MINOR = 2
 PERFECT = 3
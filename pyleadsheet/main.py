@@ -4,7 +4,9 @@ pyleadsheet -- convert a chordpro-like file into a pretty pdf leadsheet
 Usage:
     pyleadsheet generate <inputfile> [options]
     pyleadsheet generate <inputdir> [options]
-    pyleadsheet runserver <inputdir> [--debug]
+    pyleadsheet check <inputdir> [options]
+    pyleadsheet search <inputdir> <query>... [options]
+    pyleadsheet runserver <inputdir> [options]
     pyleadsheet help
 
 Options:
@@ -14,9 +16,33 @@ Options:
     --no-index                  don't (re)generate an index
     --pdf                       convert html files to pdf after initial
                                 rendering
+    --pdf-jobs=INT              number of pdfs to convert at once, starting as
+                                soon as each song's html is written (default: 1)
+    --pdf-timeout=SECS          seconds to give each pdf before retrying it
+                                (default: 300)
+    --pdf-batch-size=INT        number of pages to hand to each pdf converter
+                                process, which still writes one pdf per page
+                                (default: 1)
+    --book                      also render every song, in index order, into
+                                one html document (book.html), which --pdf
+                                then converts into one pdf instead of one pdf
+                                per page
     --transpose-half-steps=INT  transpose song +/- INT half steps
     --transpose-to-root=ROOT    transpose song to be rooted at ROOT
+    --all-keys                  also render every song in each key it can
+                                reasonably be transposed to, one subdirectory
+                                per key
+    --keys=ROOTS                like --all-keys, but only for the keys rooted at
+                                a comma separated list of ROOTS (eg. C,Eb,Bb)
     --clean                     start from a fresh output diretory
+    --jobs=INT                  number of processes to use for parsing,
+                                checking or rendering songs (default: 1)
+    --cache-dir=DIR             directory in which to keep parsed songs, the
+                                song catalog and compiled templates between runs
+                                (default: each input path's song catalog is
+                                kept in the user cache dir, eg.
+                                ~/.cache/pyleadsheet, parsed songs are not kept,
+                                and templates are cached in the system temp dir)
     --debug                     use verbose logging
 """
 
@@ -25,7 +51,11 @@ import sys
 import docopt
 import shutil
 from . import server
+from . import models
+from . import parser
 from . import renderer
+from . import catalog
+from . import templating
 import logging
 logger = logging.getLogger(__name__)
 
@@ -34,41 +64,138 @@ def runserver(args):
     if not os.path.isdir(args['<inputdir>']):
         logger.error('tried to start server with invalid input dir: ' + args['<inputdir>'])
         return 1
-    return server.run(args['<inputdir>'], debug=args['--debug'])
+    if args['--cache-dir']:
+        parser.set_cache_dir(args['--cache-dir'])
+    return server.run(args['<inputdir>'], debug=args['--debug'], cache_dir=args['--cache-dir'])
 
 
-def generate(args):
-
+def _find_inputfiles(inputpath):
     inputfiles = []
-    if os.path.isfile(args['<inputfile>']):
-        inputfiles.append(args['<inputfile>'])
-    elif os.path.isdir(args['<inputfile>']):
-        for filename in os.listdir(args['<inputfile>']):
-            if filename.lower().endswith('.yaml') or filename.lower().endswith('.yml'):
-                inputfiles.append(os.path.join(args['<inputfile>'], filename))
+    if os.path.isfile(inputpath):
+        inputfiles.append(inputpath)
+    elif os.path.isdir(inputpath):
+        inputfiles.extend(parser.find_song_files(inputpath))
 
     if not inputfiles:
-        raise IOError('could not find input: ' + args['<inputfile>'])
+        raise IOError('could not find input: ' + inputpath)
+    return inputfiles
+
+
+def check(args):
+    inputfiles = sorted(_find_inputfiles(args['<inputdir>']))
+    num_errors = 0
+    for result in parser.check_many(inputfiles, jobs=int(args['--jobs'] or 1)):
+        for error in result.errors:
+            num_errors += 1
+            print('{0}: {1}: {2}'.format(result.filepath, error.path or '-', error.error))
+    print('checked {0} song files, found {1} problems'.format(len(inputfiles), num_errors))
+    return 1 if num_errors else 0
+
+
+def _open_catalog(args, input_path):
+    return catalog.SongCatalog.for_input_path(input_path, args['--cache-dir'])
+
+
+def search(args):
+    song_catalog = _open_catalog(args, args['<inputdir>'])
+    song_catalog.update(_find_inputfiles(args['<inputdir>']))
+    songs = song_catalog.search(' '.join(args['<query>']))
+    for song in songs:
+        print('{0}: {1}'.format(song['song_id'], song['display_title']))
+    song_catalog.close()
+    return 0 if songs else 1
+
+
+def _get_key_roots(args):
+    """ Return the roots of the keys requested with --keys, None for --all-keys, or an
+        empty list if neither was given
+
+    .. doctests ::
+
+        >>> _get_key_roots({'--all-keys': True, '--keys': None}) is None
+        True
+        >>> _get_key_roots({'--all-keys': False, '--keys': 'c, Eb,Bb'})
+        [Note(C), Note(Eb), Note(Bb)]
+    """
+    if args['--all-keys']:
+        return None
+    if args['--keys']:
+        return [models.Note(root.strip()) for root in args['--keys'].split(',')]
+    return []
+
+
+def _iter_songs(inputfiles):
+    """ Yield (source, document) for every song in inputfiles, as taken by
+        renderer.HTMLRenderer.render_songs: song files first, then the songs in each
+        songbook, which are streamed rather than read all at once
+    """
+    for inputfile in inputfiles:
+        if not parser.is_songbook(inputfile):
+            yield inputfile, None
+    for inputfile in inputfiles:
+        if parser.is_songbook(inputfile):
+            for song_ref, document in parser.iter_songbook_documents(inputfile):
+                yield song_ref, document
+
+
+def generate(args):
+
+    inputfiles = _find_inputfiles(args['<inputfile>'])
+
+    if args['--cache-dir']:
+        parser.set_cache_dir(args['--cache-dir'])
+        templating.set_cache_dir(args['--cache-dir'])
+
+    try:
+        key_roots = _get_key_roots(args)
+    except ValueError as e:
+        logger.error('invalid --keys: {0}'.format(e))
+        return 1
 
     outputdir = args['--output'] or 'output'
     if args['--clean'] and os.path.isdir(outputdir):
         shutil.rmtree(outputdir)
 
-    html_renderer = renderer.HTMLRenderer(outputdir)
-    for yamlfile in inputfiles:
-        html_renderer.render_song(
-            yamlfile,
+    song_catalog = None if args['--no-index'] else _open_catalog(args, args['<inputfile>'])
+    if song_catalog is not None and not song_catalog.is_persistent():
+        # filling a catalog which is thrown away reads every song in full, while the index
+        # only needs their titles, which the renderer reads from the songs' headers
+        song_catalog.close()
+        song_catalog = None
+    html_renderer = renderer.HTMLRenderer(outputdir, song_catalog=song_catalog)
+    pdf_converter = None
+    if args['--pdf']:
+        pdf_converter = renderer.HTMLToPDFConverter(
+            outputdir,
+            html_renderer=html_renderer,
+            jobs=int(args['--pdf-jobs'] or 1),
+            timeout=int(args['--pdf-timeout'] or renderer.PDF_TIMEOUT),
+            batch_size=int(args['--pdf-batch-size'] or renderer.PDF_BATCH_SIZE)
+        )
+    num_errors = html_renderer.render_songs(
+        _iter_songs(inputfiles),
+        transpose_half_steps=args['--transpose-half-steps'],
+        transpose_to_root=args['--transpose-to-root'],
+        roots=key_roots,
+        jobs=int(args['--jobs'] or 1),
+        # a book is converted as a whole once it is rendered, rather than song by song
+        pdf_converter=None if args['--book'] else pdf_converter
+    )
+    if not args['--no-index']:
+        html_renderer.render_index()
+    if args['--book']:
+        html_renderer.render_book(
             transpose_half_steps=args['--transpose-half-steps'],
             transpose_to_root=args['--transpose-to-root']
         )
-    if not args['--no-index']:
-        html_renderer.render_index
 
-    if args['--pdf']:
-        pdf_converter = renderer.HTMLToPDFConverter(outputdir)
-        pdf_converter.convert_songs()
+    if pdf_converter is not None:
+        if args['--book']:
+            num_errors += pdf_converter.convert_book()
+        else:
+            num_errors += pdf_converter.convert_songs()
 
-    return 0
+    return 1 if num_errors else 0
 
 
 def main():
@@ -87,3 +214,9 @@ def main():
 
     elif args['generate']:
         return generate(args)
+
+    elif args['check']:
+        return check(args)
+
+    elif args['search']:
+        return search(args)
@@ -1,11 +1,16 @@
-import funcy
+import copy
+import functools
+import threading
 import collections
+import collections.abc
 import string
 from . import constants
 
 TimeSignature = collections.namedtuple('TimeSignature', ['count', 'unit'])
 ChordDuration = collections.namedtuple('ChordDuration', ['count', 'unit'])
 
+CHORD_CACHE_SIZE = 1024
+
 
 class MusicStr(str):
     """ Class used for switching between unicode representations of musical
@@ -21,6 +26,8 @@ class MusicStr(str):
         '♯'
     """
 
+    __slots__ = ()
+
     @classmethod
     def to_unicode(cls, content):
         """ Replace certain bare string characters with unicode characters
@@ -98,12 +105,46 @@ class Note(MusicStr):
     #     ('A', 0), ('B', 2), ('C', 3), ('D', 5), ('E', 7), ('F', 8), ('G', 10)
     # ])
 
+    __slots__ = ()
+
+    # these get filled in below.  _interned maps every accepted spelling (eg. 'bb', 'B♭')
+    # to the single Note instance for it, and _properties maps each Note to its
+    # (letter_index, accidental, chromatic_index)
+    _interned = {}
+    _properties = {}
+    _enharmonic_equivalents = {}
+    _spellings = {}
+
     def __new__(cls, content):
-        content = cls.from_unicode(content)
-        if not funcy.re_test(r'^[A-Ga-g][b#]?$', content):
-            raise ValueError('"{0}" is not a valid pyleadsheet note'.format(content))
-        content = content.capitalize()
-        return str.__new__(cls, content)
+        ret = cls._get(content)
+        if ret is None:
+            raise ValueError('"{0}" is not a valid pyleadsheet note'.format(
+                cls.from_unicode(content)
+            ))
+        return ret
+
+    @classmethod
+    def _get(cls, content):
+        """ Return the interned Note for content, or None if content is not a note """
+        try:
+            return cls._interned[content]
+        except KeyError:
+            pass
+        normalized = cls.from_unicode(content)
+        if (
+            len(normalized) in (1, 2) and normalized[0] in 'ABCDEFGabcdefg' and
+            normalized[1:] in ('', 'b', '#')
+        ):
+            return cls._interned.setdefault(
+                content, cls._interned[normalized[0].upper() + normalized[1:]]
+            )
+        return None
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     @classmethod
     def split_str(cls, content):
@@ -113,20 +154,32 @@ class Note(MusicStr):
 
             >>> Note.split_str('C#asdf')
             (Note(C#), 'asdf')
+            >>> Note.split_str('B-7')
+            (Note(B), '-7')
             >>> Note.split_str('')  # doctest: +ELLIPSIS
             Traceback (most recent call last):
                 ...
             ValueError: "" is not a valid...
         """
-        if len(content) == 1:
-            return cls(content), ''
-        try:
-            ret = cls(content[:2])
-            remainder = content[2:]
-        except ValueError:
-            ret = Note(content[:1])
-            remainder = content[1:]
-        return ret, remainder
+        ret = cls._get(content[:2]) if len(content) > 1 else None
+        if ret is not None:
+            return ret, content[2:]
+        return cls(content[:1]), content[1:]
+
+    @classmethod
+    def spell(cls, chromatic_index, letter_index):
+        """ Return the Note named by the letter at letter_index (0 for A) which sounds at
+            chromatic_index, or None if no standard note does
+
+        .. doctests ::
+
+            >>> Note.spell(4, 3)
+            Note(Db)
+            >>> Note.spell(4, 2)
+            Note(C#)
+            >>> Note.spell(4, 0)
+        """
+        return cls._spellings.get((letter_index, chromatic_index % 12))
 
     @classmethod
     def all(cls, flatten=False):
@@ -139,13 +192,7 @@ class Note(MusicStr):
              [Note(C#), Note(Db)], [Note(D)], [Note(D#), Note(Eb)], [Note(E), Note(Fb)],
              [Note(E#), Note(F)], [Note(F#), Note(Gb)], [Note(G)], [Note(G#), Note(Ab)]]
         """
-        ret = []
-        for note, index in cls._chromatic_index_map.items():
-            if len(ret) == index:
-                ret.append([cls(note)])
-            else:
-                ret[-1].append(cls(note))
-        return ret
+        return [list(notes) for notes in cls._all_table]
 
     @classmethod
     def sharps(cls):
@@ -157,14 +204,7 @@ class Note(MusicStr):
             [[Note(A)], [Note(A#)], [Note(B)], [Note(B#), Note(C)], [Note(C#)], [Note(D)],
              [Note(D#)], [Note(E)], [Note(E#), Note(F)], [Note(F#)], [Note(G)], [Note(G#)]]
         """
-        ret = []
-        for note, index in cls._chromatic_index_map.items():
-            if 'b' not in note:
-                if len(ret) == index:
-                    ret.append([cls(note)])
-                else:
-                    ret[-1].append(cls(note))
-        return ret
+        return [list(notes) for notes in cls._sharps_table]
 
     @classmethod
     def flats(cls):
@@ -176,20 +216,35 @@ class Note(MusicStr):
             [[Note(A)], [Note(Bb)], [Note(B), Note(Cb)], [Note(C)], [Note(Db)], [Note(D)],
              [Note(Eb)], [Note(E), Note(Fb)], [Note(F)], [Note(Gb)], [Note(G)], [Note(Ab)]]
         """
-        ret = []
-        for note, index in cls._chromatic_index_map.items():
-            if '#' not in note:
-                if len(ret) == index:
-                    ret.append([cls(note)])
-                else:
-                    ret[-1].append(cls(note))
-        return ret
+        return [list(notes) for notes in cls._flats_table]
 
     @property
     def lookup_list(self):
         if 'b' in self or self == 'F':
-            return self.flats()
-        return self.sharps()
+            return self._flats_table
+        return self._sharps_table
+
+    @property
+    def letter_index(self):
+        """ Position of the note's letter in the musical alphabet, starting with A
+
+        .. doctests ::
+
+            >>> Note('C#').letter_index
+            2
+        """
+        return self._properties[self][0]
+
+    @property
+    def accidental(self):
+        """ -1 for a flat, 1 for a sharp and 0 for a natural
+
+        .. doctests ::
+
+            >>> Note('Eb').accidental
+            -1
+        """
+        return self._properties[self][1]
 
     @property
     def chromatic_index(self):
@@ -200,7 +255,7 @@ class Note(MusicStr):
             >>> Note('C').chromatic_index
             3
         """
-        return self._chromatic_index_map[self]
+        return self._properties[self][2]
 
     @property
     def enharmonic_equivalent(self):
@@ -215,14 +270,69 @@ class Note(MusicStr):
             >>> Note('Eb').enharmonic_equivalent
             Note(D#)
         """
-        notes = [k for k, v in self._chromatic_index_map.items() if v == self.chromatic_index]
-        if len(notes) == 1:
+        ret = self._enharmonic_equivalents[self]
+        if ret is None:
             raise ValueError('{} has no enharmonic equivalent'.format(repr(self)))
-        return Note(notes[1]) if notes[0] == self else Note(notes[0])
+        return ret
+
+    def transpose(self, half_steps, letter_steps):
+        """ Return the Note which is half_steps above this one and letter_steps letters
+            further along the alphabet, or None if no standard note is
+
+        .. doctests ::
+
+            >>> Note('E').transpose(4, 2)
+            Note(G#)
+            >>> Note('E').transpose(4, 3)
+            Note(Ab)
+            >>> Note('B').transpose(-1, 0)
+            Note(Bb)
+        """
+        letter_index = (self.letter_index + letter_steps) % 7
+        return self.spell(self.chromatic_index + half_steps, letter_index)
+
+
+def _build_chromatic_table(excluded_accidental=None):
+    ret = []
+    for content, index in Note._chromatic_index_map.items():
+        if excluded_accidental and excluded_accidental in content:
+            continue
+        if len(ret) == index:
+            ret.append((Note(content),))
+        else:
+            ret[-1] += (Note(content),)
+    return tuple(ret)
+
+
+for _content, _chromatic_index in Note._chromatic_index_map.items():
+    _note = str.__new__(Note, _content)
+    Note._interned[_content] = _note
+    Note._properties[_note] = (
+        string.ascii_uppercase.index(_content[0]),
+        {'': 0, '#': 1, 'b': -1}[_content[1:]],
+        _chromatic_index
+    )
+    Note._spellings[(Note._properties[_note][0], _chromatic_index)] = _note
+
+# the chromatic scales never change, so they are only built once; Note.all(), Note.sharps()
+# and Note.flats() return copies of them
+Note._all_table = _build_chromatic_table()
+Note._sharps_table = _build_chromatic_table('b')
+Note._flats_table = _build_chromatic_table('#')
+for _notes in Note._all_table:
+    for _note in _notes:
+        Note._enharmonic_equivalents[_note] = (
+            None if len(_notes) == 1 else _notes[1] if _notes[0] is _note else _notes[0]
+        )
+
+
+def _unpickle_chord(root, spec, base):
+    return Chord.from_parts(root, spec, base)
 
 
 class Chord(object):
-    """ Class representing a musical chord
+    """ Class representing a musical chord.  Chords are immutable and interned, so
+        equivalent chords share a single instance while they are in the cache
 
     .. doctests ::
 
@@ -246,15 +356,27 @@ class Chord(object):
         ValueError: could not parse...empty base
         >>> str(Chord('Ab-7/Gb'))
         'A♭-7/G♭'
+        >>> Chord('G7') is Chord('G7')
+        True
+        >>> Chord('g7') == Chord('G7')
+        True
+        >>> Chord('G7').root = 'A'  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+            ...
+        AttributeError: Chord objects are immutable
     """
 
-    def __init__(self, content):
+    __slots__ = ('root', 'spec', 'base')
 
-        self._content = content
-        self.spec = self.base = ''
-        self.root, remainder = Note.split_str(content)
+    def __new__(cls, content):
+        return cls._from_content(content)
+
+    @classmethod
+    @functools.lru_cache(maxsize=CHORD_CACHE_SIZE)
+    def _from_content(cls, content):
+        root, remainder = Note.split_str(content)
         if not remainder:
-            return
+            return cls.from_parts(root)
 
         tokens = remainder.split('/')
         if len(tokens) > 2:
@@ -264,8 +386,121 @@ class Chord(object):
         elif len(tokens) == 2:
             if not tokens[1]:
                 raise ValueError('could not parse "{}" as a chord: empty base'.format(content))
-            self.base = Note(tokens[1])
-        self.spec = MusicStr(tokens[0])
+            return cls.from_parts(root, tokens[0], tokens[1])
+        return cls.from_parts(root, tokens[0])
+
+    @classmethod
+    def from_parts(cls, root, spec='', base=''):
+        """ Return the interned Chord made up of a root, a spec and an optional base.  Unlike
+            parsing a string, the parts are never ambiguous (eg. root B with spec b9)
+
+        .. doctests ::
+
+            >>> Chord.from_parts('B', 'b9')
+            Chord(Bb9)
+            >>> Chord.from_parts('B', 'b9').root
+            Note(B)
+            >>> Chord.from_parts('c', '-7', 'Bb') is Chord('C-7/Bb')
+            True
+        """
+        return cls._intern(Note(root), MusicStr(spec) if spec else '', Note(base) if base else '')
+
+    @classmethod
+    @functools.lru_cache(maxsize=CHORD_CACHE_SIZE)
+    def _intern(cls, root, spec, base):
+        self = object.__new__(cls)
+        object.__setattr__(self, 'root', root)
+        object.__setattr__(self, 'spec', spec)
+        object.__setattr__(self, 'base', base)
+        return self
+
+    def replace(self, **parts):
+        """ Return the interned Chord which differs from this one by the given parts
+
+        .. doctests ::
+
+            >>> Chord('C-7/Bb').replace(root='D', base='C')
+            Chord(D-7/C)
+        """
+        return self.from_parts(
+            parts.get('root', self.root),
+            parts.get('spec', self.spec),
+            parts.get('base', self.base)
+        )
+
+    def degrees(self, key):
+        """ Return the (root, base) of the chord as chromatic degrees relative to key.  base
+            is None for chords without one
+
+        .. doctests ::
+
+            >>> Chord('A-7/G').degrees(Key('C'))
+            (9, 7)
+            >>> Chord('F#7').degrees(Key('E-'))
+            (2, None)
+        """
+        return key.degree_of(self.root), key.degree_of(self.base) if self.base else None
+
+    def respell(self, from_key, to_key):
+        """ Return the chord which plays the same role in to_key as this one does in from_key
+
+        .. doctests ::
+
+            >>> Chord('A-7/G').respell(Key('C'), Key('Eb'))
+            Chord(C-7/Bb)
+        """
+        root_degree, base_degree = self.degrees(from_key)
+        return self.replace(
+            root=to_key.spell_degree(root_degree),
+            base=to_key.spell_degree(base_degree) if self.base else ''
+        )
+
+    def nashville(self, key, roman=False):
+        """ Return the chord written in the Nashville number system (or with roman numerals)
+            relative to key
+
+        .. doctests ::
+
+            >>> Chord('A-7/G').nashville(Key('C'))
+            MusicStr(6-7/5)
+            >>> Chord('Bb7').nashville(Key('C'), roman=True)
+            MusicStr(bVII7)
+            >>> str(Chord('Eb').nashville(Key('C-')))
+            '♭3'
+        """
+        numbers = constants.ROMAN_NUMERAL_DEGREES if roman else constants.NASHVILLE_DEGREES
+        root_degree, base_degree = self.degrees(key)
+        ret = numbers[root_degree] + self.spec
+        if self.base:
+            ret += '/' + numbers[base_degree]
+        return MusicStr(ret)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('{} objects are immutable'.format(self.__class__.__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError('{} objects are immutable'.format(self.__class__.__name__))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return _unpickle_chord, (self.root, self.spec, self.base)
+
+    def __eq__(self, other):
+        if not isinstance(other, Chord):
+            return NotImplemented
+        return (self.root, self.spec, self.base) == (other.root, other.spec, other.base)
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def __hash__(self):
+        return hash((self.root, self.spec, self.base))
 
     def _stitch_content(self):
         ret = self.root + self.spec
@@ -329,17 +564,19 @@ class Interval(object):
         [(7, constants.MINOR)],
         [(7, constants.MAJOR)],
     ]
+    # (number, modifier) -> half steps, the reverse of _half_step_map
+    _half_steps_by_interval = dict(
+        (mapping, half_steps)
+        for half_steps, mappings in enumerate(_half_step_map)
+        for mapping in mappings
+    )
 
     def __init__(self, number, modifier):
         number = int(number)
         if number < 1 or number > 7:
             raise ValueError('unsupported interval number: ' + str(number))
         self.number = number
-        supported_modifier = False
-        for key in constants.MODIFIER_DISPLAY.keys():
-            if modifier == key:
-                supported_modifier = True
-        if not supported_modifier:
+        if modifier not in constants.MODIFIER_DISPLAY:
             raise ValueError('unsupported interval modifier: ' + repr(modifier))
         self.modifier = modifier
 
@@ -385,10 +622,21 @@ class Interval(object):
 
     @property
     def half_steps(self):
-        for i in range(len(self._half_step_map)):
-            for mapping in self._half_step_map[i]:
-                if mapping[0] == self.number and mapping[1] == self.modifier:
-                    return i
+        """ Number of half steps spanned by the interval
+
+        .. doctests ::
+
+            >>> Interval(5, constants.DIMINISHED).half_steps
+            6
+            >>> Interval(2, constants.PERFECT).half_steps  # doctest: +ELLIPSIS
+            Traceback (most recent call last):
+                ...
+            ValueError: could not determine half steps...
+        """
+        try:
+            return self._half_steps_by_interval[(self.number, self.modifier)]
+        except KeyError:
+            pass
         raise ValueError('could not determine half steps based on interval ' + repr(self))
 
     def __eq__(self, other):
@@ -501,6 +749,86 @@ for _pattern, _names, _shorthand, _interval in known_modes:
             Mode._all_known_modes.append(_mode_obj)
 
 
+def _find_diatonic_notes(root, mode, note_lookup_list):
+    ret = []
+    current_note = root
+    next_note_i = root.chromatic_index
+    for half_steps in mode.half_steps_pattern:
+        ret.append(current_note)
+        current_letter_i = string.ascii_uppercase.find(current_note[0])
+        next_note_i = (next_note_i + half_steps) % 12
+        for next_note in (note_lookup_list[next_note_i]):
+            good_note = False
+            next_letter_i = string.ascii_uppercase.find(next_note[0])
+            if next_letter_i - current_letter_i in (1, -6):
+                good_note = True
+                break
+        if not good_note:
+            return None
+        current_note = next_note
+    return ret
+
+
+def _find_degree_notes(root, note_lookup_list):
+    """ Return the note used for each chromatic degree (0-11) above root, preferring naturals
+
+    .. doctests ::
+
+        >>> _find_degree_notes(Note('D'), Note._sharps_table)  # doctest: +NORMALIZE_WHITESPACE
+        (Note(D), Note(D#), Note(E), Note(F), Note(F#), Note(G), Note(G#), Note(A),
+         Note(A#), Note(B), Note(C), Note(C#))
+    """
+    ret = []
+    for degree in range(12):
+        choices = note_lookup_list[(root.chromatic_index + degree) % 12]
+        naturals = [choice for choice in choices if len(choice) == 1]
+        ret.append(naturals[0] if naturals else choices[-1])
+    return tuple(ret)
+
+
+# (root, half_steps_pattern) -> (note_lookup_list, diatonic_notes, degree_notes), or None for
+# keys which cannot be spelled sensibly.  Filled in for every known mode below
+_key_spellings = {}
+# half_steps_pattern -> tuple of the roots at which that mode can be spelled
+_transposable_roots = {}
+
+
+def _get_key_spelling(root, mode):
+    lookup = (root, tuple(mode.half_steps_pattern))
+    try:
+        return _key_spellings[lookup]
+    except KeyError:
+        pass
+    spelling = None
+    for note_lookup_list in (Note._sharps_table, Note._flats_table):
+        diatonic_notes = _find_diatonic_notes(root, mode, note_lookup_list)
+        if diatonic_notes:
+            spelling = (
+                note_lookup_list,
+                tuple(diatonic_notes),
+                _find_degree_notes(root, note_lookup_list)
+            )
+            break
+    return _key_spellings.setdefault(lookup, spelling)
+
+
+def _get_transposable_roots(mode):
+    pattern = tuple(mode.half_steps_pattern)
+    try:
+        return _transposable_roots[pattern]
+    except KeyError:
+        pass
+    roots = tuple(
+        note for notes in Note._all_table for note in notes
+        if _get_key_spelling(note, mode) is not None
+    )
+    return _transposable_roots.setdefault(pattern, roots)
+
+
+def _get_interned_key(root, mode):
+    return Key.get(root, mode=mode)
+
+
 class Key(object):
     """ Class representing a musical key
 
@@ -526,6 +854,10 @@ class Key(object):
         Key(D)
     """
 
+    _interned = False
+    # (content, half_steps_pattern or None) -> interned Key
+    _interned_keys = {}
+
     def __init__(self, content, mode=None):
         self._content = MusicStr.from_unicode(content)
         self.root, remainder = Note.split_str(content)
@@ -541,15 +873,64 @@ class Key(object):
         else:
             self.mode = mode
 
-        for lookup in (Note.sharps(), Note.flats()):
-            self.note_lookup_list = lookup
-            self.diatonic_notes = self._find_diatonic_notes_in_lookup(lookup)
-            if self.diatonic_notes:
-                break
-        if not self.diatonic_notes:
+        spelling = _get_key_spelling(self.root, self.mode)
+        if spelling is None:
             raise ValueError('{} is not a realistic key, try rooting at {}'.format(
                 self, self.root.enharmonic_equivalent
             ))
+        self.note_lookup_list, self.diatonic_notes, self.degree_notes = spelling
+
+    @classmethod
+    def get(cls, content, mode=None):
+        """ Return the interned Key for content and mode, which is shared by everyone who
+            asks for the same key and so cannot be modified
+
+        .. doctests ::
+
+            >>> Key.get('Bb-') is Key.get('bb', mode=Mode.Minor)
+            True
+            >>> Key.get('G').root = 'A'  # doctest: +ELLIPSIS
+            Traceback (most recent call last):
+                ...
+            AttributeError: interned Key objects are immutable
+            >>> Key.get('Fb')  # doctest: +ELLIPSIS
+            Traceback (most recent call last):
+                ...
+            ValueError: F♭ is not a realistic key, try rooting at E
+        """
+        lookup = (content, None if mode is None else tuple(mode.half_steps_pattern))
+        key = cls._interned_keys.get(lookup)
+        if key is None:
+            key = cls(content, mode=mode)
+            key = cls._interned_keys.setdefault(
+                (key.root, tuple(key.mode.half_steps_pattern)), key
+            )
+            object.__setattr__(key, '_interned', True)
+            cls._interned_keys[lookup] = key
+        return key
+
+    def __setattr__(self, name, value):
+        if self._interned:
+            raise AttributeError('interned {} objects are immutable'.format(
+                self.__class__.__name__
+            ))
+        object.__setattr__(self, name, value)
+
+    def _clone(self, copy_value):
+        ret = object.__new__(self.__class__)
+        ret.__dict__.update((name, copy_value(value)) for name, value in self.__dict__.items())
+        return ret
+
+    def __copy__(self):
+        return self if self._interned else self._clone(lambda value: value)
+
+    def __deepcopy__(self, memo):
+        return self if self._interned else self._clone(lambda value: copy.deepcopy(value, memo))
+
+    def __reduce_ex__(self, protocol):
+        if self._interned:
+            return _get_interned_key, (str.__str__(self.root), self.mode)
+        return super(Key, self).__reduce_ex__(protocol)
 
     def _find_diatonic_notes_in_lookup(self, note_lookup_list):
         """ Return a flat list of the notes in the key
@@ -566,23 +947,7 @@ class Key(object):
             >>> Key('C-')._find_diatonic_notes_in_lookup(Note.flats())
             [Note(C), Note(D), Note(Eb), Note(F), Note(G), Note(Ab), Note(Bb)]
         """
-        ret = []
-        current_note = self.root
-        next_note_i = self.root.chromatic_index
-        for half_steps in self.mode.half_steps_pattern:
-            ret.append(current_note)
-            current_letter_i = string.ascii_uppercase.find(current_note[0])
-            next_note_i = (next_note_i + half_steps) % 12
-            for next_note in (note_lookup_list[next_note_i]):
-                good_note = False
-                next_letter_i = string.ascii_uppercase.find(next_note[0])
-                if next_letter_i - current_letter_i in (1, -6):
-                    good_note = True
-                    break
-            if not good_note:
-                return None
-            current_note = next_note
-        return ret
+        return _find_diatonic_notes(self.root, self.mode, note_lookup_list)
 
     def _stitch_content(self):
         ret = self.root
@@ -599,7 +964,31 @@ class Key(object):
         return MusicStr.to_unicode(self._stitch_content())
 
     def to_root(self, new_root):
-        return Key(new_root, mode=self.mode)
+        return Key.get(new_root, mode=self.mode)
+
+    def degree_of(self, note):
+        """ Number of half steps from the root of the key up to note
+
+        .. doctests ::
+
+            >>> Key('Eb').degree_of(Note('C'))
+            9
+        """
+        return (note.chromatic_index - self.root.chromatic_index) % 12
+
+    def spell_degree(self, degree):
+        """ Return the note this key uses for the chromatic degree (half steps above its root)
+
+        .. doctests ::
+
+            >>> Key('Eb').spell_degree(9)
+            Note(C)
+            >>> Key('E').spell_degree(6)
+            Note(A#)
+            >>> Key('Bb').spell_degree(6)
+            Note(E)
+        """
+        return self.degree_notes[degree % 12]
 
     @property
     def relative_major(self):
@@ -607,7 +996,7 @@ class Key(object):
             raise AttributeError('{} does not have a relative major'.format(self))
         ionian_interval_z = self.mode.ionian_interval - 1
         new_root = self.diatonic_notes[(0 - ionian_interval_z) % 7]
-        return Key(new_root)
+        return Key.get(new_root)
 
     @property
     def relative_minor(self):
@@ -615,7 +1004,7 @@ class Key(object):
             raise AttributeError('{} does not have a relative minor'.format(self))
         ionian_interval_z = self.mode.ionian_interval - 1
         new_root = self.diatonic_notes[(5 - ionian_interval_z) % 7]
-        return Key(new_root, mode=Mode.Aeolian)
+        return Key.get(new_root, mode=Mode.Aeolian)
 
     @property
     def transposable_roots(self):
@@ -630,15 +1019,12 @@ class Key(object):
             [Note(A), Note(A#), Note(Bb), Note(B), Note(C), Note(C#), Note(D), Note(D#),
              Note(Eb), Note(E), Note(F), Note(F#), Note(G), Note(G#), Note(Ab)]
         """
-        ret = []
-        for chromatic_index in range(12):
-            for note in Note.all()[chromatic_index]:
-                try:
-                    self.to_root(note)
-                    ret.append(note)
-                except ValueError:
-                    pass
-        return ret
+        return list(_get_transposable_roots(self.mode))
+
+
+# there are only 21 roots and 7 modes, so work out every key's spelling up front
+for _mode in Mode.all():
+    _get_transposable_roots(_mode)
 
 
 class Subdivision(object):
@@ -734,7 +1120,7 @@ class Measure(object):
 
     def __setitem__(self, i, v, optional=False):
         self._check_for_too_many_subdivisions(i)
-        if type(v) != Subdivision:
+        if not isinstance(v, Subdivision):
             v = Subdivision(v)
         if optional:
             v.optional = True
@@ -750,3 +1136,141 @@ class Measure(object):
 
     def __repr__(self):
         return '{}({})'.format(self.__class__.__name__, len(self))
+
+
+def _resolved_deferred(value):
+    ret = Deferred(None)
+    ret._value = value
+    return ret
+
+
+class Deferred(object):
+    """ A value which is computed by calling func(*args) the first time it is needed.
+        Copies of a Deferred are the Deferred itself, so the value is only ever computed
+        once; pickling computes it first
+
+    .. doctests ::
+
+        >>> import copy
+        >>> deferred = Deferred(sorted, 'cba')
+        >>> deferred.is_resolved
+        False
+        >>> copy.deepcopy(deferred).get()
+        ['a', 'b', 'c']
+        >>> deferred.is_resolved
+        True
+    """
+
+    __slots__ = ('_func', '_args', '_value', '_lock')
+    _UNRESOLVED = object()
+
+    def __init__(self, func, *args):
+        self._func = func
+        self._args = args
+        self._value = self._UNRESOLVED
+        self._lock = threading.Lock()
+
+    @property
+    def is_resolved(self):
+        return self._value is not self._UNRESOLVED
+
+    def get(self):
+        if self._value is self._UNRESOLVED:
+            with self._lock:
+                if self._value is self._UNRESOLVED:
+                    self._value = self._func(*self._args)
+                    self._func = self._args = None
+        return self._value
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return _resolved_deferred, (self.get(),)
+
+    def __repr__(self):
+        return '{}({})'.format(
+            self.__class__.__name__, repr(self._value) if self.is_resolved else 'pending'
+        )
+
+
+class LazyDict(collections.abc.MutableMapping):
+    """ A dict whose values can be deferred until they are first looked up.  Each
+        LazyDict (including each deep copy of one) gets its own copy of a deferred
+        value, while the work of computing it is shared
+
+    .. doctests ::
+
+        >>> import copy
+        >>> song = LazyDict({'title': 'Lazy', 'chords': '[C][G]'})
+        >>> song.defer('chords', lambda chords: chords.split(']['))
+        >>> song
+        LazyDict({'title': 'Lazy', 'chords': Deferred(pending)})
+        >>> song_copy = copy.deepcopy(song)
+        >>> song_copy['chords']
+        ['[C', 'G]']
+        >>> song_copy['chords'].append('mutated')
+        >>> song['chords']
+        ['[C', 'G]']
+        >>> sorted(song.keys())
+        ['chords', 'title']
+    """
+
+    def __init__(self, data=None):
+        self._data = dict(data or {})
+
+    def defer(self, key, func):
+        """ Replace the value at key with func(value), computed on first lookup
+
+        :param key: existing key
+        :param func: function taking the current value and returning the new one
+        """
+        self._data[key] = Deferred(func, self._data[key])
+
+    def is_deferred(self, key):
+        return isinstance(self._data[key], Deferred)
+
+    def copy(self, resolve=False):
+        """ Return a shallow copy.  Deferred values stay deferred in the copy (and are
+            still only computed once) unless resolve is set, in which case they are
+            computed and kept here first, and the copy shares them
+
+        .. doctests ::
+
+            >>> song = LazyDict({'chords': '[C][G]'})
+            >>> song.defer('chords', lambda chords: chords.split(']['))
+            >>> song.copy().is_deferred('chords')
+            True
+            >>> song.copy(resolve=True)['chords'] is song['chords']
+            True
+        """
+        ret = self.__class__()
+        ret._data = dict(self.items()) if resolve else dict(self._data)
+        return ret
+
+    def __getitem__(self, key):
+        value = self._data[key]
+        if isinstance(value, Deferred):
+            value = self._data[key] = copy.deepcopy(value.get())
+        return value
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __repr__(self):
+        return '{}({})'.format(self.__class__.__name__, repr(self._data))
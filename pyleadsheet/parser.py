@@ -2,12 +2,35 @@ import os
 import yaml
 import funcy
 import re
+import copy
+import hashlib
+import threading
+import collections
+import pickle
+import zlib
 from . import models
 from . import constants
+from . import pool
+from . import __version__
 
 import logging
 logger = logging.getLogger(__name__)
 
+try:
+    YAML_LOADER = yaml.CSafeLoader
+except AttributeError:
+    YAML_LOADER = yaml.SafeLoader
+
+METADATA_KEYS = ('title', 'key', 'time', 'feel')
+REQUIRED_KEYS = ('title', 'key', 'time', 'progressions', 'form')
+PROGRESSION_REQUIRED_KEYS = ('name', 'chords')
+FORM_REQUIRED_KEYS = ('progression',)
+SONG_CACHE_MAX_ENTRIES = 512
+
+# bump whenever the structure returned by parse, or of the models it holds, changes, to
+# invalidate DiskSongCache entries, which are pickled
+PARSER_VERSION = 4
+
 YAML_SCHEMA = {
     'title': str,
     'key': str,
@@ -53,8 +76,119 @@ def _self_or_type(value):
     return type(value)
 
 
+SongError = collections.namedtuple('SongError', ['path', 'error'])
+
+
+def _format_key_path(key_path):
+    """ Turn a tuple of keys and indexes into a readable path
+
+    .. doctests ::
+
+        >>> _format_key_path(('form', 2, 'reps'))
+        'form[2].reps'
+        >>> _format_key_path(())
+        ''
+
+    :param key_path: tuple of dict keys (str) and list indexes (int)
+    :rtype: str
+    """
+    ret = ''
+    for key in key_path:
+        if isinstance(key, int):
+            ret += '[{0}]'.format(key)
+        else:
+            ret += '.' + key if ret else key
+    return ret
+
+
+def _compile_schema(schema):
+    """ Turn a schema definition (see YAML_SCHEMA) into a validator function.  The
+        validator takes a value, the tuple key path at which the value was found and a
+        list, to which it appends a SongError for every problem found
+
+    .. doctests ::
+
+        >>> validate = _compile_schema({'a': [{'b': int}]})
+        >>> errors = []
+        >>> validate({'a': [{'b': 'x'}, {'c': 1}]}, (), errors)
+        >>> for error in errors:
+        ...     error  # doctest: +ELLIPSIS
+        SongError(path='a[0].b', error=TypeError("invalid value found in yaml data: a[0].b='x'...))
+        SongError(path='a[1].c', error=KeyError("invalid key found in yaml data: a[1].c...))
+
+    :param schema: dict, single-item list or type (or tuple of types)
+    :rtype: function
+    """
+    expected = schema if isinstance(schema, tuple) else _self_or_type(schema)
+
+    def _check_type(value, key_path, errors):
+        if isinstance(value, expected):
+            return True
+        path = _format_key_path(key_path)
+        errors.append(SongError(path, TypeError(
+            'invalid value found in yaml data: {0}={1!r} (expecting {2})'.format(
+                path or '<document>', value, expected
+            )
+        )))
+        return False
+
+    if isinstance(schema, dict):
+        validators = dict((key, _compile_schema(subschema)) for key, subschema in schema.items())
+        valid_keys = sorted(validators.keys())
+
+        def _validate_dict(value, key_path, errors):
+            if not _check_type(value, key_path, errors):
+                return
+            for key, subvalue in value.items():
+                subkey_path = key_path + (key,)
+                validator = validators.get(key)
+                if validator is None:
+                    path = _format_key_path(subkey_path)
+                    errors.append(SongError(path, KeyError(
+                        'invalid key found in yaml data: {0} (valid keys are {1})'.format(
+                            path, valid_keys
+                        )
+                    )))
+                else:
+                    validator(subvalue, subkey_path, errors)
+        return _validate_dict
+
+    elif isinstance(schema, list):
+        validate_item = _compile_schema(schema[0])
+
+        def _validate_list(value, key_path, errors):
+            if not _check_type(value, key_path, errors):
+                return
+            for i, item in enumerate(value):
+                validate_item(item, key_path + (i,), errors)
+        return _validate_list
+
+    return _check_type
+
+
+_validate_song_data = _compile_schema(YAML_SCHEMA)
+
+
+def find_schema_errors(song_data):
+    """ Validate a dict of song data against the YAML_SCHEMA, returning every problem
+
+    .. doctests ::
+
+        >>> find_schema_errors({'title': 'ok'})
+        []
+        >>> [error.path for error in find_schema_errors({'title': [], 'form': [{'x': 1}, 2]})]
+        ['title', 'form[0].x', 'form[1]']
+
+    :param song_data: dict representation of a song
+    :rtype: list of SongErrors
+    """
+    errors = []
+    _validate_song_data(song_data, (), errors)
+    return errors
+
+
 def _validate_schema(song_data):
-    """ Validate a dict of song data against the YAML_SCHEMA
+    """ Validate a dict of song data against the YAML_SCHEMA, raising the first problem
 
     .. doctests ::
 
@@ -83,38 +217,9 @@ def _validate_schema(song_data):
     :param song_data: dict representation of a song
     :raises: KeyError, TypeError
     """
-    for key, value in song_data.items():
-        if key not in YAML_SCHEMA.keys():
-            raise KeyError('invalid key found in yaml data: {0} (valid keys are {1})'.format(
-                key, YAML_SCHEMA.keys()
-            ))
-        elif not isinstance(value, _self_or_type(YAML_SCHEMA[key])):
-            raise TypeError('invalid value found in yaml data: {0}={1} (expecting {2})'.format(
-                key, value, _self_or_type(YAML_SCHEMA[key])
-            ))
-        elif isinstance(value, list):
-            for i in range(len(value)):
-                if not isinstance(value[i], _self_or_type(YAML_SCHEMA[key][0])):
-                    raise TypeError(
-                        'invalid value found in yaml data: {0}[{1}]={2} (expecting {3})'.format(
-                            key, i, value, _self_or_type(YAML_SCHEMA[key][0])
-                        )
-                    )
-                for subkey, subvalue in value[i].items():
-                    if subkey not in YAML_SCHEMA[key][0].keys():
-                        raise KeyError(
-                            'invalid key found in yaml data: '
-                            '{0}[{1}][{2}] (valid keys are {3})'.format(
-                                key, i, subkey, YAML_SCHEMA[key][0].keys()
-                            )
-                        )
-                    elif not isinstance(subvalue, YAML_SCHEMA[key][0][subkey]):
-                        raise TypeError(
-                            'invalid value found in yaml data: '
-                            '{0}[{1}][{2}]={3} (expecting {4})'.format(
-                                key, i, subkey, subvalue, YAML_SCHEMA[key][0][subkey]
-                            )
-                        )
+    errors = find_schema_errors(song_data)
+    if errors:
+        raise errors[0].error
 
 
 CHORD_MARKUP = {'open_char': '[', 'close_char': ']', 'separator': ':'}
@@ -123,9 +228,66 @@ PROGRESSION_GROUPS = {
     'suffix': {'open_char': '(', 'close_char': ')'}
 }
 
+TOKEN_CHORD = 'chord'
+TOKEN_GROUP_OPEN = 'group_open'
+TOKEN_GROUP_CLOSE = 'group_close'
+TOKEN_ARG = 'arg'
+TOKEN_TEXT = 'text'
+ProgressionToken = collections.namedtuple('ProgressionToken', ['type', 'value', 'start', 'end'])
+
+_GROUP_TYPES_BY_OPEN_CHAR = dict(
+    (pg['open_char'], group_type) for group_type, pg in PROGRESSION_GROUPS.items()
+)
+_GROUP_TYPES_BY_CLOSE_CHAR = dict(
+    (pg['close_char'], group_type) for group_type, pg in PROGRESSION_GROUPS.items()
+)
+_DURATION_RE = re.compile(r'([\d\.]+)([{0}{1}{2}])'.format(
+    constants.DURATION_UNIT_MEASURE,
+    constants.DURATION_UNIT_BEAT,
+    constants.DURATION_UNIT_HALFBEAT
+))
+
+
+def _compile_progression_token_re():
+    """ Build the regex used to walk a progression string one token at a time.  Every
+        character of the input is consumed by exactly one alternative, so a single
+        left-to-right scan covers the whole string
+
+    .. doctests ::
+
+        >>> regex = _compile_progression_token_re()
+        >>> [m.lastgroup for m in regex.finditer('{2 [A]}/x')]
+        ['group_open', 'text', 'space', 'chord', 'group_close', 'arg', 'text']
+
+    :rtype: re.RegexObject
+    """
+    group_open_chars = ''.join(sorted(_GROUP_TYPES_BY_OPEN_CHAR.keys()))
+    group_close_chars = ''.join(sorted(_GROUP_TYPES_BY_CLOSE_CHAR.keys()))
+    special_chars = CHORD_MARKUP['open_char'] + group_open_chars + group_close_chars + \
+        constants.ARG_ROW_BREAK
+    return re.compile(
+        r'(?P<space>\s+)'
+        r'|{chord_open}(?P<chord>[^{chord_close}]*){chord_close}'
+        r'|(?P<unclosed_chord>{chord_open})'
+        r'|(?P<group_open>[{group_open}])'
+        r'|(?P<group_close>[{group_close}])'
+        r'|(?P<arg>{arg})'
+        r'|(?P<text>[^\s{special}]+)'.format(
+            chord_open=re.escape(CHORD_MARKUP['open_char']),
+            chord_close=re.escape(CHORD_MARKUP['close_char']),
+            group_open=re.escape(group_open_chars),
+            group_close=re.escape(group_close_chars),
+            arg=re.escape(constants.ARG_ROW_BREAK),
+            special=re.escape(special_chars)
+        )
+    )
+
+
+_PROGRESSION_TOKEN_RE = _compile_progression_token_re()
 
-def _find_i(progression_substr, close_char):
-    """ Return the index of close_char, otherwise raise an exception
+
+def _find_i(progression_str, close_char, start_i=0):
+    """ Return the index of close_char at or after start_i, otherwise raise an exception
 
     .. doctests ::
 
@@ -135,21 +297,64 @@ def _find_i(progression_substr, close_char):
         ValueError: reached end of string...
         >>> _find_i('got/slash?', '/')
         3
+        >>> _find_i('a/b/c', '/', 2)
+        3
 
-    :param progression_substr: string to search through
+    :param progression_str: string to search through
     :param close_char: char to search for
+    :param start_i: index at which to start searching
     :rtype: int
     :raises: ValueError
     """
-    end_i = progression_substr.find(close_char)
+    end_i = progression_str.find(close_char, start_i)
     if end_i == -1:
-        raise ValueError('reached end of string looking for "{0}"'.format(close_char))
+        raise ValueError('reached end of string looking for "{0}" (starting at offset {1})'.format(
+            close_char, start_i
+        ))
     return end_i
 
 
-def _parse_chord(progression_substr):
-    """ Parse a progression_substr for a chord directive, returning both the chord
-        definition and the index where it ended
+def _parse_chord_content(chord_content):
+    """ Convert the contents of a chord directive (without its markup) into a chord definition
+
+    .. doctests ::
+
+        >>> chord_def = _parse_chord_content('?G:1m1b')
+        >>> chord_def['chord'], chord_def['optional']
+        (Chord(G), True)
+        >>> chord_def['duration']
+        [ChordDuration(count=1, unit='m'), ChordDuration(count=1, unit='b')]
+
+    :param chord_content: chord directive, eg. "A-7:2b"
+    :rtype: dict
+    """
+    tokens = chord_content.split(CHORD_MARKUP['separator'])
+    chord_def = {
+        'chord': None,
+        'duration': [],
+        'optional': False
+    }
+    chord_content = tokens[0]
+    if chord_content == 'rest':
+        chord_def['chord'] = constants.REST
+    elif chord_content == 'riff':
+        chord_def['chord'] = constants.RIFF
+    else:
+        if chord_content.startswith('?'):
+            chord_def['optional'] = True
+            chord_content = chord_content[1:]
+        chord_def['chord'] = models.Chord(chord_content)
+    if len(tokens) == 1:
+        chord_def['duration'].append(models.ChordDuration(1, constants.DURATION_UNIT_MEASURE))
+    else:
+        for number, unit in _DURATION_RE.findall(tokens[1]):
+            chord_def['duration'].append(models.ChordDuration(int(number), unit))
+    return chord_def
+
+
+def _parse_chord(progression_str, start_i=0):
+    """ Parse a chord directive whose content begins at start_i, returning both the chord
+        definition and the index of the closing character
 
     .. doctests ::
 
@@ -179,109 +384,169 @@ def _parse_chord(progression_substr):
         True
         >>> len(parsed['duration'])
         2
+        >>> parsed, end_i = _parse_chord('[A][B7]', 4)
+        >>> parsed['chord'], end_i
+        (Chord(B7), 6)
 
-    :param progression_substr: part of a progression string
+    :param progression_str: string containing a chord directive
+    :param start_i: index of the first character after the open char
     :rtype: tuple
     """
-    end_i = _find_i(progression_substr, CHORD_MARKUP['close_char'])
-    tokens = progression_substr[:end_i].split(CHORD_MARKUP['separator'])
-    chord_def = {
-        'chord': None,
-        'duration': [],
-        'optional': False
-    }
-    chord_content = tokens[0]
-    if chord_content == 'rest':
-        chord_def['chord'] = constants.REST
-    elif chord_content == 'riff':
-        chord_def['chord'] = constants.RIFF
-    else:
-        if chord_content.startswith('?'):
-            chord_def['optional'] = True
-            chord_content = chord_content[1:]
-        chord_def['chord'] = models.Chord(chord_content)
-    if len(tokens) == 1:
-        chord_def['duration'].append(models.ChordDuration(1, constants.DURATION_UNIT_MEASURE))
-    else:
-        for number, unit in funcy.re_all(r'([\d\.]+)([{0}{1}{2}])'.format(
-            constants.DURATION_UNIT_MEASURE,
-            constants.DURATION_UNIT_BEAT,
-            constants.DURATION_UNIT_HALFBEAT
-        ), tokens[1]):
-            chord_def['duration'].append(models.ChordDuration(int(number), unit))
-    return chord_def, end_i
+    end_i = _find_i(progression_str, CHORD_MARKUP['close_char'], start_i)
+    return _parse_chord_content(progression_str[start_i:end_i]), end_i
 
 
-def _all_open_chars():
-    """ Convenience method to gather all directive open chars
+def _tokenize_progression_str(progression_str):
+    """ Walk a progression string once, yielding a ProgressionToken for every directive
+        or run of text.  Whitespace is dropped, and start/end are offsets into the
+        original string
 
     .. doctests ::
 
-        >>> _all_open_chars()
-        ['[', '(', '{']
+        >>> for token in _tokenize_progression_str('{2 [A]} /'):
+        ...     token
+        ProgressionToken(type='group_open', value='repeat', start=0, end=1)
+        ProgressionToken(type='text', value='2', start=1, end=2)
+        ProgressionToken(type='chord', value='A', start=3, end=6)
+        ProgressionToken(type='group_close', value='repeat', start=6, end=7)
+        ProgressionToken(type='arg', value='/', start=8, end=9)
+        >>> list(_tokenize_progression_str('[A][B'))  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+            ...
+        ValueError: reached end of string looking for "]" (starting at offset 4)
 
-    :rtype: list
+    :param progression_str: complete progression definition
+    :rtype: generator
+    :raises: ValueError
     """
-    ret = [CHORD_MARKUP['open_char']]
-    ret += sorted([pg['open_char'] for pg in PROGRESSION_GROUPS.values()])
-    return ret
+    for match in _PROGRESSION_TOKEN_RE.finditer(progression_str):
+        token_type = match.lastgroup
+        start, end = match.span()
+        if token_type == 'space':
+            continue
+        elif token_type == 'chord':
+            value = ''.join(match.group(token_type).split())
+            yield ProgressionToken(TOKEN_CHORD, value, start, end)
+        elif token_type == 'unclosed_chord':
+            _find_i(progression_str, CHORD_MARKUP['close_char'], end)
+        elif token_type == 'group_open':
+            yield ProgressionToken(
+                TOKEN_GROUP_OPEN, _GROUP_TYPES_BY_OPEN_CHAR[match.group()], start, end
+            )
+        elif token_type == 'group_close':
+            yield ProgressionToken(
+                TOKEN_GROUP_CLOSE, _GROUP_TYPES_BY_CLOSE_CHAR[match.group()], start, end
+            )
+        elif token_type == 'arg':
+            yield ProgressionToken(TOKEN_ARG, match.group(), start, end)
+        else:
+            yield ProgressionToken(TOKEN_TEXT, match.group(), start, end)
 
 
-def _parse_group(progression_substr, group_type):
-    """ Parse a group of chord directives in a progression.  Return both the group
-        data and index of the ending character
+def _raise_garbage_exception(progression_str, start_i, end_i):
+    raise ValueError(
+        'found garbage characters in progression: "{}"[{}:{}] ({})'.format(
+            progression_str,
+            start_i,
+            end_i,
+            progression_str[start_i:end_i]
+        )
+    )
+
+
+def _parse_group(progression_str, tokens, open_i):
+    """ Parse a group of chord directives whose open token is tokens[open_i].  Return both
+        the group data and the index of the matching close token
 
     .. doctests ::
 
-        >>> _parse_group('groupname[G][A]', 'badtype')  # doctest: +ELLIPSIS
-        Traceback (most recent call last):
-            ...
-        ValueError: invalid group type: badtype
-        >>> _parse_group('groupname[G][A]', 'suffix')  # doctest: +ELLIPSIS
-        Traceback (most recent call last):
-            ...
-        ValueError: reached end of string...
-        >>> parsed, end_i = _parse_group('groupname[G][A])adsf', 'suffix')
+        >>> progression_str = '(groupname[G][A])adsf'
+        >>> tokens = list(_tokenize_progression_str(progression_str))
+        >>> parsed, close_i = _parse_group(progression_str, tokens, 0)
         >>> parsed['group']
         'suffix'
         >>> parsed['note']
         'groupname'
         >>> len(parsed['progression'])
         2
+        >>> tokens[close_i]
+        ProgressionToken(type='group_close', value='suffix', start=16, end=17)
+        >>> progression_str = '(groupname[G][A]'
+        >>> tokens = list(_tokenize_progression_str(progression_str))
+        >>> _parse_group(progression_str, tokens, 0)  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+            ...
+        ValueError: reached end of string looking for ")" (group opened at offset 0)
 
-    :param progression_substr: part of a progression string
-    :param group_type: valid group type, dictated by open_char that comes before
+    :param progression_str: complete progression definition, used for error reporting
+    :param tokens: list of ProgressionTokens from _tokenize_progression_str
+    :param open_i: index of the group's open token in tokens
     :rtype: tuple
     :raises: ValueError
     """
+    open_token = tokens[open_i]
+    group_type = open_token.value
     if group_type not in PROGRESSION_GROUPS.keys():
         raise ValueError('invalid group type: ' + group_type)
-    close_char = PROGRESSION_GROUPS[group_type]['close_char']
-    end_i = _find_i(progression_substr, close_char)
-    ret = {'group': group_type}
-    first_directive_open_i = 9999
-    for open_char in _all_open_chars():
-        try:
-            open_i = _find_i(progression_substr, open_char)
-        except ValueError:
-            continue
-        if open_i < first_directive_open_i:
-            first_directive_open_i = open_i
-    ret['note'] = progression_substr[:first_directive_open_i] \
-        if first_directive_open_i > 0 else None
-    ret['progression'] = _parse_progression_str(progression_substr[first_directive_open_i:end_i])
-    return ret, end_i
+    note_parts = []
+    i = open_i + 1
+    while i < len(tokens) and tokens[i].type == TOKEN_TEXT:
+        note_parts.append(tokens[i].value)
+        i += 1
+    progression, close_i = _parse_progression_tokens(progression_str, tokens, i, open_token)
+    ret = {
+        'group': group_type,
+        'note': ''.join(note_parts) or None,
+        'progression': progression
+    }
+    return ret, close_i
 
 
-def _raise_garbage_exception(progression_str, start_i, end_i):
-    raise ValueError(
-        'found garbage characters at in progression: "{}"[{}:{}] ({})'.format(
-            progression_str,
-            start_i,
-            end_i,
-            progression_str[start_i:end_i]
-        )
-    )
+def _parse_progression_tokens(progression_str, tokens, start_i=0, open_token=None):
+    """ Consume tokens starting at start_i until the end of the token list or, when
+        open_token is given, until its matching close token.  Return both the list of
+        parsed progression parts and the index where parsing stopped
+
+    :param progression_str: complete progression definition, used for error reporting
+    :param tokens: list of ProgressionTokens from _tokenize_progression_str
+    :param start_i: index in tokens at which to start
+    :param open_token: the ProgressionToken which opened the enclosing group, if any
+    :rtype: tuple
+    :raises: ValueError
+    """
+    ret = []
+    i = start_i
+    while i < len(tokens):
+        token = tokens[i]
+        if token.type == TOKEN_CHORD:
+            ret.append(_parse_chord_content(token.value))
+        elif token.type == TOKEN_GROUP_OPEN:
+            group_def, i = _parse_group(progression_str, tokens, i)
+            ret.append(group_def)
+        elif token.type == TOKEN_ARG:
+            ret.append({'arg': token.value})
+        elif token.type == TOKEN_GROUP_CLOSE and open_token and token.value == open_token.value:
+            break
+        else:
+            end_i = token.end
+            while i + 1 < len(tokens) and tokens[i + 1].type == TOKEN_TEXT:
+                i += 1
+                end_i = tokens[i].end
+            _raise_garbage_exception(progression_str, token.start, end_i)
+        i += 1
+    else:
+        if open_token:
+            raise ValueError('reached end of string looking for "{0}" '
+                             '(group opened at offset {1})'.format(
+                                 PROGRESSION_GROUPS[open_token.value]['close_char'],
+                                 open_token.start
+                             ))
+    if not ret:
+        raise ValueError('no valid progression parts found in "{}"'.format(
+            progression_str[tokens[start_i - 1].end:tokens[i].start] if open_token
+            else progression_str
+        ))
+    return ret, i
 
 
 def _parse_progression_str(progression_str):
@@ -296,65 +561,46 @@ def _parse_progression_str(progression_str):
         >>> _parse_progression_str('asdf')  # doctest: +ELLIPSIS
         Traceback (most recent call last):
             ...
-        ValueError: no valid progression parts...
+        ValueError: found garbage...
         >>> _parse_progression_str('[A]asdfasdf')  # doctest: +ELLIPSIS
         Traceback (most recent call last):
             ...
         ValueError: found garbage...
-        >>> _parse_progression_str('[A]asdfasdf[B]')  # doctest: +ELLIPSIS
+        >>> _parse_progression_str('[A] asdf asdf [B]')  # doctest: +ELLIPSIS
         Traceback (most recent call last):
             ...
-        ValueError: found garbage...
+        ValueError: found garbage characters in progression: "[A] asdf asdf [B]"[4:13] (asdf asdf)
+        >>> _parse_progression_str('{2}')  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+            ...
+        ValueError: no valid progression parts...
+        >>> _parse_progression_str('[A])')  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+            ...
+        ValueError: found garbage characters in progression: "[A])"[3:4] ())
         >>> parts = _parse_progression_str('[A][B]')
         >>> len(parts)
         2
         >>> parts = _parse_progression_str('{2[A][B7#9]}')
         >>> len(parts)
         1
+        >>> parts = _parse_progression_str('{2 [A] (coda [B]) / [C]}')
+        >>> parts[0]['note'], parts[0]['progression'][1]['note']
+        ('2', 'coda')
+        >>> parts[0]['progression'][2]
+        {'arg': '/'}
 
     :param progression_str: complete progression definition
     :rtype: list
     :raises: ValueError
     """
-    progression_str = re.sub(r'\s+', '', progression_str)
-    ret = []
-    i = 0
-    last_directive_close = 0
-    while i < len(progression_str):
-        offset = 0
-        progression_char = progression_str[i]
-        group_flag = False
-        for group_type in PROGRESSION_GROUPS.keys():
-            if progression_char == PROGRESSION_GROUPS[group_type]['open_char']:
-                if last_directive_close < i:
-                    _raise_garbage_exception(progression_str, last_directive_close, i)
-                group_def, offset = _parse_group(progression_str[i+1:], group_type)
-                ret.append(group_def)
-                group_flag = True
-                last_directive_close = i + offset + 2
-        if not group_flag:
-            if progression_char == CHORD_MARKUP['open_char']:
-                if last_directive_close < i:
-                    _raise_garbage_exception(progression_str, last_directive_close, i)
-                chord_def, offset = _parse_chord(progression_str[i+1:])
-                ret.append(chord_def)
-                last_directive_close = i + offset + 2
-            elif progression_char == constants.ARG_ROW_BREAK:
-                if last_directive_close < i:
-                    _raise_garbage_exception(progression_str, last_directive_close, i)
-                ret.append({'arg': constants.ARG_ROW_BREAK})
-                last_directive_close = i + 2
-        i += offset + 1
-    if last_directive_close == 0:
-        raise ValueError('no valid progression parts found in "{}"'.format(progression_str))
-    if last_directive_close < i:
-        _raise_garbage_exception(progression_str, last_directive_close, i)
-    return ret
+    tokens = list(_tokenize_progression_str(progression_str))
+    progression, end_i = _parse_progression_tokens(progression_str, tokens)
+    return progression
 
 
 def _process_progression_chords(song_data):
     for progression in song_data['progressions']:
-        logger.debug('parsing chords for progression: ' + progression['name'])
         progression['chords'] = _parse_progression_str(progression['chords'])
 
 
@@ -373,21 +619,16 @@ def _tokenize_comment_string(comment_string):
     """
     ret = []
     i = 0
-    current_token = ''
-    while i < len(comment_string):
-        offset = 0
-        current_char = comment_string[i]
-        if current_char == CHORD_MARKUP['open_char']:
-            ret.append(current_token)
-            current_token = ''
-            chord_def, offset = _parse_chord(comment_string[i+1:])
-            ret.append(chord_def['chord'])
-            i += offset + 1
-        else:
-            current_token += current_char
-        i += 1
-    if current_token:
-        ret.append(current_token)
+    while True:
+        open_i = comment_string.find(CHORD_MARKUP['open_char'], i)
+        if open_i == -1:
+            break
+        ret.append(comment_string[i:open_i])
+        chord_def, end_i = _parse_chord(comment_string, open_i + 1)
+        ret.append(chord_def['chord'])
+        i = end_i + 1
+    if i < len(comment_string):
+        ret.append(comment_string[i:])
     return ret
 
 
@@ -438,13 +679,63 @@ def _process_time_signature(song_data):
 
 def _process_key(song_data):
     if 'key' in song_data.keys():
-        song_data['key'] = models.Key(song_data['key'])
+        song_data['key'] = models.Key.get(song_data['key'])
+
+
+def _load_yaml(yaml_str):
+    """ Load a YAML document using the fastest available safe loader
+
+    .. doctests ::
+
+        >>> _load_yaml('title: Homeward Bound')
+        {'title': 'Homeward Bound'}
+
+    :param yaml_str: string or file-like object containing a YAML document
+    :rtype: object
+    """
+    return yaml.load(yaml_str, Loader=YAML_LOADER)
+
+
+def _make_lazy(song_data):
+    for key in ('progressions', 'form'):
+        song_data[key] = [models.LazyDict(data_group) for data_group in song_data[key]]
+    return models.LazyDict(song_data)
 
 
 def parse(yaml_str):
-    song_data = yaml.load(yaml_str)
+    """ Parse a YAML song definition.  The song and each of its progressions and form
+        sections are models.LazyDicts.  Progression chords and comments are parsed here,
+        once, so that an invalid song fails straight away
+
+    .. doctests ::
+
+        >>> song = parse('''
+        ... title: Parsed
+        ... key: C
+        ... time: 4/4
+        ... progressions: [{name: a, chords: "[C][G7]"}]
+        ... form: [{progression: a, lyrics: la la}]
+        ... ''')
+        >>> song['progressions'][0].is_deferred('chords')
+        False
+        >>> len(song['progressions'][0]['chords'])
+        2
+        >>> parse('''
+        ... title: Bad
+        ... progressions: [{name: a, chords: "[C] garbage"}]
+        ... form: [{progression: a}]
+        ... ''')  # doctest: +ELLIPSIS
+        Traceback (most recent call last):
+            ...
+        ValueError: found garbage characters in progression: "[C] garbage"[4:11] (garbage)
+
+    :param yaml_str: string containing a YAML song definition
+    :rtype: models.LazyDict
+    """
+    song_data = _load_yaml(yaml_str)
     logger.debug('parsing input for song: ' + song_data['title'])
     _validate_schema(song_data)
+    song_data = _make_lazy(song_data)
     _process_progression_chords(song_data)
     _process_comments(song_data)
     _process_time_signature(song_data)
@@ -455,16 +746,884 @@ def parse(yaml_str):
 def _get_content_from_song_file(filepath):
     if not os.path.isfile(filepath):
         raise IOError('could not find any file at {0}'.format(filepath))
-    content = open(filepath, 'r').read()
+    with open(filepath, 'r') as song_file:
+        content = song_file.read()
     return content
 
 
-def parse_file(filepath):
+class DiskSongCache(object):
+    """ Persistent store of parsed songs, one file per song in cache_dir.  Entries are
+        keyed by the sha1 of the song's content and stamped with the package and parser
+        versions; stale or corrupt entries are treated as missing and overwritten
+
+    .. doctests ::
+
+        >>> import tempfile, shutil
+        >>> cache_dir = tempfile.mkdtemp()
+        >>> disk_cache = DiskSongCache(cache_dir)
+        >>> disk_cache.load('abc123')
+        >>> disk_cache.store('abc123', {'title': 'Stored', 'chord': models.Chord('G7')})
+        >>> disk_cache.load('abc123')['chord'] is models.Chord('G7')
+        True
+        >>> with open(disk_cache._entry_path('abc123'), 'r+b') as entry:
+        ...     _ = entry.seek(-4, os.SEEK_END)
+        ...     _ = entry.write(b'junk')
+        >>> disk_cache.load('abc123')
+        >>> shutil.rmtree(cache_dir)
+    """
+
+    MAGIC = b'pyleadsheet-song'
+    ENTRY_SUFFIX = '.pickle'
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.stamp = '{0}-{1}'.format(__version__, PARSER_VERSION).encode('ascii')
+        if not os.path.isdir(cache_dir):
+            logger.debug('creating cache dir: ' + cache_dir)
+            os.makedirs(cache_dir)
+
+    def _entry_path(self, content_hash):
+        return os.path.join(self.cache_dir, content_hash + self.ENTRY_SUFFIX)
+
+    def _header(self, content_hash, payload):
+        return b' '.join((
+            self.MAGIC,
+            self.stamp,
+            content_hash.encode('ascii'),
+            hashlib.sha1(payload).hexdigest().encode('ascii')
+        )) + b'\n'
+
+    def load(self, content_hash):
+        """ Return the parsed song stored for content_hash, or None if there is no
+            valid entry
+
+        :param content_hash: sha1 hexdigest of the song file's content
+        :rtype: dict
+        """
+        entry_path = self._entry_path(content_hash)
+        try:
+            with open(entry_path, 'rb') as entry:
+                header = entry.readline()
+                payload = entry.read()
+        except IOError:
+            return None
+        if header != self._header(content_hash, payload):
+            logger.debug('discarding stale or corrupt cache entry: ' + entry_path)
+            return None
+        try:
+            return pickle.loads(zlib.decompress(payload))
+        except Exception as e:
+            logger.debug('discarding unreadable cache entry: {0} ({1})'.format(entry_path, e))
+            return None
+
+    def store(self, content_hash, song_data):
+        """ Write a parsed song to the cache, replacing any existing entry atomically
+
+        :param content_hash: sha1 hexdigest of the song file's content
+        :param song_data: parsed song
+        """
+        payload = zlib.compress(pickle.dumps(song_data, pickle.HIGHEST_PROTOCOL))
+        entry_path = self._entry_path(content_hash)
+        tmp_path = '{0}.{1}.tmp'.format(entry_path, os.getpid())
+        with open(tmp_path, 'wb') as entry:
+            entry.write(self._header(content_hash, payload))
+            entry.write(payload)
+        os.replace(tmp_path, entry_path)
+
+
+CacheStats = collections.namedtuple(
+    'CacheStats', ['hits', 'misses', 'evictions', 'entries', 'source_bytes']
+)
+
+
+class SongCache(object):
+    """ Thread-safe LRU cache of parsed songs keyed on file identity, ie.
+        (path, mtime_ns, size, content hash).  A file whose size and mtime are unchanged
+        since it was last read is a hit without being read and hashed again.  Every get
+        returns an isolated copy of the cached song, so callers are free to mutate what
+        they are given.  Pass shared=True to get the cached song itself instead, which
+        saves copying it but must never be modified (see transposer.transpose_song for
+        one way to use it).  max_source_bytes bounds the size of the cached songs'
+        source text; a parsed song takes roughly 12 to 17 times as much memory
+
+    .. doctests ::
+
+        >>> import tempfile
+        >>> song_file = tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False)
+        >>> _ = song_file.write('title: Cached\\nkey: C\\nprogressions: []\\nform: []\\n')
+        >>> song_file.close()
+        >>> cache = SongCache(max_entries=1)
+        >>> song = cache.get(song_file.name)
+        >>> song['title'] = 'Mutated'
+        >>> cache.get(song_file.name)['title']
+        'Cached'
+        >>> cache.stats()
+        CacheStats(hits=1, misses=1, evictions=0, entries=1, source_bytes=47)
+        >>> cache.get(song_file.name, shared=True) is cache.get(song_file.name, shared=True)
+        True
+        >>> with open(song_file.name, 'w') as f:
+        ...     _ = f.write('title: Changed\\nkey: C\\nprogressions: []\\nform: []\\n')
+        >>> cache.get(song_file.name)['title']
+        'Changed'
+        >>> os.remove(song_file.name)
+    """
+
+    def __init__(self, max_entries=None, max_source_bytes=None, disk_cache=None):
+        self.max_entries = max_entries
+        self.max_source_bytes = max_source_bytes
+        self.disk_cache = disk_cache
+        self._lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._entries = collections.OrderedDict()
+            # the identity key each song file was last read with, by absolute path
+            self._file_keys = {}
+            self._source_bytes = 0
+            self._hits = self._misses = self._evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return CacheStats(
+                self._hits, self._misses, self._evictions, len(self._entries), self._source_bytes
+            )
+
+    @staticmethod
+    def _stat(filepath):
+        if not os.path.isfile(filepath):
+            raise IOError('could not find any file at {0}'.format(filepath))
+        filepath = os.path.abspath(filepath)
+        return filepath, os.stat(filepath)
+
+    @classmethod
+    def identify(cls, filepath):
+        """ Read a song file, returning both the identity key for its current state and
+            its content
+
+        :param filepath: path to a song file
+        :rtype: tuple
+        """
+        filepath, stat = cls._stat(filepath)
+        with open(filepath, 'rb') as song_file:
+            content = song_file.read()
+        key = (filepath, stat.st_mtime_ns, stat.st_size, hashlib.sha1(content).hexdigest())
+        return key, content.decode('utf-8')
+
+    def _evict(self):
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries) or
+            (self.max_source_bytes is not None and self._source_bytes > self.max_source_bytes)
+        ):
+            key, (song_data, size) = self._entries.popitem(last=False)
+            if self._file_keys.get(key[0]) == key:
+                del self._file_keys[key[0]]
+            self._source_bytes -= size
+            self._evictions += 1
+
+    def put(self, key, song_data, size):
+        """ Store a parsed song under an identity key
+
+        :param key: identity key, eg. from SongCache.identify
+        :param song_data: parsed song, which the cache takes ownership of
+        :param size: size of the song's source, in bytes (see max_source_bytes)
+        """
+        with self._lock:
+            if key in self._entries:
+                self._source_bytes -= self._entries[key][1]
+            if len(key) == 4:
+                self._file_keys[key[0]] = key
+            self._entries[key] = (song_data, size)
+            self._entries.move_to_end(key)
+            self._source_bytes += size
+            self._evict()
+
+    def _load_or_parse(self, content_hash, content):
+        song_data = self.disk_cache.load(content_hash) if self.disk_cache else None
+        if song_data is None:
+            song_data = parse(content)
+            if self.disk_cache:
+                self.disk_cache.store(content_hash, song_data)
+        return song_data
+
+    def _get(self, key, content, shared):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._hits += 1
+                self._entries.move_to_end(key)
+            elif content is not None:
+                self._misses += 1
+        if entry is not None:
+            song_data = entry[0]
+        elif content is None:
+            return None
+        else:
+            song_data = self._load_or_parse(key[-1], content)
+            self.put(key, song_data, len(content))
+        return song_data if shared else copy.deepcopy(song_data)
+
+    def get(self, filepath, shared=False):
+        """ Return an isolated copy of the parsed song at filepath, parsing it if the
+            file is not cached in its current state
+
+        :param filepath: path to a song file
+        :param shared: return the cached song itself, which must not be modified
+        :rtype: models.LazyDict
+        """
+        filepath, stat = self._stat(filepath)
+        with self._lock:
+            key = self._file_keys.get(filepath)
+        if key is not None and key[1:3] == (stat.st_mtime_ns, stat.st_size):
+            song_data = self._get(key, None, shared)
+            if song_data is not None:
+                return song_data
+        key, content = self.identify(filepath)
+        return self._get(key, content, shared)
+
+    def get_document(self, song_ref, content=None, shared=False):
+        """ Return an isolated copy of the parsed song for a SongRef into a songbook.  If
+            it is not cached, content (the song's document) is parsed; without content,
+            None is returned instead
+
+        :param song_ref: SongRef with an index into a songbook
+        :param content: text of the song's YAML document
+        :param shared: return the cached song itself, which must not be modified
+        :rtype: models.LazyDict
+        """
+        key = (os.path.abspath(song_ref.filepath), song_ref.index, song_ref.content_hash)
+        return self._get(key, content, shared)
+
+
+song_cache = SongCache(max_entries=SONG_CACHE_MAX_ENTRIES)
+
+
+def set_cache_dir(cache_dir):
+    """ Back the process-wide song_cache with a DiskSongCache in cache_dir, so parsed
+        songs survive between runs.  Pass None to stop using a cache dir
+
+    :param cache_dir: path to a directory, which will be created if necessary
+    """
+    song_cache.disk_cache = DiskSongCache(cache_dir) if cache_dir else None
+
+
+def get_cache_dir():
+    return song_cache.disk_cache.cache_dir if song_cache.disk_cache else None
+
+
+def parse_file(filepath, use_cache=True):
+    if use_cache:
+        return song_cache.get(filepath)
     content = _get_content_from_song_file(filepath)
     return parse(content)
 
 
+ParseResult = collections.namedtuple('ParseResult', ['filepath', 'song', 'error'])
+
+
+def _init_parse_many_worker(cache_dir):
+    set_cache_dir(cache_dir)
+
+
+def _parse_many_worker(filepath):
+    try:
+        key, content = SongCache.identify(filepath)
+        return key, song_cache._load_or_parse(key[3], content), None
+    except Exception as e:
+        return None, None, '{0}: {1}'.format(e.__class__.__name__, e)
+
+
+def parse_many(filepaths, jobs=None, shared=False):
+    """ Parse many song files, optionally spread over a pool of jobs processes.  Results
+        come back in the order of filepaths, and a bad file is reported in its
+        ParseResult instead of stopping the batch.  Songs parsed in worker processes are
+        added to the process-wide song_cache.  Like parse_source, every song returned is
+        an isolated copy unless shared is set
+
+    .. doctests ::
+
+        >>> parse_many(['/not/a/song.yaml'])  # doctest: +ELLIPSIS
+        [ParseResult(filepath='/not/a/song.yaml', song=None, error='OSError: could not find...')]
+        >>> import tempfile
+        >>> song_file = tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False)
+        >>> _ = song_file.write('title: Many\\nkey: C\\nprogressions: []\\nform: []\\n')
+        >>> song_file.close()
+        >>> parse_many([song_file.name])[0].song is parse_many([song_file.name])[0].song
+        False
+        >>> parse_many([song_file.name], shared=True)[0].song is song_cache.get(
+        ...     song_file.name, shared=True)
+        True
+        >>> os.remove(song_file.name)
+
+    :param filepaths: list of paths to song files
+    :param jobs: number of processes to use; None or 1 means in-process
+    :param shared: return song_cache's own copies of the songs, which must not be modified
+    :rtype: list
+    """
+    filepaths = list(filepaths)
+    if not pool.use_pool(len(filepaths), jobs):
+        ret = []
+        for filepath in filepaths:
+            try:
+                ret.append(ParseResult(filepath, song_cache.get(filepath, shared=shared), None))
+            except Exception as e:
+                error = '{0}: {1}'.format(e.__class__.__name__, e)
+                ret.append(ParseResult(filepath, None, error))
+        return ret
+    worker_results = pool.map_in_pool(
+        _parse_many_worker,
+        filepaths,
+        jobs,
+        initializer=_init_parse_many_worker,
+        initargs=(get_cache_dir(),)
+    )
+    ret = []
+    for filepath, (key, song_data, error) in zip(filepaths, worker_results):
+        if error is None:
+            song_cache.put(key, song_data, key[2])
+            if not shared:
+                song_data = copy.deepcopy(song_data)
+        ret.append(ParseResult(filepath, song_data, error))
+    return ret
+
+
+CheckResult = collections.namedtuple('CheckResult', ['filepath', 'errors'])
+
+
+def _check_step(errors, key_path, func, *args):
+    try:
+        func(*args)
+    except (ValueError, KeyError, TypeError) as e:
+        errors.append(SongError(_format_key_path(key_path), e))
+
+
+def _check_required_keys(errors, data, key_path, required_keys):
+    for key in required_keys:
+        if key not in data.keys():
+            path = _format_key_path(key_path + (key,))
+            errors.append(SongError(path, KeyError('missing required key in yaml data: ' + path)))
+
+
+def check(yaml_str):
+    """ Find every problem which would stop a song from being parsed and rendered,
+        without stopping at the first one
+
+    .. doctests ::
+
+        >>> for error in check('''
+        ... title: Broken
+        ... time: "4"
+        ... progressions:
+        ...   - name: a
+        ...     chords: "[A] junk"
+        ...     comment: "[H]"
+        ... form:
+        ...   - reps: []
+        ... '''):
+        ...     print('{0}: {1}'.format(error.path, error.error))  # doctest: +ELLIPSIS
+        form[0].reps: invalid value found in yaml data: form[0].reps=[] ...
+        >>> for error in check('''
+        ... title: Broken
+        ... time: "4"
+        ... progressions:
+        ...   - name: a
+        ...     chords: "[A] junk"
+        ...     comment: "[H]"
+        ... form:
+        ...   - reps: 2
+        ... '''):
+        ...     print('{0}: {1}'.format(error.path, error.error))  # doctest: +ELLIPSIS
+        key: 'missing required key in yaml data: key'
+        form[0].progression: 'missing required key in yaml data: form[0].progression'
+        time: bad time signature...
+        progressions[0].chords: found garbage characters in progression: "[A] junk"[4:8] (junk)
+        progressions[0].comment: "H" is not a valid pyleadsheet note
+
+    :param yaml_str: string containing a YAML song definition
+    :rtype: list of SongErrors
+    """
+    try:
+        song_data = _load_yaml(yaml_str)
+    except yaml.YAMLError as e:
+        return [SongError('', e)]
+    errors = find_schema_errors(song_data)
+    if errors:
+        return errors
+    _check_required_keys(errors, song_data, (), REQUIRED_KEYS)
+    for i, progression in enumerate(song_data.get('progressions', [])):
+        key_path = ('progressions', i)
+        _check_required_keys(errors, progression, key_path, PROGRESSION_REQUIRED_KEYS)
+    for i, section in enumerate(song_data.get('form', [])):
+        _check_required_keys(errors, section, ('form', i), FORM_REQUIRED_KEYS)
+    if 'time' in song_data.keys():
+        _check_step(errors, ('time',), _parse_time_signature_string, song_data['time'])
+    if 'key' in song_data.keys():
+        _check_step(errors, ('key',), models.Key, song_data['key'])
+    for key in ('progressions', 'form'):
+        for i, data_group in enumerate(song_data.get(key, [])):
+            if 'chords' in data_group.keys():
+                _check_step(
+                    errors, (key, i, 'chords'), _parse_progression_str, data_group['chords']
+                )
+            if 'comment' in data_group.keys():
+                _check_step(
+                    errors, (key, i, 'comment'), _tokenize_comment_string, data_group['comment']
+                )
+    return errors
+
+
+def check_file(filepath):
+    """ Find every problem in a song file (see check).  Problems in a songbook have
+        paths starting with the index of the song, eg. [2].form[0].reps
+
+    .. doctests ::
+
+        >>> check_file('/not/a/song.yaml')  # doctest: +ELLIPSIS
+        [SongError(path='', error=OSError('could not find any file at /not/a/song.yaml'))]
+
+    :param filepath: path to a song file
+    :rtype: list of SongErrors
+    """
+    if not os.path.isfile(filepath):
+        return [SongError('', IOError('could not find any file at {0}'.format(filepath)))]
+    errors = []
+    try:
+        if not is_songbook(filepath):
+            return check(_get_content_from_song_file(filepath))
+        with open(filepath, 'r') as songbook:
+            for index, document in enumerate(_iter_documents(songbook)):
+                for error in check(document):
+                    path = '[{0}]{1}{2}'.format(index, '.' if error.path else '', error.path)
+                    errors.append(SongError(path, error.error))
+    except (IOError, ValueError) as e:
+        # eg. a file which is not valid utf-8, which stops it being read any further
+        errors.append(SongError('', e))
+    return errors
+
+
+def check_many(filepaths, jobs=None):
+    """ Run check_file for every path, optionally spread over a pool of jobs processes
+
+    :param filepaths: list of paths to song files
+    :param jobs: number of processes to use; None or 1 means in-process
+    :rtype: list of CheckResults, in the order of filepaths
+    """
+    filepaths = list(filepaths)
+    return [
+        CheckResult(filepath, errors)
+        for filepath, errors in zip(filepaths, pool.map_in_pool(check_file, filepaths, jobs))
+    ]
+
+
+def _read_song_header(lines):
+    r""" Collect the lines holding top-level METADATA_KEYS, along with the indented lines
+        which continue their values, from anywhere in a song.  Everything else, such as
+        the progressions and form, is skipped over without being loaded
+
+    .. doctests ::
+
+        >>> print(_read_song_header([
+        ...     'title: Homeward Bound\n',
+        ...     'condense_measures: true\n',
+        ...     'progressions:\n',
+        ...     '  - name: verse\n',
+        ...     '    key: not top-level\n',
+        ...     'key: G  # capo 2\n',
+        ...     'form:\n',
+        ...     '- progression: verse\n',
+        ...     'feel: swing\n'
+        ... ]), end='')
+        title: Homeward Bound
+        key: G  # capo 2
+        feel: swing
+        >>> print(_read_song_header([
+        ...     '---\n',
+        ...     'title: A Long\n',
+        ...     '  Title\n',
+        ...     'feel: >\n',
+        ...     '  folded\n',
+        ...     '---\n',
+        ...     'title: Next Song\n',
+        ... ]), end='')
+        ---
+        title: A Long
+          Title
+        feel: >
+          folded
+
+    :param lines: iterable of lines from a song file
+    :rtype: str
+    """
+    header_lines = []
+    include_current = False
+    for i, line in enumerate(lines):
+        if i == 0 and line.startswith('---'):
+            header_lines.append(line)
+            continue
+        if not line.strip() or line[0] in ' \t#':
+            if include_current:
+                header_lines.append(line)
+            continue
+        if line.startswith(('---', '...')):
+            break
+        include_current = line.partition(':')[0].strip() in METADATA_KEYS
+        if include_current:
+            header_lines.append(line)
+    return ''.join(header_lines)
+
+
+def _filter_metadata(song_data):
+    return dict((k, v) for k, v in song_data.items() if k in METADATA_KEYS)
+
+
+def _get_metadata(lines, load_all, source):
+    header = _read_song_header(lines)
+    try:
+        metadata = _load_yaml(header)
+    except yaml.YAMLError:
+        metadata = None
+    if not isinstance(metadata, dict) or 'title' not in metadata:
+        logger.debug('could not find title in header, loading entire song: ' + source)
+        metadata = load_all()
+    return _filter_metadata(metadata)
+
+
+def get_metadata_from_song_file(filepath):
+    """ Get the top-level metadata (see METADATA_KEYS) of a song without loading the
+        whole file.  Only the lines holding metadata are loaded, wherever they are in the
+        file; if they cannot be loaded on their own or do not hold a title, the whole file
+        is loaded instead
+
+    :param filepath: path to a song file
+    :rtype: dict
+    """
+    if not os.path.isfile(filepath):
+        raise IOError('could not find any file at {0}'.format(filepath))
+    with open(filepath, 'r') as song_file:
+        return _get_metadata(
+            song_file, lambda: _load_yaml(_get_content_from_song_file(filepath)), filepath
+        )
+
+
 def get_title_from_song_file(filepath):
-    content = _get_content_from_song_file(filepath)
-    song_data = yaml.load(content)
-    return song_data['title']
+    return get_metadata_from_song_file(filepath)['title']
+
+
+SONG_FILE_SUFFIXES = ('.yaml', '.yml')
+SONGBOOK_SUFFIXES = ('.songbook.yaml', '.songbook.yml')
+SongRef = collections.namedtuple(
+    'SongRef', ['filepath', 'index', 'song_id', 'title', 'content_hash']
+)
+SongbookEntry = collections.namedtuple('SongbookEntry', ['ref', 'song', 'error'])
+
+
+def is_songbook(filepath):
+    """ Songbooks are files holding many "---"-separated songs, named *.songbook.yaml
+
+    .. doctests ::
+
+        >>> is_songbook('/path/to/hymns.songbook.yaml'), is_songbook('/path/to/hymn.yaml')
+        (True, False)
+    """
+    return filepath.lower().endswith(SONGBOOK_SUFFIXES)
+
+
+def find_song_files(dirpath):
+    """ Return the paths of the song files and songbooks in a directory, ie. its files
+        named *.yaml or *.yml
+
+    .. doctests ::
+
+        >>> import shutil, tempfile
+        >>> song_dir = tempfile.mkdtemp()
+        >>> for filename in ('a.yaml', 'b.YML', 'c.songbook.yml', 'notes.txt', 'yaml'):
+        ...     open(os.path.join(song_dir, filename), 'w').close()
+        >>> [os.path.basename(filepath) for filepath in find_song_files(song_dir)]
+        ['a.yaml', 'b.YML', 'c.songbook.yml']
+        >>> shutil.rmtree(song_dir)
+
+    :param dirpath: path to a directory
+    :rtype: sorted list of paths
+    """
+    return [
+        os.path.join(dirpath, filename) for filename in sorted(os.listdir(dirpath))
+        if filename.lower().endswith(SONG_FILE_SUFFIXES)
+        and os.path.isfile(os.path.join(dirpath, filename))
+    ]
+
+
+def filepath_to_song_id(filepath):
+    """ Take a path and return the filename without any extension (including the
+        songbook extension)
+
+    .. doctests ::
+
+        >>> filepath_to_song_id('/path/to/some.file')
+        'some'
+        >>> filepath_to_song_id('/path/to/hymns.songbook.yml')
+        'hymns'
+    """
+    basename = os.path.basename(filepath)
+    if is_songbook(basename):
+        return basename[:basename.lower().rindex('.songbook.')]
+    return '.'.join(basename.split('.')[:-1])
+
+
+def _slugify(title, default):
+    """ Reduce a title to characters which are safe in a filename and in a url path
+
+    .. doctests ::
+
+        >>> _slugify('AC/DC Blues?', '1')
+        'ac_dc_blues'
+        >>> _slugify('Café #9', '1')
+        'café_9'
+        >>> _slugify('???', '3')
+        '3'
+
+    :param title: title of a song
+    :param default: slug to use if nothing is left of the title
+    :rtype: string
+    """
+    return re.sub(r'[^\w.-]+', '_', str(title).lower()).strip('_.') or default
+
+
+def _is_marker_line(line, marker):
+    return line.startswith(marker) and line[3:4] in ('', ' ', '\t', '\r', '\n')
+
+
+def _iter_documents(lines):
+    r""" Split a stream of lines into YAML documents, yielding the text of each
+        non-empty document as soon as its last line has been read
+
+    .. doctests ::
+
+        >>> list(_iter_documents([
+        ...     '# songbook\n', '---\n', 'title: One\n', '---\n', '\n', '---\n',
+        ...     'title: Two\n', '...\n', '--- title: Three\n'
+        ... ]))
+        ['---\ntitle: One\n', '---\ntitle: Two\n', '--- title: Three\n']
+
+    :param lines: iterable of lines, eg. an open file
+    :rtype: generator
+    """
+    document_lines = []
+    has_content = False
+    for line in lines:
+        is_separator = _is_marker_line(line, '---')
+        if is_separator or _is_marker_line(line, '...'):
+            if has_content:
+                yield ''.join(document_lines)
+            document_lines = [line] if is_separator else []
+            has_content = is_separator and bool(line[3:].split('#')[0].strip())
+            continue
+        document_lines.append(line)
+        if not has_content and line.strip() and not line.lstrip().startswith('#'):
+            has_content = True
+    if has_content:
+        yield ''.join(document_lines)
+
+
+def _iter_songbook_documents(filepath):
+    """ Stream the songs in a songbook, yielding a SongRef along with each song's
+        document and metadata.  Song ids are "<book>.<title>", numbered if a title repeats
+
+    :param filepath: path to a songbook
+    :rtype: generator
+    """
+    book_id = filepath_to_song_id(filepath)
+    used_ids = set()
+    with open(filepath, 'r') as songbook:
+        for index, document in enumerate(_iter_documents(songbook)):
+            try:
+                metadata = _get_metadata(
+                    document.splitlines(True),
+                    lambda: _load_yaml(document),
+                    '{0}[{1}]'.format(filepath, index)
+                )
+                title = metadata['title']
+            except Exception:
+                metadata = {}
+                title = '{0} #{1}'.format(book_id, index + 1)
+            song_id = base_id = '{0}.{1}'.format(book_id, _slugify(title, str(index + 1)))
+            duplicate_i = 1
+            while song_id in used_ids:
+                duplicate_i += 1
+                song_id = '{0}_{1}'.format(base_id, duplicate_i)
+            used_ids.add(song_id)
+            content_hash = hashlib.sha1(document.encode('utf-8')).hexdigest()
+            yield SongRef(filepath, index, song_id, title, content_hash), document, metadata
+
+
+def iter_songbook_documents(filepath):
+    """ Stream the songs in a songbook without parsing them, yielding a SongRef along with
+        the text of each song, which song_cache.get_document can parse
+
+    :param filepath: path to a songbook
+    :rtype: generator
+    """
+    for song_ref, document, metadata in _iter_songbook_documents(filepath):
+        yield song_ref, document
+
+
+def iter_song_refs(filepath):
+    """ Yield a SongRef for every song in a file, without parsing the songs.  A song file
+        yields a single SongRef whose index is None
+
+    :param filepath: path to a song file or songbook
+    :rtype: generator
+    """
+    for song_ref, metadata in iter_song_metadata(filepath):
+        yield song_ref
+
+
+def iter_song_metadata(filepath):
+    """ Yield a SongRef and the metadata (see METADATA_KEYS) of every song in a file,
+        without parsing the songs
+
+    .. doctests ::
+
+        >>> import tempfile
+        >>> song_file = tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False)
+        >>> _ = song_file.write('title: Some Song\\nkey: Bb\\ntime: 3/4\\nprogressions: []\\n')
+        >>> song_file.close()
+        >>> song_ref, metadata = next(iter_song_metadata(song_file.name))
+        >>> song_ref.title, song_ref.index, sorted(metadata.items())
+        ('Some Song', None, [('key', 'Bb'), ('time', '3/4'), ('title', 'Some Song')])
+        >>> os.remove(song_file.name)
+
+    :param filepath: path to a song file or songbook
+    :rtype: generator
+    """
+    if not is_songbook(filepath):
+        metadata = get_metadata_from_song_file(filepath)
+        yield SongRef(
+            filepath, None, filepath_to_song_id(filepath), metadata['title'], None
+        ), metadata
+        return
+    for song_ref, document, metadata in _iter_songbook_documents(filepath):
+        yield song_ref, metadata
+
+
+def iter_song_documents(filepath):
+    """ Yield a SongRef and the loaded, but unparsed, YAML document of every song in a
+        file.  A songbook document which cannot be loaded is yielded as an empty dict
+
+    :param filepath: path to a song file or songbook
+    :rtype: generator
+    """
+    if not is_songbook(filepath):
+        document = _load_yaml(_get_content_from_song_file(filepath))
+        yield SongRef(
+            filepath, None, filepath_to_song_id(filepath), document['title'], None
+        ), document
+        return
+    for song_ref, document, metadata in _iter_songbook_documents(filepath):
+        try:
+            document = _load_yaml(document)
+        except yaml.YAMLError:
+            document = None
+        yield song_ref, document if isinstance(document, dict) else {}
+
+
+def _iter_comment_text(comment_string):
+    try:
+        tokens = _tokenize_comment_string(comment_string)
+    except Exception:
+        tokens = [comment_string]
+    for token in tokens:
+        if isinstance(token, str):
+            yield token
+
+
+def get_song_text(document):
+    """ Collect the searchable text of a loaded, but unparsed, song document: its title,
+        the lyrics of its form and the words (not the chords) of its comments
+
+    .. doctests ::
+
+        >>> get_song_text({
+        ...     'title': 'Some Song',
+        ...     'progressions': [{'name': 'a', 'comment': 'play [B-7] softly'}],
+        ...     'form': [{'progression': 'a', 'lyrics': 'la la', 'comment': 'twice'}],
+        ... })
+        {'title': ['Some Song'], 'lyrics': ['la la'], 'comment': ['play ', ' softly', 'twice']}
+
+    :param document: song data, as loaded from YAML
+    :rtype: dict of field -> list of strings
+    """
+    ret = {'title': [], 'lyrics': [], 'comment': []}
+    if document.get('title') is not None:
+        ret['title'].append(str(document['title']))
+    for key in ('progressions', 'form'):
+        data_groups = document.get(key)
+        for data_group in data_groups if isinstance(data_groups, list) else []:
+            if not isinstance(data_group, dict):
+                continue
+            if isinstance(data_group.get('lyrics'), str):
+                ret['lyrics'].append(data_group['lyrics'])
+            if isinstance(data_group.get('comment'), str):
+                ret['comment'].extend(_iter_comment_text(data_group['comment']))
+    return ret
+
+
+def iter_songbook(filepath):
+    """ Stream and parse the songs in a songbook one at a time, yielding a SongbookEntry
+        for each.  A song which fails to parse has its error set instead of stopping the
+        stream.  Parsed songs go through song_cache, so parse_source can find them again,
+        and are song_cache's own copies, which must not be modified
+
+    .. doctests ::
+
+        >>> import tempfile
+        >>> songbook = tempfile.NamedTemporaryFile('w', suffix='.songbook.yaml', delete=False)
+        >>> _ = songbook.write('''
+        ... title: Same
+        ... key: C
+        ... time: 4/4
+        ... progressions: []
+        ... form: []
+        ... ---
+        ... title: Same
+        ... key: H
+        ... ''')
+        >>> songbook.close()
+        >>> for entry in iter_songbook(songbook.name):
+        ...     entry.ref.song_id.split('.')[-1], entry.ref.index, entry.error
+        ('same', 0, None)
+        ('same_2', 1, "KeyError: 'progressions'")
+        >>> os.remove(songbook.name)
+
+    :param filepath: path to a songbook
+    :rtype: generator
+    """
+    for song_ref, document, metadata in _iter_songbook_documents(filepath):
+        try:
+            yield SongbookEntry(
+                song_ref, song_cache.get_document(song_ref, document, shared=True), None
+            )
+        except Exception as e:
+            error = '{0}: {1}'.format(e.__class__.__name__, e)
+            yield SongbookEntry(song_ref, None, error)
+
+
+def parse_source(source, shared=False):
+    """ Parse a song given either the path to a song file or a SongRef
+
+    :param source: path to a song file, or SongRef
+    :param shared: return the song_cache's own copy of the song, which must not be modified
+    :rtype: models.LazyDict
+    """
+    if not isinstance(source, SongRef):
+        return song_cache.get(source, shared=shared)
+    if source.index is None:
+        return song_cache.get(source.filepath, shared=shared)
+    song_data = song_cache.get_document(source, shared=shared)
+    if song_data is not None:
+        return song_data
+    if not os.path.isfile(source.filepath):
+        raise IOError('could not find any file at {0}'.format(source.filepath))
+    for song_ref, document, metadata in _iter_songbook_documents(source.filepath):
+        if song_ref.index == source.index:
+            return song_cache.get_document(song_ref, document, shared=shared)
+    raise IOError('could not find song {0} in {1}'.format(source.index, source.filepath))
@@ -0,0 +1,108 @@
+import collections
+import concurrent.futures
+
+import logging
+logger = logging.getLogger(__name__)
+
+MIN_ITEMS_PER_JOB = 8
+
+
+def use_pool(num_items, jobs, min_items_per_job=MIN_ITEMS_PER_JOB):
+    """ Decide whether fanning num_items out over jobs processes is worth the cost of
+        starting a process pool
+
+    .. doctests ::
+
+        >>> use_pool(1000, None)
+        False
+        >>> use_pool(1000, 1)
+        False
+        >>> use_pool(10, 4)
+        False
+        >>> use_pool(1000, 4)
+        True
+
+    :param num_items: number of items to be processed
+    :param jobs: requested number of processes
+    :param min_items_per_job: smallest useful batch for each process
+    :rtype: bool
+    """
+    return bool(jobs) and jobs > 1 and num_items >= jobs * min_items_per_job
+
+
+def map_in_pool(func, items, jobs=None, initializer=None, initargs=(),
+                min_items_per_job=MIN_ITEMS_PER_JOB):
+    """ Return [func(item) for item in items], spread over a pool of jobs processes when
+        use_pool says it is worthwhile.  Results are always in the order of items.  func
+        and initializer must be picklable (ie. module-level functions)
+
+    .. doctests ::
+
+        >>> map_in_pool(abs, [-1, 2, -3])
+        [1, 2, 3]
+
+    :param func: function to call on each item
+    :param items: sequence of items
+    :param jobs: number of processes to use; None or 1 means in-process
+    :param initializer: function to call once in each worker process
+    :param initargs: arguments for initializer
+    :param min_items_per_job: smallest useful batch for each process
+    :rtype: list
+    """
+    items = list(items)
+    if not use_pool(len(items), jobs, min_items_per_job):
+        return [func(item) for item in items]
+    logger.debug('spreading {0} items over {1} processes'.format(len(items), jobs))
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs, initializer=initializer, initargs=initargs
+    ) as executor:
+        chunksize = max(1, len(items) // (jobs * 4))
+        return list(executor.map(func, items, chunksize=chunksize))
+
+
+def imap_in_pool(func, items, jobs=None, initializer=None, initargs=(), key=None,
+                 max_pending_per_job=4):
+    """ Yield func(item) for each item in items, in order, like map_in_pool, but taking
+        items lazily (eg. from a generator) and keeping one pool for all of them.  At most
+        jobs * max_pending_per_job items are queued or being worked on at once.  Items
+        for which key gives the same value are never worked on at the same time, and are
+        worked on in order, so (eg.) two which write the same file do it in order
+
+    .. doctests ::
+
+        >>> list(imap_in_pool(abs, iter([-1, 2, -3])))
+        [1, 2, 3]
+        >>> list(imap_in_pool(abs, iter([-1, 2, -3]), jobs=2, key=lambda item: item > 0))
+        [1, 2, 3]
+
+    :param func: function to call on each item
+    :param items: iterable of items
+    :param jobs: number of processes to use; None or 1 means in-process
+    :param initializer: function to call once in each worker process
+    :param initargs: arguments for initializer
+    :param key: function giving the value which items must not share while in the pool
+    :param max_pending_per_job: how far to read ahead of the results, per process
+    :rtype: generator
+    """
+    if not jobs or jobs <= 1:
+        for item in items:
+            yield func(item)
+        return
+    logger.debug('streaming items through {0} processes'.format(jobs))
+    pending = collections.deque()
+    pending_keys = collections.Counter()
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=jobs, initializer=initializer, initargs=initargs
+    ) as executor:
+        for item in items:
+            item_key = key(item) if key else None
+            while pending and (
+                len(pending) >= jobs * max_pending_per_job or (key and pending_keys[item_key])
+            ):
+                done_key, future = pending.popleft()
+                pending_keys[done_key] -= 1
+                yield future.result()
+            pending.append((item_key, executor.submit(func, item)))
+            pending_keys[item_key] += 1
+        while pending:
+            yield pending.popleft()[1].result()
@@ -1,120 +1,636 @@
 import os
-import shutil
-import jinja2
-import filecmp
 import datetime
-import json
-from wkhtmltopdfwrapper import wkhtmltopdf
+import functools
+import collections
+import subprocess
+import concurrent.futures
+from . import build
 from . import views
+from . import models
+from . import assets
+from . import pool
 from . import parser
+from . import transposer
+from . import templating
 
 import logging
 logger = logging.getLogger(__name__)
 
+# pages are streamed into their files, this many template events at a time
+STREAM_BUFFER_SIZE = 64
+OUTPUT_BUFFER_SIZE = 64 * 1024
+PDF_CONVERTER_COMMAND = 'wkhtmltopdf'
+# seconds a converter is given for each document, and how often a failed one is retried
+PDF_TIMEOUT = 300
+PDF_RETRIES = 2
+# documents handed to each converter process; 1 runs the converter once per document
+PDF_BATCH_SIZE = 1
 
-def _spoof_url_for(path, filename=None):
-    return filename
+
+def _spoof_url_for(path, filename=None, prefix='', manifest=None):
+    """ Stand in for flask's url_for in static html, pointing at the fingerprinted copies
+        of static files (see assets.write_assets)
+
+    .. doctests ::
+
+        >>> _spoof_url_for('static', filename='a.css', prefix='../', manifest={'a.css': 'a.1.css'})
+        '../a.1.css'
+        >>> _spoof_url_for('static', filename='other.css')
+        'other.css'
+    """
+    return prefix + (manifest or {}).get(filename, filename)
+
+
+def _get_key_dirname(root):
+    """ Name of the output subdirectory for songs transposed to root, which avoids "#"
+        so it can be used in urls
+
+    .. doctests ::
+
+        >>> from . import models
+        >>> _get_key_dirname(models.Note('F#'))
+        'F_sharp'
+        >>> _get_key_dirname(models.Note('Bb'))
+        'B_flat'
+        >>> _get_key_dirname(models.Note('C'))
+        'C'
+    """
+    return root[0] + {'': '', '#': '_sharp', 'b': '_flat'}[root[1:]]
+
+
+def _get_build_timestamp():
+    """ The time to show on every page of a build: now, unless SOURCE_DATE_EPOCH is set
+        (see https://reproducible-builds.org/specs/source-date-epoch/)
+
+    .. doctests ::
+
+        >>> monkeypatch = getfixture('monkeypatch')
+        >>> monkeypatch.setenv('SOURCE_DATE_EPOCH', '0')
+        >>> _get_build_timestamp()
+        datetime.datetime(1970, 1, 1, 0, 0)
+    """
+    if os.environ.get('SOURCE_DATE_EPOCH'):
+        return datetime.datetime.fromtimestamp(
+            int(os.environ['SOURCE_DATE_EPOCH']), datetime.timezone.utc
+        ).replace(tzinfo=None)
+    return datetime.datetime.now()
+
+
+def _format_error(e):
+    return '{0}: {1}'.format(e.__class__.__name__, e)
+
+
+def _describe_source(source):
+    """ How to refer to a song in messages
+
+    .. doctests ::
+
+        >>> _describe_source('/path/to/some.yaml')
+        '/path/to/some.yaml'
+        >>> song_ref = parser.SongRef('/path/to/hymns.songbook.yaml', 2, 'hymns.x', 'X', None)
+        >>> _describe_source(song_ref)
+        'hymns.x from /path/to/hymns.songbook.yaml'
+    """
+    if isinstance(source, parser.SongRef) and source.index is not None:
+        return '{0} from {1}'.format(source.song_id, source.filepath)
+    return source.filepath if isinstance(source, parser.SongRef) else source
+
+
+def _render_song_in_key(task):
+    outputdir, timestamp, source, output_name, song_data, root = task
+    try:
+        HTMLRenderer(outputdir, timestamp=timestamp)._render_song_views(
+            source, output_name, root, song_data, _get_key_dirname(root)
+        )
+    except Exception as e:
+        return _format_error(e)
+    return None
+
+
+RenderResult = collections.namedtuple(
+    'RenderResult', ['source', 'output_name', 'rendered_roots', 'error']
+)
+
+
+def _init_render_worker(parser_cache_dir, template_cache_dir):
+    parser.set_cache_dir(parser_cache_dir)
+    templating.set_cache_dir(template_cache_dir)
+
+
+def _render_song_task(task):
+    """ Parse a song and render all of its views, in its own key and in roots (see
+        HTMLRenderer.render_songs), returning a RenderResult
+    """
+    outputdir, timestamp, source, output_name, document, transpose_kwargs, roots = task
+    html_renderer = HTMLRenderer(outputdir, timestamp=timestamp)
+    try:
+        if document is not None:
+            song_data = parser.song_cache.get_document(source, document, shared=True)
+        else:
+            song_data = parser.parse_source(source, shared=True)
+    except Exception as e:
+        return RenderResult(source, output_name, [], 'could not parse {0}: {1}'.format(
+            _describe_source(source), _format_error(e)
+        ))
+    try:
+        html_renderer.render_song(source, song_data=song_data, **transpose_kwargs)
+    except Exception as e:
+        return RenderResult(source, output_name, [], 'could not render {0}: {1}'.format(
+            _describe_source(source), _format_error(e)
+        ))
+    if roots != []:
+        html_renderer.render_song_in_keys([(source, song_data)], roots)
+    rendered_roots = html_renderer.rendered_roots.get(html_renderer._get_song_id(source), [])
+    return RenderResult(source, output_name, rendered_roots, None)
 
 
 class HTMLRenderer(object):
 
     SONG_TEMPLATE = 'song.jinja2'
     INDEX_TEMPLATE = 'index.jinja2'
+    BOOK_TEMPLATE = 'book.jinja2'
+    BOOK_FILE = 'book.html'
     OUTPUT_SUBDIR = 'html'
 
-    def __init__(self, outputdir):
+    def __init__(self, outputdir, song_catalog=None, timestamp=None):
         logger.debug('initializing HTMLRenderer with outputdir: ' + outputdir)
         self.filepaths = []
+        self.song_catalog = song_catalog
+        # song_id -> name of the song's output files, for linking to them from the index
+        self.output_names = {}
+        self.base_outputdir = outputdir
         self.outputdir = os.path.join(outputdir, self.OUTPUT_SUBDIR)
-        self.timestamp = datetime.datetime.now()
+        # every page of a build shows the same time, whichever process renders it
+        self.timestamp = timestamp or _get_build_timestamp()
+        # song_id -> roots of the keys the song has been rendered in by render_song_in_keys
+        self.rendered_roots = collections.defaultdict(list)
+        # static file name -> fingerprinted name, once the static files have been written
+        self.asset_manifest = None
+        # record of previous builds into outputdir, loaded by render_songs
+        self.build_manifest = None
 
     def _prepare_output_directory(self):
-        if not os.path.exists(self.outputdir):
-            logger.debug('creating outputdir')
-            os.makedirs(self.outputdir)
-        fromdir = os.path.join(os.path.dirname(__file__), 'static')
-        logged = False
-        for filename in os.listdir(fromdir):
-            if not filename.endswith('jinja2'):
-                fromfile = os.path.join(fromdir, filename)
-                tofile = os.path.join(self.outputdir, filename)
-                if not os.path.exists(tofile) or not filecmp.cmp(fromfile, tofile):
-                    if not logged:
-                        logger.info('copying base files into outputdir')
-                        logged = True
-                    shutil.copy(fromfile, tofile)
-
-    def _get_output_filename(self, song_title, suffix=None):
+        if self.asset_manifest is None:
+            self.asset_manifest = assets.write_assets(self.outputdir)
+
+    def _get_output_filename(self, song_title, suffix=None, subdir=None):
         ret = song_title.lower().replace(' ', '_')
         ret += '_' + suffix if suffix else ''
-        return ret + '.html'
+        ret += '.html'
+        return subdir + '/' + ret if subdir else ret
 
     def _render_template_to_file(self, template, outputfilename, template_data):
         self._prepare_output_directory()
-        j2env = jinja2.Environment(loader=jinja2.PackageLoader('pyleadsheet', 'templates'))
-        output = open(os.path.join(self.outputdir, outputfilename), 'w')
-        output.write(j2env.get_template(template).render(**template_data))
+        j2env = templating.get_environment()
+        outputfilepath = os.path.join(self.outputdir, outputfilename)
+        if not os.path.isdir(os.path.dirname(outputfilepath)):
+            os.makedirs(os.path.dirname(outputfilepath))
+        template_data['timestamp'] = self.timestamp.strftime('%c')
+        # stream the page rather than rendering it whole, so memory use does not grow with it
+        stream = j2env.get_template(template).stream(**template_data)
+        stream.enable_buffering(STREAM_BUFFER_SIZE)
+        with open(outputfilepath, 'w', buffering=OUTPUT_BUFFER_SIZE) as output:
+            stream.dump(output)
 
-    def _add_url_for_spoof(self, view_kwargs):
-        view_kwargs.update({'url_for': _spoof_url_for})
+    def _add_url_for_spoof(self, view_kwargs, subdir=None):
+        # pages in a subdir still point at the static files at the top of outputdir
+        prefix = '../' * (subdir.count('/') + 1) if subdir else ''
+        self._prepare_output_directory()
+        view_kwargs.update({'url_for': functools.partial(
+            _spoof_url_for, prefix=prefix, manifest=self.asset_manifest
+        )})
         return view_kwargs
 
-    def render_song(self, filepath, transpose_half_steps=None, transpose_to_root=None):
-        self.filepaths.append(filepath)
+    def _get_song_title_and_output_name(self, source):
+        if isinstance(source, parser.SongRef) and source.index is not None:
+            # songs in a songbook are named by id, which is unique within the book
+            return source.title, source.song_id
+        filepath = source.filepath if isinstance(source, parser.SongRef) else source
         song_title = parser.get_title_from_song_file(filepath)
-        logger.info('rendering song: ' + song_title)
-        for song_view_type in views.SONG_VIEW_TYPES:
+        return song_title, song_title
+
+    def _find_title_and_output_name(self, source):
+        try:
+            return self._get_song_title_and_output_name(source)
+        except Exception:
+            # the song can't be rendered either, which its render task will report
+            return None, None
+
+    def _get_song_id(self, source):
+        if isinstance(source, parser.SongRef):
+            return source.song_id
+        return parser.filepath_to_song_id(source)
+
+    def _get_output_name(self, source, song_data):
+        if isinstance(source, parser.SongRef) and source.index is not None:
+            return source.song_id
+        return song_data['title']
+
+    def _render_song_views(self, source, output_name, transpose_to_root, song_data=None,
+                           subdir=None):
+        # a key's subdir only holds the views which transposing changes; the others are
+        # linked to in the song's own key
+        song_view_types = views.LEADSHEET_VIEW_TYPES if subdir else views.SONG_VIEW_TYPES
+        for song_view_type in song_view_types:
             view_kwargs = views.compose_song_kwargs(
-                filepath,
+                source,
                 song_view_type,
-                transpose_half_steps,
-                transpose_to_root
+                transpose_to_root=transpose_to_root,
+                song_data=song_data
             )
-            view_kwargs.update({'url_for': _spoof_url_for})
             self._render_template_to_file(
                 self.SONG_TEMPLATE,
-                self._get_output_filename(song_title, song_view_type),
-                self._add_url_for_spoof(view_kwargs)
+                self._get_output_filename(output_name, song_view_type, subdir),
+                self._add_url_for_spoof(view_kwargs, subdir)
+            )
+
+    def _get_transpose_root(self, source, transpose_half_steps, transpose_to_root,
+                            song_data=None):
+        if transpose_half_steps:
+            song_data = song_data or parser.parse_source(source, shared=True)
+            return transposer.get_root_by_half_steps(
+                song_data['key'], int(transpose_half_steps)
             )
+        return transpose_to_root
+
+    def render_song(self, source, transpose_half_steps=None, transpose_to_root=None,
+                    song_data=None):
+        """ Render every view of a song
+
+        :param source: path to a song file, or parser.SongRef
+        :param song_data: the already parsed song, which is left untouched, if the caller
+                          has it; otherwise the song file is read
+        """
+        self.filepaths.append(source)
+        if song_data is None:
+            song_title, output_name = self._get_song_title_and_output_name(source)
+        else:
+            song_title, output_name = song_data['title'], self._get_output_name(source, song_data)
+        self.output_names[self._get_song_id(source)] = output_name
+        logger.info('rendering song: ' + song_title)
+        self._render_song_views(
+            source, output_name,
+            self._get_transpose_root(source, transpose_half_steps, transpose_to_root, song_data),
+            song_data
+        )
+
+    def render_song_in_keys(self, songs, roots=None, jobs=None):
+        """ Render the views of some already parsed songs which show chords (see
+            views.LEADSHEET_VIEW_TYPES) in several keys, each key in its own subdirectory
+            (eg. B_flat/), spread over a pool of jobs processes.  Songs are only ever
+            parsed by the caller; each rendering works from the song it is given, and
+            the song file is not read again
+
+        :param songs: list of (source, song_data) for songs which have been parsed
+        :param roots: list of roots of the keys to render, or None for every root the
+                      song can reasonably be transposed to
+        :param jobs: number of processes to use; None or 1 means in-process
+        """
+        tasks = []
+        for source, song_data in songs:
+            output_name = self._get_output_name(source, song_data)
+            transposable_roots = song_data['key'].transposable_roots
+            for root in transposable_roots if roots is None else roots:
+                if root not in transposable_roots:
+                    logger.warning('not rendering {0} in {1}, which is not a realistic key'.format(
+                        self._get_song_id(source), root
+                    ))
+                    continue
+                tasks.append(
+                    (self.base_outputdir, self.timestamp, source, output_name, song_data, root)
+                )
+        if not tasks:
+            return
+        logger.info('rendering {0} transpositions of {1} songs'.format(len(tasks), len(songs)))
+        errors = pool.map_in_pool(
+            _render_song_in_key, tasks, jobs, initializer=templating.set_cache_dir,
+            initargs=(templating.get_cache_dir(),), min_items_per_job=1
+        )
+        for (outputdir, timestamp, source, output_name, song_data, root), error in zip(
+            tasks, errors
+        ):
+            if error:
+                logger.error('could not render {0} in {1}: {2}'.format(
+                    self._get_song_id(source), root, error
+                ))
+                continue
+            self.rendered_roots[self._get_song_id(source)].append(root)
+
+    def _get_build_inputs(self, source, transpose_kwargs, roots):
+        if isinstance(source, parser.SongRef) and source.index is not None:
+            content_hash = source.content_hash
+        else:
+            filepath = source.filepath if isinstance(source, parser.SongRef) else source
+            try:
+                content_hash = parser.SongCache.identify(filepath)[0][-1]
+            except Exception:
+                # the song can't be rendered either, which its render task will report
+                return None
+        return build.get_build_inputs(content_hash, dict(transpose_kwargs, roots=roots))
+
+    def _iter_render_tasks(self, songs, transpose_kwargs, roots, results, pending):
+        """ Yield a render task for every song in songs which is not fresh in
+            self.build_manifest.  Every song gets a slot in results, which is filled in
+            straight away for a fresh song; pending gets the slot of every task, with the
+            song's inputs and title
+        """
+        for source, document in songs:
+            song_id = self._get_song_id(source)
+            inputs = self._get_build_inputs(source, transpose_kwargs, roots)
+            if inputs and self.build_manifest.is_song_fresh(song_id, inputs, self.outputdir):
+                song = self.build_manifest.songs[song_id]
+                logger.debug('not re-rendering unchanged song: ' + song['title'])
+                results.append(RenderResult(
+                    source, song['output_name'],
+                    [models.Note(root) for root in song['rendered_roots']], None
+                ))
+                continue
+            title, output_name = self._find_title_and_output_name(source)
+            pending.append((len(results), inputs, title))
+            results.append(None)
+            yield (self.base_outputdir, self.timestamp, source, output_name, document,
+                   transpose_kwargs, roots)
+
+    def render_songs(self, songs, transpose_half_steps=None, transpose_to_root=None, roots=(),
+                     jobs=None, pdf_converter=None):
+        """ Parse and render every view of many songs, and of each in the keys rooted at
+            roots, spread over a pool of jobs processes.  songs is read lazily, so it may
+            stream a songbook.  The output is the same whatever jobs is: songs with the
+            same output files are rendered in order, and every page shows self.timestamp.
+            A song which cannot be parsed or rendered is logged and left out of the index,
+            rather than stopping the run.  Songs whose source, options, templates and
+            static files are unchanged since they were last rendered into this outputdir
+            (see build.BuildManifest) are not rendered again.  Given a pdf_converter, each
+            song is handed to it as soon as its html has been written
+
+        :param songs: iterable of (source, document), where document is the text of a
+                      songbook song (see parser.iter_songbook_documents), or None
+        :param roots: like render_song_in_keys, or an empty list for no other keys
+        :param jobs: number of processes to use; None or 1 means in-process
+        :param pdf_converter: HTMLToPDFConverter to start converting songs with, if any
+        :rtype: int, the number of songs which could not be rendered
+        """
+        self._prepare_output_directory()
+        if self.build_manifest is None:
+            self.build_manifest = build.BuildManifest(self.base_outputdir)
+        transpose_kwargs = {
+            'transpose_half_steps': transpose_half_steps,
+            'transpose_to_root': transpose_to_root
+        }
+        results = []
+        pending = collections.deque()
+        tasks = self._iter_render_tasks(songs, transpose_kwargs, roots, results, pending)
+        task_results = pool.imap_in_pool(
+            _render_song_task, tasks, jobs, initializer=_init_render_worker,
+            initargs=(parser.get_cache_dir(), templating.get_cache_dir()),
+            key=lambda task: task[3]
+        )
+        for result in task_results:
+            slot, inputs, title = pending.popleft()
+            results[slot] = result
+            if result.error:
+                logger.error(result.error)
+                continue
+            song_id = self._get_song_id(result.source)
+            if result.rendered_roots:
+                self.rendered_roots[song_id] = list(result.rendered_roots)
+            filenames = collections.OrderedDict(
+                (link['id'], link['href'])
+                for view_links in self._get_index_links(song_id, result.output_name)
+                for link in view_links
+            )
+            self.build_manifest.record_song(
+                song_id, title, result.output_name, inputs, filenames, result.rendered_roots
+            )
+            if pdf_converter is not None:
+                pdf_converter.convert_song(self.build_manifest.songs[song_id])
+        # songs are added to the index in the order they were given, however they were built
+        num_errors = 0
+        for result in results:
+            song_id = self._get_song_id(result.source)
+            if result.error:
+                num_errors += 1
+                self.build_manifest.forget_song(song_id)
+                continue
+            self.filepaths.append(result.source)
+            self.output_names[song_id] = result.output_name
+            if result.rendered_roots:
+                self.rendered_roots[song_id] = list(result.rendered_roots)
+        # songs which were not given this time are no longer part of the build
+        song_ids = set(self._get_song_id(result.source) for result in results)
+        for song_id in list(self.build_manifest.songs):
+            if song_id not in song_ids:
+                self.build_manifest.forget_song(song_id)
+        self.build_manifest.save()
+        return num_errors
+
+    def _get_index_links(self, song_id, output_name):
+        """ Links to every rendered view of a song, as one list per view type which starts
+            with the song in its own key, followed by any keys it was rendered in for the
+            views which show chords
+        """
+        links = []
+        for song_view_type in views.SONG_VIEW_TYPES:
+            view_links = [{
+                'id': song_view_type,
+                'label': song_view_type,
+                'href': self._get_output_filename(output_name, song_view_type)
+            }]
+            if song_view_type not in views.LEADSHEET_VIEW_TYPES:
+                links.append(view_links)
+                continue
+            for root in self.rendered_roots.get(song_id, []):
+                key_dirname = _get_key_dirname(root)
+                view_links.append({
+                    'id': key_dirname + '/' + song_view_type,
+                    'label': str(root),
+                    'href': self._get_output_filename(output_name, song_view_type, key_dirname)
+                })
+            links.append(view_links)
+        return links
+
+    def _compose_index_kwargs(self, song_ids):
+        if self.song_catalog is None:
+            return views.compose_index_kwargs(self.filepaths)
+        # the catalog may hold a whole library, of which this run only rendered some
+        self.song_catalog.update(set(
+            source.filepath if isinstance(source, parser.SongRef) else source
+            for source in self.filepaths
+        ), prune=False)
+        return views.compose_sorted_index_kwargs(
+            index_entry for index_entry in self.song_catalog.iter_index_entries()
+            if index_entry['song_id'] in song_ids
+        )
 
     def render_index(self):
         logger.info('rendering index')
-        view_kwargs = views.compose_index_kwargs(self.filepaths)
+        view_kwargs = self._compose_index_kwargs(self.output_names)
+        for letter, songs in view_kwargs['songs_by_first_letter'].items():
+            for song in songs:
+                song['links'] = self._get_index_links(
+                    song['song_id'], self.output_names[song['song_id']]
+                )
         self._render_template_to_file(
             self.INDEX_TEMPLATE,
             'index.html',
             self._add_url_for_spoof(view_kwargs)
         )
-        json.dump(
-            view_kwargs['songs_by_first_letter'],
-            open(os.path.join(self.outputdir, self.INDEX_JSON_FILE), 'w')
+
+    def _iter_book_songs(self, songs_by_first_letter, transpose_half_steps, transpose_to_root):
+        sources_by_song_id = dict(
+            (self._get_song_id(source), source) for source in self.filepaths
         )
+        for songs in songs_by_first_letter.values():
+            for song in songs:
+                source = sources_by_song_id[song['song_id']]
+                view_kwargs = views.compose_song_kwargs(
+                    source,
+                    views.BOOK_SONG_VIEW_TYPE,
+                    transpose_to_root=self._get_transpose_root(
+                        source, transpose_half_steps, transpose_to_root
+                    )
+                )
+                view_kwargs['anchor'] = song['anchor']
+                yield view_kwargs
 
-    def render_book(self, no_index=False):
+    def render_book(self, transpose_half_steps=None, transpose_to_root=None):
+        """ Render every song which has been rendered, in index order, into a single
+            document (BOOK_FILE) with a linked table of contents.  The songs are composed
+            and streamed into the document one by one
+        """
         logger.info('rendering HTML book')
-        for filepath in self.filepaths:
-            self.render_song(filepath)
-        if not no_index:
-            self.render_index()
+        index_kwargs = self._compose_index_kwargs(self.output_names)
+        book_songs = self._iter_book_songs(
+            views.add_song_anchors(index_kwargs['songs_by_first_letter']),
+            transpose_half_steps, transpose_to_root
+        )
+        self._render_template_to_file(
+            self.BOOK_TEMPLATE,
+            self.BOOK_FILE,
+            self._add_url_for_spoof(views.compose_book_kwargs(index_kwargs, book_songs))
+        )
+
+
+def _quote_converter_arg(arg):
+    """ Quote an argument for a line of wkhtmltopdf's --read-args-from-stdin
+
+    .. doctests ::
+
+        >>> print(_quote_converter_arg('/my "songs"/a.pdf'))
+        "/my \\"songs\\"/a.pdf"
+    """
+    return '"{0}"'.format(arg.replace('\\', '\\\\').replace('"', '\\"'))
+
+
+def _run_converter(command, documents, timeout):
+    """ Run one converter process on documents: a single document is passed on the command
+        line, while several are read from stdin, one per line, and converted in turn.
+        Raises subprocess.TimeoutExpired or subprocess.CalledProcessError if it fails
+    """
+    if len(documents) == 1:
+        args, stdin = [command] + list(documents[0]), b''
+    else:
+        args = [command, '--read-args-from-stdin']
+        stdin = ''.join(
+            ' '.join(_quote_converter_arg(arg) for arg in document) + '\n'
+            for document in documents
+        ).encode('utf-8')
+    subprocess.run(
+        args, input=stdin, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        timeout=timeout, check=True
+    )
+
+
+def _convert_to_pdf(command, documents, timeout, retries):
+    """ Convert documents in a single converter process, retrying those which fail.  A
+        batch which exits with an error has still converted every document whose pdf it
+        wrote, so only the rest are retried; one which times out is retried whole
+
+    :param command: the converter executable, which takes an input url and output path,
+                    or reads several of them from stdin (see _run_converter)
+    :param documents: list of (url of the html to convert, path to write the pdf to)
+    :param timeout: seconds to wait for each document, on each attempt
+    :param retries: how many times to retry a failed document
+    :rtype: list of the last failure for each document, or None where it was converted
+    """
+    remaining = list(range(len(documents)))
+    error = None
+    for attempt in range(retries + 1):
+        if error:
+            logger.warning('retrying pdf conversion ({0}): {1}'.format(
+                error, ', '.join(documents[i][0] for i in remaining)
+            ))
+        for i in remaining:
+            if os.path.isfile(documents[i][1]):
+                os.remove(documents[i][1])
+        batch = [documents[i] for i in remaining]
+        try:
+            _run_converter(command, batch, timeout * len(batch))
+            remaining = []
+        except subprocess.TimeoutExpired:
+            error = 'timed out after {0}s'.format(timeout * len(batch))
+        except subprocess.CalledProcessError as e:
+            error = 'exited with {0}: {1}'.format(
+                e.returncode, e.stderr.decode('utf-8', 'replace').strip()
+            )
+            if len(batch) > 1:
+                remaining = [i for i in remaining if not os.path.isfile(documents[i][1])]
+        except OSError as e:
+            # the converter can't be run at all, so trying again won't help
+            error = _format_error(e)
+            break
+        if not remaining:
+            break
+    for i in remaining:
+        if os.path.isfile(documents[i][1]):
+            os.remove(documents[i][1])
+    return [error if i in remaining else None for i in range(len(documents))]
 
 
 class HTMLToPDFConverter(object):
+    """ Convert rendered html to pdf, running up to jobs converter processes at once.  Each
+        document which fails or takes longer than timeout seconds is retried up to retries
+        times.  Each converter process is handed batch_size pages, which saves starting
+        one for every page, while still writing a pdf per page.  Songs can be handed over
+        one by one (see convert_song), eg. by HTMLRenderer.render_songs as it writes them,
+        and are converted in the background until convert_songs (or wait) is called
+    """
 
     OUTPUT_SUBDIR = 'pdf'
 
-    def __init__(self, outputdir, html_renderer=None):
+    def __init__(self, outputdir, html_renderer=None, jobs=1, timeout=PDF_TIMEOUT,
+                 retries=PDF_RETRIES, command=PDF_CONVERTER_COMMAND, batch_size=PDF_BATCH_SIZE):
         self.html_renderer = html_renderer
+        self.base_outputdir = outputdir
         self.inputdir = os.path.join(outputdir, HTMLRenderer.OUTPUT_SUBDIR)
         self.outputdir = os.path.join(outputdir, self.OUTPUT_SUBDIR)
-        self.songs_by_first_letter = None
+        self.jobs = jobs
+        self.timeout = timeout
+        self.retries = retries
+        self.command = command
+        self.batch_size = max(1, batch_size)
+        self.build_manifest = None
+        # the converters run in subprocesses, so threads are enough to keep jobs of them busy
+        self.executor = None
+        # (url, outputfilepath, pdf_filename, inputs) of pages waiting for a full batch
+        self.batch = []
+        # future -> the batch of every conversion which has not been reaped
+        self.pending = collections.OrderedDict()
+        self.num_launches = 0
+        self.submitted = set()
+        self.num_errors = 0
 
     def _find_sources(self):
-        if not self.songs_by_first_letter:
-            logger.debug('loading index from HTMLRenderer')
-            json_file = os.path.join(self.inputdir, HTMLRenderer.INDEX_JSON_FILE)
-            if not os.path.isfile(json_file):
-                raise IOError('cannot find index file: ' + json_file)
-            self.songs_by_first_letter = json.load(open(json_file, 'r'))
+        if self.build_manifest is None:
+            if self.html_renderer is not None and self.html_renderer.build_manifest:
+                # share the renderer's manifest, rather than reading one it is still writing
+                self.build_manifest = self.html_renderer.build_manifest
+            else:
+                logger.debug('loading build manifest from HTMLRenderer')
+                self.build_manifest = build.BuildManifest(self.base_outputdir)
+            if not self.build_manifest.songs:
+                raise IOError('cannot find any rendered songs in build manifest: ' +
+                              self.build_manifest.filepath)
 
     def _prepare_output_directory(self):
         if not os.path.isdir(self.outputdir):
@@ -130,14 +646,120 @@ class HTMLToPDFConverter(object):
             output_filename = input_filename.lower() + '.pdf'
         return output_filename
 
+    def _get_url(self, filename):
+        return 'file://{0}/{1}'.format(os.path.abspath(self.inputdir), filename)
+
+    def _reap(self, futures):
+        # the manifest is only ever touched from the calling thread
+        for future in futures:
+            batch = self.pending.pop(future)
+            for (_, _, pdf_filename, inputs), error in zip(batch, future.result()):
+                if error:
+                    self.num_errors += 1
+                    logger.error('could not convert {0} to pdf: {1}'.format(pdf_filename, error))
+                else:
+                    self.build_manifest.record_pdf(pdf_filename, inputs)
+
+    def _submit_batch(self):
+        if not self.batch:
+            return
+        if self.executor is None:
+            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs)
+        future = self.executor.submit(
+            _convert_to_pdf, self.command, [page[:2] for page in self.batch], self.timeout,
+            self.retries
+        )
+        self.pending[future] = self.batch
+        self.num_launches += 1
+        self.batch = []
+
+    def convert_song(self, song):
+        """ Start converting the html of a song to pdf, skipping pdfs which were converted
+            from html built from the same inputs
+
+        :param song: the song's entry in the build manifest (see BuildManifest.record_song)
+        """
+        self._find_sources()
+        self._prepare_output_directory()
+        self._reap([future for future in self.pending if future.done()])
+        logged = False
+        for filename in song['filenames'].values():
+            pdf_filename = self._get_output_filename(filename)
+            if pdf_filename in self.submitted or self.build_manifest.is_pdf_fresh(
+                pdf_filename, song['inputs'], self.outputdir
+            ):
+                continue
+            if not logged:
+                logger.info('converting song to pdf: ' + song['title'])
+                logged = True
+            outputfilepath = os.path.join(self.outputdir, pdf_filename)
+            if not os.path.isdir(os.path.dirname(outputfilepath)):
+                os.makedirs(os.path.dirname(outputfilepath))
+            self.batch.append((
+                self._get_url(filename), outputfilepath, pdf_filename, song['inputs']
+            ))
+            self.submitted.add(pdf_filename)
+            if len(self.batch) >= self.batch_size:
+                self._submit_batch()
+
+    def wait(self):
+        """ Convert any pages still waiting for a full batch, wait for every conversion which
+            has been started, then save the build manifest
+
+        :rtype: int, the number of pdfs which could not be converted
+        """
+        try:
+            self._submit_batch()
+            if self.pending:
+                self._reap(list(concurrent.futures.as_completed(list(self.pending))))
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+            if self.build_manifest is not None:
+                self.build_manifest.save()
+        return self.num_errors
+
     def convert_songs(self):
+        """ Convert the html of every song in the build manifest to pdf, besides those
+            which are already converted or being converted, and wait for them all
+
+        :rtype: int, the number of pdfs which could not be converted
+        """
         self._find_sources()
+        try:
+            for song in sorted(self.build_manifest.songs.values(), key=lambda s: s['title']):
+                self.convert_song(song)
+        finally:
+            num_errors = self.wait()
+        return num_errors
+
+    def convert_book(self):
+        """ Convert the html book (see HTMLRenderer.render_book) into one pdf, with a single
+            run of the converter, unless it was already converted from the same songs
+
+        :rtype: int, 1 if the book could not be converted, otherwise 0
+        """
+        self._find_sources()
+        book_filepath = os.path.join(self.inputdir, HTMLRenderer.BOOK_FILE)
+        if not os.path.isfile(book_filepath):
+            raise IOError('cannot find book file: ' + book_filepath)
         self._prepare_output_directory()
-        for songs in self.songs_by_first_letter.values():
-            for song_data in songs:
-                logger.info('converting song to pdf: ' + song_data['title'])
-                for filename in song_data['filenames'].values():
-                    wkhtmltopdf(
-                        'file://{0}/{1}'.format(os.path.abspath(self.inputdir), filename),
-                        os.path.join(self.outputdir, self._get_output_filename(filename))
-                    )
+        pdf_filename = self._get_output_filename(HTMLRenderer.BOOK_FILE)
+        inputs = dict(
+            (song_id, song['inputs']) for song_id, song in self.build_manifest.songs.items()
+        )
+        if self.build_manifest.is_pdf_fresh(pdf_filename, inputs, self.outputdir):
+            logger.info('not re-converting unchanged book')
+            return 0
+        logger.info('converting book to pdf')
+        error = _convert_to_pdf(self.command, [(
+            self._get_url(HTMLRenderer.BOOK_FILE), os.path.join(self.outputdir, pdf_filename)
+        )], self.timeout, self.retries)[0]
+        self.num_launches += 1
+        if error:
+            logger.error('could not convert {0} to pdf: {1}'.format(pdf_filename, error))
+            return 1
+        self.build_manifest.record_pdf(pdf_filename, inputs)
+        self.build_manifest.save()
+        return 0
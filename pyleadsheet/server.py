@@ -1,89 +1,163 @@
 import os
+import time
 import logging
-from flask import Flask, render_template, request
+from flask import Flask, render_template, request, send_from_directory, url_for, abort
 from . import views
+from . import assets
+from . import parser
+from . import catalog
+from . import templating
 
 logger = logging.getLogger(__name__)
-app = Flask(__name__)
+# static files are served by _serve_static, under their fingerprinted names
+app = Flask(__name__, static_folder=None)
+STATIC_MAX_AGE = 365 * 24 * 60 * 60
+# seconds for which the song files are not looked at again after refreshing app.catalog
+CATALOG_REFRESH_INTERVAL = 2
 
 
-def _filepath_to_shortstr(filepath):
-    """ Take a path and return the filename without any extension
-
-    .. doctests ::
-
-        >>> _filepath_to_shortstr('/path/to/some.file')
-        'some'
-    """
-    return '.'.join(os.path.basename(filepath).split('.')[:-1])
-
-
-def _shortstr_to_filepath(from_shortstr):
-    """ Take a filename with no extension, and return the path, which has previously
-        been loaded into app.song_files
+def _song_id_to_ref(song_id):
+    """ Take a song id and return a parser.SongRef for it, looking it up in app.catalog,
+        which holds the files previously loaded into app.song_files
 
     .. doctests ::
 
+        >>> import tempfile
+        >>> from . import parser
+        >>> song_file = tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False)
+        >>> _ = song_file.write('title: Some Song\\n')
+        >>> song_file.close()
         >>> monkeypatch = getfixture('monkeypatch')
-        >>> monkeypatch.setattr(app, 'song_files', ['/path/to/some.file'], raising=False)
-        >>> _shortstr_to_filepath('some')
-        '/path/to/some.file'
-        >>> _shortstr_to_filepath('other')  # doctest: +ELLIPSIS
+        >>> monkeypatch.setattr(app, 'catalog', catalog.SongCatalog(), raising=False)
+        >>> app.catalog.update([song_file.name])
+        1
+        >>> song_id = parser.filepath_to_song_id(song_file.name)
+        >>> _song_id_to_ref(song_id).filepath == song_file.name
+        True
+        >>> _song_id_to_ref('other')  # doctest: +ELLIPSIS
         Traceback (most recent call last):
             ...
-        ValueError: could not convert shortstr to filepath: other
+        ValueError: could not find song with id: other
+        >>> os.remove(song_file.name)
     """
-    for filepath in app.song_files:
-        filepath_shortstr = _filepath_to_shortstr(filepath)
-        if filepath_shortstr == from_shortstr:
-            return filepath
-    raise ValueError('could not convert shortstr to filepath: ' + from_shortstr)
+    song_ref = app.catalog.get_song_ref(song_id)
+    if song_ref is None:
+        raise ValueError('could not find song with id: ' + song_id)
+    return song_ref
 
 
-def _get_song_view_url(song_view_type, filepath):
-    """ Generate a URL endpoint for serving a song based the path to a source file
+def _get_song_view_url(song_view_type, song_id):
+    """ Generate a URL endpoint for serving a song based on its id
 
     .. doctests ::
 
-        >>> _get_song_view_url('complete', '/path/to/some.file')
+        >>> _get_song_view_url('complete', 'some')
         '/song/some/complete'
+        >>> _get_song_view_url('lyrics', 'hymns.amazing_grace')
+        '/song/hymns.amazing_grace/lyrics'
     """
-    shortstr = _filepath_to_shortstr(filepath)
-    return '/song/{shortstr}/{song_view_type}'.format(**locals())
+    return '/song/{song_id}/{song_view_type}'.format(**locals())
 
 
 @app.route('/', methods=['GET'])
 def _serve_index():
-    view_kwargs = views.compose_index_kwargs(app.song_files)
+    view_kwargs = views.compose_sorted_index_kwargs(app.catalog.iter_index_entries())
     for letter, songs in view_kwargs['songs_by_first_letter'].items():
         for song in songs:
             song['urls'] = []
             for song_view_type in view_kwargs['song_view_types']:
-                song['urls'].append(_get_song_view_url(song_view_type, song['filepath']))
+                song['urls'].append(_get_song_view_url(song_view_type, song['song_id']))
     return render_template('server_index.jinja2', **view_kwargs)
 
 
-@app.route('/song/<shortstr>/<song_view_type>', methods=['GET', 'POST'])
-def _serve_song(shortstr, song_view_type):
-    filepath = _shortstr_to_filepath(shortstr)
+@app.route('/search', methods=['GET'])
+def _serve_search():
+    query = request.args.get('q', '')
+    view_kwargs = views.compose_search_kwargs(query, app.catalog.search(query))
+    for song in view_kwargs['songs']:
+        song['urls'] = [
+            _get_song_view_url(song_view_type, song['song_id'])
+            for song_view_type in view_kwargs['song_view_types']
+        ]
+    return render_template('server_search.jinja2', **view_kwargs)
+
+
+@app.route('/song/<song_id>/<song_view_type>', methods=['GET', 'POST'])
+def _serve_song(song_id, song_view_type):
+    try:
+        song_ref = _song_id_to_ref(song_id)
+    except ValueError as e:
+        abort(404, description=str(e))
     transpose_root = request.form.get('transpose_root', None)
     condense_measures = True if request.form.get('condense_measures', None) == 'true' else False
-    view_kwargs = views.compose_song_kwargs(
-        filepath, song_view_type, transpose_root, condense_measures
-    )
+    try:
+        view_kwargs = views.compose_song_kwargs(
+            song_ref, song_view_type, transpose_root, condense_measures
+        )
+    except (ValueError, KeyError, IOError) as e:
+        # the song itself is broken (or the view or key asked for doesn't exist)
+        logger.error('could not render {0}: {1}'.format(song_id, e))
+        abort(400, description='could not render {0}: {1}'.format(song_id, e))
     return render_template('song.jinja2', **view_kwargs)
 
 
-@app.before_request
-def _load_files():
-    if not hasattr(app, 'song_files'):
-        setattr(app, 'song_files', None)
-    filenames = [x for x in os.listdir(app.song_files_dir) if x.endswith('yaml')]
-    app.song_files = [
-        os.path.join(app.song_files_dir, filename) for filename in filenames
-    ]
+@app.route('/static/<filename>', methods=['GET'], endpoint='static')
+def _serve_static(filename):
+    """ Serve a static file by its fingerprinted name (see assets.get_manifest), which
+        changes whenever its content does, so it may be cached forever.  Plain names are
+        still served, but must be revalidated
+    """
+    manifest = assets.get_manifest()
+    static_filename = assets.get_filename(manifest, filename)
+    if static_filename is not None:
+        response = send_from_directory(assets.STATIC_DIR, static_filename, max_age=STATIC_MAX_AGE)
+        response.cache_control.immutable = True
+        return response
+    if filename not in manifest:
+        abort(404)
+    return send_from_directory(assets.STATIC_DIR, filename, max_age=0)
 
 
-def run(input_dir, debug=False):
+@app.context_processor
+def _fingerprint_static_urls():
+    """ Have templates' url_for('static', filename=...) point at fingerprinted names
+
+    .. doctests ::
+
+        >>> with app.test_request_context():
+        ...     _fingerprint_static_urls()['url_for']('static', filename='pyleadsheet.css')
+        ...     # doctest: +ELLIPSIS
+        '/static/pyleadsheet....css'
+    """
+    def _url_for(endpoint, **values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = assets.get_manifest().get(values['filename'], values['filename'])
+        return url_for(endpoint, **values)
+    return {'url_for': _url_for}
+
+
+@app.before_request
+def _load_files():
+    """ Bring app.catalog in line with the song files in app.song_files_dir, at most once
+        every CATALOG_REFRESH_INTERVAL seconds, and never for static files
+    """
+    if request.endpoint == 'static':
+        return
+    source = (app.catalog, app.song_files_dir)
+    refreshed = getattr(app, 'catalog_refreshed', None)
+    now = time.monotonic()
+    if refreshed is not None and refreshed[0] == source and \
+            now - refreshed[1] < CATALOG_REFRESH_INTERVAL:
+        return
+    app.song_files = parser.find_song_files(app.song_files_dir)
+    app.catalog.update(app.song_files)
+    app.catalog_refreshed = (source, now)
+
+
+def run(input_dir, debug=False, cache_dir=None):
     setattr(app, 'song_files_dir', os.path.abspath(input_dir))
+    # render with the same loader and bytecode cache as renderer.HTMLRenderer
+    templating.set_cache_dir(cache_dir)
+    app.jinja_options = dict(app.jinja_options, **templating.get_environment_options())
+    setattr(app, 'catalog', catalog.SongCatalog.for_input_path(app.song_files_dir, cache_dir))
     app.run(debug=debug)
@@ -0,0 +1,131 @@
+"""
+Shared jinja2 configuration for the renderer and the server
+
+Compiled templates are kept in a FileSystemBytecodeCache, so they survive between
+runs.  For the fastest startup, the templates can also be compiled ahead of time into
+python modules which are shipped with the package:
+
+    python -m pyleadsheet.templating
+
+Precompiled modules are only used while they match the templates they were compiled
+from and the installed jinja2, so a stale set is ignored rather than rendered.
+"""
+
+import os
+import hashlib
+import jinja2
+
+import logging
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+COMPILED_TEMPLATES_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'compiled_templates'
+)
+COMPILED_TEMPLATES_STAMP_FILE = 'templates.sha1'
+BYTECODE_CACHE_SUBDIR = 'templates'
+
+# the process-wide environment, created on first use; see get_environment
+_state = {'cache_dir': None, 'environment': None}
+
+
+def get_templates_stamp():
+    """ Fingerprint of the templates and the jinja2 which compiles them """
+    stamp = hashlib.sha1(jinja2.__version__.encode('utf-8'))
+    for filename in sorted(os.listdir(TEMPLATES_DIR)):
+        stamp.update(filename.encode('utf-8'))
+        with open(os.path.join(TEMPLATES_DIR, filename), 'rb') as template_file:
+            stamp.update(template_file.read())
+    return stamp.hexdigest()
+
+
+def _has_compiled_templates():
+    stamp_path = os.path.join(COMPILED_TEMPLATES_DIR, COMPILED_TEMPLATES_STAMP_FILE)
+    if not os.path.isfile(stamp_path):
+        return False
+    with open(stamp_path) as stamp_file:
+        if stamp_file.read().strip() == get_templates_stamp():
+            return True
+    logger.debug('ignoring out of date compiled templates in ' + COMPILED_TEMPLATES_DIR)
+    return False
+
+
+def _get_loader(use_compiled=True):
+    loader = jinja2.FileSystemLoader(TEMPLATES_DIR)
+    if use_compiled and _has_compiled_templates():
+        return jinja2.ChoiceLoader([jinja2.ModuleLoader(COMPILED_TEMPLATES_DIR), loader])
+    return loader
+
+
+def get_cache_dir():
+    return _state['cache_dir']
+
+
+def set_cache_dir(cache_dir):
+    """ Keep compiled templates in a "templates" subdirectory of cache_dir, rather than in
+        jinja2's default directory under the system temp dir.  This affects environments
+        created from here on
+
+    :param cache_dir: path to a directory, or None to use the default
+    """
+    _state['cache_dir'] = cache_dir
+    _state['environment'] = None
+
+
+def get_environment_options():
+    """ Keyword arguments for jinja2.Environment (or flask's app.jinja_options), which
+        load the package's templates and cache their bytecode
+
+    .. doctests ::
+
+        >>> sorted(get_environment_options().keys())
+        ['bytecode_cache', 'loader']
+
+    :rtype: dict
+    """
+    if _state['cache_dir']:
+        bytecode_cache_dir = os.path.join(_state['cache_dir'], BYTECODE_CACHE_SUBDIR)
+        if not os.path.isdir(bytecode_cache_dir):
+            os.makedirs(bytecode_cache_dir)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(bytecode_cache_dir)
+    else:
+        bytecode_cache = jinja2.FileSystemBytecodeCache()
+    return {'loader': _get_loader(), 'bytecode_cache': bytecode_cache}
+
+
+def get_environment():
+    """ Get the process-wide jinja2.Environment, which caches loaded templates, so each
+        is compiled (or read from the bytecode cache) at most once per process
+
+    .. doctests ::
+
+        >>> get_environment() is get_environment()
+        True
+        >>> get_environment().get_template('song.jinja2').name
+        'song.jinja2'
+
+    :rtype: jinja2.Environment
+    """
+    if _state['environment'] is None:
+        _state['environment'] = jinja2.Environment(**get_environment_options())
+    return _state['environment']
+
+
+def compile_templates(target_dir=COMPILED_TEMPLATES_DIR):
+    """ Compile every template into a python module in target_dir, which
+        get_environment will load them from while they are up to date
+
+    :param target_dir: directory to write the modules to
+    """
+    if not os.path.isdir(target_dir):
+        os.makedirs(target_dir)
+    environment = jinja2.Environment(loader=_get_loader(use_compiled=False))
+    environment.compile_templates(target_dir, zip=None, log_function=logger.debug)
+    with open(os.path.join(target_dir, COMPILED_TEMPLATES_STAMP_FILE), 'w') as stamp_file:
+        stamp_file.write(get_templates_stamp() + '\n')
+    logger.info('compiled templates into ' + target_dir)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    compile_templates()
@@ -1,9 +1,10 @@
-import copy
 from . import models
 
 
 def transpose_chord_by_new_root(chord, from_key, to_root):
-    """ Transpose an instance of models.Chord (in place) from one key to another
+    """ Return the interned models.Chord which results from transposing chord from one
+        key to another.  chord itself is never modified; anything which is not a
+        models.Chord (eg. constants.REST) is returned as-is
 
     Note: valid string representations of from_key and to_root are accepted, but
           not chord
@@ -12,37 +13,27 @@ def transpose_chord_by_new_root(chord, from_key, to_root):
 
         >>> chord = models.Chord('c')
         >>> transpose_chord_by_new_root(chord, models.Key('C'), 'G')
-        >>> chord.root
-        Note(G)
-        >>> chord = models.Chord('C/B')
-        >>> transpose_chord_by_new_root(chord, models.Key('G'), 'F')
-        >>> chord.base
+        Chord(G)
+        >>> chord
+        Chord(C)
+        >>> transpose_chord_by_new_root(models.Chord('C/B'), models.Key('G'), 'F').base
         Note(A)
+        >>> transpose_chord_by_new_root('[x]', models.Key('G'), 'F')
+        '[x]'
 
     :param chord: instance of models.Chord
     :param from_key: instance of models.Key
     :param to_root: instance of models.Note
+    :rtype: models.Chord
     """
-    to_root = models.Note(to_root)
-    to_key = from_key.to_root(to_root)
-    interval = models.Interval.from_notes(from_key.root, to_root)
-    half_steps = interval.half_steps
-    for attr_name in 'root', 'base':
-        if hasattr(chord, attr_name):
-            chord_part = getattr(chord, attr_name)
-            if chord_part:
-                chord_part = models.Note(chord_part)
-                from_i = chord_part.chromatic_index
-                to_i = (from_i + half_steps) % 12
-                choices = to_key.note_lookup_list[to_i]
-                for choice in choices:
-                    if len(choice) == 1:
-                        break
-                setattr(chord, attr_name, choice)
+    if not isinstance(chord, models.Chord):
+        return chord
+    return chord.respell(from_key, from_key.to_root(to_root))
 
 
 def transpose_chord_by_half_steps(chord, from_key, half_steps):
-    """ Transpose an instance of models.Chord (in place) from one key to another
+    """ Return the interned models.Chord which results from transposing chord by a
+        number of half steps
 
     Note: valid string representations of from_key and to_root are accepted, but
           not chord
@@ -51,47 +42,152 @@ def transpose_chord_by_half_steps(chord, from_key, half_steps):
 
         >>> chord = models.Chord('F')
         >>> transpose_chord_by_half_steps(chord, models.Key('E'), 6)
-        >>> chord.root
-        Note(B)
+        Chord(B)
 
     :param chord: instance of models.Chord
     :param from_key: instance of models.Key
     :param half_steps: interval in half steps
+    :rtype: models.Chord
+    """
+    to_root = get_root_by_half_steps(from_key, half_steps)
+    return transpose_chord_by_new_root(chord, from_key, to_root)
+
+
+def get_root_by_half_steps(from_key, half_steps):
+    """ Return the root of the key which is half_steps away from from_key
+
+    .. doctests ::
+
+        >>> get_root_by_half_steps(models.Key('E'), 6)
+        Note(Bb)
+        >>> get_root_by_half_steps(models.Key('C-'), -3)
+        Note(A)
+
+    :param from_key: instance of models.Key
+    :param half_steps: interval in half steps
+    :rtype: models.Note
     """
     to_chromatic_index = (from_key.root.chromatic_index + half_steps) % 12
+    transposable_roots = from_key.transposable_roots
     for note in models.Note.all()[to_chromatic_index]:
-        try:
-            from_key.to_root(note)
-            return transpose_chord_by_new_root(chord, from_key, note)
-        except ValueError:
-            pass
+        if note in transposable_roots:
+            return note
     # should never get here!
-    raise ValueError(
-        'could not transpose {} by {} half steps based on {}'.format(chord, half_steps, from_key)
-    )
+    raise ValueError('could not transpose {} by {} half steps'.format(from_key, half_steps))
 
 
-def _transpose_progression_data_by_new_root(progression_data, from_key, to_root):
+def _transpose_progression_data(progression_data, from_key, to_key):
     for datum in progression_data:
         if 'group' in datum.keys():
-            _transpose_progression_data_by_new_root(datum['progression'], from_key, to_root)
-        elif 'chord' in datum.keys():
-            transpose_chord_by_new_root(datum['chord'], from_key, to_root)
+            _transpose_progression_data(datum['progression'], from_key, to_key)
+        elif 'chord' in datum.keys() and isinstance(datum['chord'], models.Chord):
+            datum['chord'] = datum['chord'].respell(from_key, to_key)
 
 
-def _transpose_nonprogression_data_by_new_root(data, from_key, to_root):
+def _transpose_nonprogression_data(data, from_key, to_key):
     for key in ['comment']:
         if key in data.keys():
             for i in range(len(data[key])):
-                if type(data[key][i]) == models.Chord:
-                    transpose_chord_by_new_root(data[key][i], from_key, to_root)
+                if isinstance(data[key][i], models.Chord):
+                    data[key][i] = data[key][i].respell(from_key, to_key)
+
+
+def _transposed_progression_data(progression_data, from_key, to_key):
+    ret = []
+    for datum in progression_data:
+        if 'group' in datum.keys():
+            datum = dict(datum)
+            datum['progression'] = _transposed_progression_data(
+                datum['progression'], from_key, to_key
+            )
+        elif 'chord' in datum.keys() and isinstance(datum['chord'], models.Chord):
+            datum = dict(datum)
+            datum['chord'] = datum['chord'].respell(from_key, to_key)
+        ret.append(datum)
+    return ret
+
+
+def _transposed_nonprogression_data(data, from_key, to_key):
+    ret = data.copy()
+    for key in ['comment']:
+        if key in data.keys() and isinstance(data[key], list):
+            ret[key] = [
+                value.respell(from_key, to_key) if isinstance(value, models.Chord) else value
+                for value in data[key]
+            ]
+    return ret
+
+
+def transpose_song(song_data, to_root):
+    """ Return a transposed view of song_data, which is left untouched, so it may be a
+        song shared by many readers (see parser.parse_source(..., shared=True)).  The view
+        has its own top-level, progression and form section mappings and its own chord and
+        comment lists; everything else (lyrics, durations, ...) is shared with song_data
+
+    .. doctests ::
+
+        >>> song_data = {
+        ...     'key': models.Key.get('C'),
+        ...     'progressions': [{'chords': [{'chord': models.Chord('A-7/G')}]}],
+        ...     'form': [{'comment': ['over ', models.Chord('F')], 'lyrics': 'la la'}],
+        ... }
+        >>> view = transpose_song(song_data, 'Eb')
+        >>> view['key'], view['progressions'][0]['chords'][0]['chord']
+        (Key(Eb), Chord(C-7/Bb))
+        >>> view['form'][0]['comment']
+        ['over ', Chord(Ab)]
+        >>> song_data['key'], song_data['progressions'][0]['chords'][0]['chord']
+        (Key(C), Chord(A-7/G))
+        >>> view['form'][0]['lyrics'] is song_data['form'][0]['lyrics']
+        True
+
+    :param song_data: parsed song data, as returned by parser.parse
+    :param to_root: instance of models.Note
+    :rtype: dict or models.LazyDict
+    """
+    from_key = song_data['key']
+    to_key = from_key.to_root(to_root)
+    progressions = []
+    for progression_data in song_data['progressions']:
+        chords = _transposed_progression_data(progression_data['chords'], from_key, to_key)
+        progression_data = _transposed_nonprogression_data(progression_data, from_key, to_key)
+        progression_data['chords'] = chords
+        progressions.append(progression_data)
+    ret = song_data.copy()
+    ret['key'] = to_key
+    ret['progressions'] = progressions
+    ret['form'] = [
+        _transposed_nonprogression_data(form_section, from_key, to_key)
+        for form_section in song_data['form']
+    ]
+    return ret
 
 
 def transpose_song_data_by_new_root(song_data, to_root):
-    from_key = copy.deepcopy(song_data['key'])
-    song_data['key'] = song_data['key'].to_root(to_root)
+    """ Transpose every chord in song_data to the key rooted at to_root, in place.  Each
+        chord is respelled by looking up its degree in the new key, so no intervals or
+        scales are worked out per chord
+
+    .. doctests ::
+
+        >>> song_data = {
+        ...     'key': models.Key.get('C'),
+        ...     'progressions': [{'chords': [{'chord': models.Chord('A-7/G')}]}],
+        ...     'form': [{'comment': ['over ', models.Chord('F')]}],
+        ... }
+        >>> transpose_song_data_by_new_root(song_data, 'Eb')
+        >>> song_data['key'], song_data['progressions'][0]['chords'][0]['chord']
+        (Key(Eb), Chord(C-7/Bb))
+        >>> song_data['form'][0]['comment']
+        ['over ', Chord(Ab)]
+
+    :param song_data: parsed song data, as returned by parser.parse
+    :param to_root: instance of models.Note
+    """
+    from_key = song_data['key']
+    to_key = song_data['key'] = from_key.to_root(to_root)
     for progression_data in song_data['progressions']:
-        _transpose_progression_data_by_new_root(progression_data['chords'], from_key, to_root)
-        _transpose_nonprogression_data_by_new_root(progression_data, from_key, to_root)
+        _transpose_progression_data(progression_data['chords'], from_key, to_key)
+        _transpose_nonprogression_data(progression_data, from_key, to_key)
     for form_section in song_data['form']:
-        _transpose_nonprogression_data_by_new_root(form_section, from_key, to_root)
+        _transpose_nonprogression_data(form_section, from_key, to_key)
@@ -1,6 +1,9 @@
 import os
 import logging
 import datetime
+import functools
+import itertools
+import collections
 import funcy
 from . import parser
 from . import constants
@@ -10,12 +13,16 @@ from . import transposer
 logger = logging.getLogger(__name__)
 
 SONG_VIEW_TYPES = ['complete', 'leadsheet', 'lyrics']
+# the views which show chords, which are all that transposing a song changes
+LEADSHEET_VIEW_TYPES = ['complete', 'leadsheet']
+BOOK_SONG_VIEW_TYPE = 'complete'
 DEFAULT_MEASURES_PER_ROW = 4
 DURATION_UNIT_MULTIPLIERS = {
     constants.DURATION_UNIT_MEASURE: 8,
     constants.DURATION_UNIT_BEAT: 2,
     constants.DURATION_UNIT_HALFBEAT: 1
 }
+LAYOUT_CACHE_SIZE = 1024
 
 
 @funcy.memoize
@@ -52,20 +59,20 @@ def _with_universal_view_kwargs(view_kwargs):
     return view_kwargs
 
 
-def _get_sortable_title(title):
+def get_sortable_title(title):
     """ Get a version of a song title which fits it in a sort function (eg. ignore "the")
 
     .. doctests ::
 
-        >>> _get_sortable_title('Homeward Bound')
+        >>> get_sortable_title('Homeward Bound')
         'Homeward Bound'
-        >>> _get_sortable_title('The Onion Strikes Again')
+        >>> get_sortable_title('The Onion Strikes Again')
         'Onion Strikes Again'
-        >>> _get_sortable_title('the lowercase')
+        >>> get_sortable_title('the lowercase')
         'lowercase'
-        >>> _get_sortable_title('THE')
+        >>> get_sortable_title('THE')
         'THE'
-        >>> _get_sortable_title('Theoretically True')
+        >>> get_sortable_title('Theoretically True')
         'Theoretically True'
 
     :param title: title to convert
@@ -76,24 +83,57 @@ def _get_sortable_title(title):
     return title
 
 
-def compose_index_kwargs(filepaths):
+def _get_index_entry(source):
+    if isinstance(source, parser.SongRef):
+        filepath, song_id, title = source.filepath, source.song_id, source.title
+    else:
+        filepath = source
+        song_id = parser.filepath_to_song_id(filepath)
+        title = parser.get_title_from_song_file(filepath)
+    return {
+        'filepath': filepath,
+        'song_id': song_id,
+        'display_title': title,
+        'sortable_title': get_sortable_title(title)
+    }
+
+
+def compose_index_kwargs(sources):
     """ Get a dict of objects needed to render a table of contents
 
-    :param filepaths:
+    :param sources: list of paths to song files and/or parser.SongRefs
+    :rtype: dict
+    """
+    songs_by_id = {}
+    for source in sources:
+        index_entry = _get_index_entry(source)
+        songs_by_id[index_entry['song_id']] = index_entry
+    return compose_sorted_index_kwargs(
+        sorted(songs_by_id.values(), key=lambda k: k['sortable_title'])
+    )
+
+
+def compose_sorted_index_kwargs(index_entries):
+    """ Get a dict of objects needed to render a table of contents from index entries
+        which are already ordered by sortable title (eg. from catalog.SongCatalog)
+
+    .. doctests ::
+
+        >>> view_kwargs = compose_sorted_index_kwargs([
+        ...     {'song_id': 'a', 'display_title': 'The Apple', 'sortable_title': 'Apple'},
+        ...     {'song_id': 'b', 'display_title': 'avocado', 'sortable_title': 'avocado'},
+        ...     {'song_id': 'c', 'display_title': 'Cherry', 'sortable_title': 'Cherry'},
+        ... ])
+        >>> songs_by_first_letter = view_kwargs['songs_by_first_letter']
+        >>> [(k, [s['song_id'] for s in v]) for k, v in songs_by_first_letter.items()]
+        [('A', ['a', 'b']), ('C', ['c'])]
+
+    :param index_entries: iterable of dicts with song_id, display_title and sortable_title
     :rtype: dict
     """
-    songs_by_title = {}
-    for path in filepaths:
-        title = parser.get_title_from_song_file(path)
-        sortable_title = _get_sortable_title(title)
-        songs_by_title[title] = {
-            'filepath': path,
-            'display_title': title,
-            'sortable_title': sortable_title
-        }
     songs_by_first_letter = {}
     current_letter = None
-    for song_data in sorted(songs_by_title.values(), key=lambda k: k['sortable_title']):
+    for song_data in index_entries:
         if not current_letter or song_data['sortable_title'][0].upper() > current_letter:
             current_letter = song_data['sortable_title'][0].upper()
             songs_by_first_letter[current_letter] = []
@@ -105,6 +145,58 @@ def compose_index_kwargs(filepaths):
     return _with_universal_view_kwargs(view_kwargs)
 
 
+def compose_search_kwargs(query, index_entries):
+    """ Get a dict of objects needed to render the results of a search
+
+    :param query: the words which were searched for
+    :param index_entries: the songs which were found (see catalog.SongCatalog.search)
+    :rtype: dict
+    """
+    view_kwargs = {
+        'query': query,
+        'songs': index_entries,
+        'song_view_types': SONG_VIEW_TYPES
+    }
+    return _with_universal_view_kwargs(view_kwargs)
+
+
+def add_song_anchors(songs_by_first_letter):
+    """ Give every song in a table of contents the id of the element which holds it in a
+        book
+
+    .. doctests ::
+
+        >>> add_song_anchors({'A': [{'song_id': 'hymns.amazing_grace'}]})
+        {'A': [{'song_id': 'hymns.amazing_grace', 'anchor': 'song-hymns.amazing_grace'}]}
+
+    :param songs_by_first_letter: as composed by compose_sorted_index_kwargs
+    :rtype: dict, songs_by_first_letter
+    """
+    for songs in songs_by_first_letter.values():
+        for song in songs:
+            song['anchor'] = 'song-' + song['song_id']
+    return songs_by_first_letter
+
+
+def compose_book_kwargs(index_kwargs, book_songs):
+    """ Get a dict of objects needed to render many songs into one document, after a table
+        of contents.  book_songs is only iterated over as the book is rendered, so it can
+        compose each song as it is reached
+
+    :param index_kwargs: result of compose_index_kwargs or compose_sorted_index_kwargs,
+                         with anchors (see add_song_anchors)
+    :param book_songs: iterable of song view kwargs (see compose_song_kwargs), in the order
+                       of the table of contents, each with the anchor of its song
+    :rtype: dict
+    """
+    view_kwargs = {
+        'songs_by_first_letter': index_kwargs['songs_by_first_letter'],
+        'book_songs': book_songs,
+        'in_book': True
+    }
+    return _with_universal_view_kwargs(view_kwargs)
+
+
 def _calculate_max_measures_per_row(condense_measures):
     """ Figure out how many measures will fit on displayed row given a "condense" directive
 
@@ -219,24 +311,186 @@ def _convert_progression_data(progression_data, multipliers):
     return measures
 
 
-def _make_rows(progression_data, multipliers, max_measures):
+def _iter_rows(progression_data, multipliers, max_measures):
+    """ Break a progression into rows of measures, yielding each row once it is complete """
     measures = _convert_progression_data(progression_data, multipliers)
-    rows = []
-    lastbreak = 0
+    row = []
     for i in range(len(measures)):
-        if (
-            i == 0 or
-            i - lastbreak == max_measures or
+        if row and (
+            len(row) == max_measures or
             measures[i-1].end_bar in (
                 constants.BAR_REPEAT_CLOSE,
                 constants.BAR_SECTION_CLOSE
             ) or
             constants.ARG_ROW_BREAK in measures[i-1].args
         ):
-            rows.append([])
-            lastbreak = i
-        rows[-1].append(measures[i])
-    return rows
+            yield row
+            row = []
+        row.append(measures[i])
+    if row:
+        yield row
+
+
+MeasureLayout = collections.namedtuple(
+    'MeasureLayout', ['start_bar', 'end_bar', 'start_note', 'end_note', 'args', 'slots']
+)
+
+
+def _get_progression_structure(progression_data, chord_data):
+    """ Return a hashable description of everything in progression_data which affects its
+        layout, ie. everything except the chords themselves.  Each chord datum is appended
+        to chord_data, in the order the layout numbers its slots
+
+    .. doctests ::
+
+        >>> from .models import ChordDuration
+        >>> chord_data = []
+        >>> _get_progression_structure([
+        ...     {'chord': 'C', 'duration': [ChordDuration(1, 'm')], 'optional': False},
+        ...     {'arg': '/'}
+        ... ], chord_data)
+        (('chord', (ChordDuration(count=1, unit='m'),)), ('arg', '/'))
+        >>> chord_data[0]['chord']
+        'C'
+    """
+    ret = []
+    for datum in progression_data:
+        if 'arg' in datum.keys():
+            ret.append(('arg', datum['arg']))
+        elif 'group' in datum.keys():
+            ret.append((
+                'group',
+                datum['group'],
+                datum['note'],
+                _get_progression_structure(datum['progression'], chord_data)
+            ))
+        elif 'chord' in datum.keys():
+            ret.append(('chord', tuple(datum['duration'])))
+            chord_data.append(datum)
+    return tuple(ret)
+
+
+def _get_slot_progression_data(structure, slot_numbers):
+    ret = []
+    for item in structure:
+        if item[0] == 'arg':
+            ret.append({'arg': item[1]})
+        elif item[0] == 'group':
+            ret.append({
+                'group': item[1],
+                'note': item[2],
+                'progression': _get_slot_progression_data(item[3], slot_numbers)
+            })
+        else:
+            ret.append({'chord': next(slot_numbers), 'duration': item[1], 'optional': False})
+    return ret
+
+
+@functools.lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def _get_layout(structure, multipliers, max_measures):
+    """ Lay out a progression structure (see _get_progression_structure) in rows of
+        MeasureLayouts.  Each MeasureLayout's slots hold, for every subdivision, the number
+        of the chord which is shown there, or None.  The layout does not depend on which
+        chords are played, so it is shared by every view and transposition of every
+        progression with the same structure
+
+    .. doctests ::
+
+        >>> from .models import ChordDuration
+        >>> layout = _get_layout(
+        ...     (('chord', (ChordDuration(1, 'm'),)), ('chord', (ChordDuration(1, 'm'),))),
+        ...     (('b', 2), ('h', 1), ('m', 4)),
+        ...     4
+        ... )
+        >>> [measure.slots for row in layout for measure in row]
+        [(0, None, None, None), (1, None, None, None)]
+
+    :param structure: result of _get_progression_structure
+    :param multipliers: sorted items of the song's multipliers
+    :param max_measures: maximum number of measures in a row
+    :rtype: tuple
+    """
+    slot_progression_data = _get_slot_progression_data(structure, itertools.count())
+    rows = _iter_rows(slot_progression_data, dict(multipliers), max_measures)
+    return tuple(
+        tuple(
+            MeasureLayout(
+                measure.start_bar,
+                measure.end_bar,
+                measure.start_note,
+                measure.end_note,
+                tuple(measure.args),
+                tuple(
+                    subdivision.content if type(subdivision.content) is int else None
+                    for subdivision in measure.subdivisions
+                )
+            )
+            for measure in row
+        )
+        for row in rows
+    )
+
+
+def _fill_row(row_layout, chord_data):
+    row = []
+    for measure_layout in row_layout:
+        measure = models.Measure(len(measure_layout.slots))
+        measure.start_bar = measure_layout.start_bar
+        measure.end_bar = measure_layout.end_bar
+        measure.start_note = measure_layout.start_note
+        measure.end_note = measure_layout.end_note
+        measure.args = list(measure_layout.args)
+        for i, slot in enumerate(measure_layout.slots):
+            if slot is not None:
+                datum = chord_data[slot]
+                measure.subdivisions[i] = models.Subdivision(
+                    datum['chord'], optional=bool(datum['optional'])
+                )
+        row.append(measure)
+    return row
+
+
+class _Rows(object):
+    """ The rows of measures of a progression, which are only built as they are iterated
+        over, one row at a time, so a template never holds more than a row of Measures.
+        Each iteration builds them afresh from the (shared) layout
+
+    .. doctests ::
+
+        >>> from .models import ChordDuration
+        >>> structure = (('chord', (ChordDuration(1, 'm'),)),) * 3
+        >>> layout = _get_layout(structure, (('b', 2), ('h', 1), ('m', 4)), 2)
+        >>> rows = _Rows(layout, [{'chord': c, 'optional': False} for c in 'ABC'])
+        >>> len(rows), [[m.subdivisions[0].content for m in row] for row in rows]
+        (2, [['A', 'B'], ['C']])
+    """
+
+    def __init__(self, layout, chord_data):
+        self.layout = layout
+        self.chord_data = chord_data
+
+    def __len__(self):
+        return len(self.layout)
+
+    def __iter__(self):
+        for row_layout in self.layout:
+            yield _fill_row(row_layout, self.chord_data)
+
+
+def _get_rows(progression_data, multipliers, max_measures):
+    """ Return the same rows as _iter_rows, taking the layout from a cache keyed on the
+        progression's structure, so that only the chords are filled in for each view, and
+        only as each row is rendered
+
+    :param progression_data: parsed progression
+    :param multipliers: dict of duration unit multipliers for the song
+    :param max_measures: maximum number of measures in a row
+    :rtype: _Rows
+    """
+    chord_data = []
+    structure = _get_progression_structure(progression_data, chord_data)
+    layout = _get_layout(structure, tuple(sorted(multipliers.items())), max_measures)
+    return _Rows(layout, chord_data)
 
 
 def _convert_linebreaks_to_html(text_snippet):
@@ -324,7 +578,7 @@ def _prepend_global_comments(song_data):
                     if type(progression['comment']) is str:
                         comment = [progression['comment']]
                     else:
-                        comment = progression['comment']
+                        comment = list(progression['comment'])
                     if 'comment' in section.keys():
                         comment += [' -- '] + section['comment']
                     section['comment'] = comment
@@ -357,32 +611,81 @@ def _prepend_continuation_comments(form_data):
             form_data[i]['comment'] = comment
 
 
-def compose_song_kwargs(filepath, song_view_type, transpose_to_root=None, condense_measures=False):
-    if not os.path.isfile(filepath):
-        raise IOError('input file does not exist: ' + filepath)
+def _copy_mapping(data, resolve):
+    if isinstance(data, models.LazyDict):
+        return data.copy(resolve=resolve)
+    return data.copy()
+
+
+def _make_song_view(song_data, resolve):
+    """ Return a copy of song_data with its own top-level, progression and form section
+        mappings, which a view is free to fill in.  Everything below them is shared with
+        song_data, which is left untouched
+
+    .. doctests ::
+
+        >>> song_data = {'title': 'Shared', 'progressions': [{'name': 'a'}], 'form': []}
+        >>> view = _make_song_view(song_data, resolve=False)
+        >>> view['progressions'][0]['rows'] = []
+        >>> song_data['progressions']
+        [{'name': 'a'}]
+
+    :param song_data: parsed song data, which may be shared through the song cache
+    :param resolve: compute deferred values in song_data, so that views share them
+    :rtype: dict or models.LazyDict
+    """
+    ret = _copy_mapping(song_data, resolve)
+    ret['progressions'] = [_copy_mapping(p, resolve) for p in song_data['progressions']]
+    ret['form'] = [_copy_mapping(form_section, resolve) for form_section in song_data['form']]
+    return ret
+
+
+def compose_song_kwargs(source, song_view_type, transpose_to_root=None, condense_measures=False,
+                        song_data=None):
+    """ Get a dict of objects needed to render a song view.  Chords, comments and
+        layout are only used by leadsheets, so the lyrics view never lays them out.  The
+        song is read from the song cache without copying it, and only the parts which the
+        view changes are copied, so any number of views and transpositions share a single
+        parse
+
+    :param source: path to a song file, or parser.SongRef
+    :param song_view_type: one of SONG_VIEW_TYPES
+    :param transpose_to_root: root of the key to transpose the song to, if any
+    :param condense_measures: fit twice as many measures in each row
+    :param song_data: the already parsed song, which is left untouched, if the caller has it
+    :rtype: dict
+    """
     if song_view_type not in SONG_VIEW_TYPES:
         raise ValueError('invalid song view type: ' + song_view_type)
-    song_data = parser.parse_file(filepath)
-    if transpose_to_root:
-        transposer.transpose_song_data_by_new_root(song_data, transpose_to_root)
+    if song_data is None:
+        filepath = source.filepath if isinstance(source, parser.SongRef) else source
+        if not os.path.isfile(filepath):
+            raise IOError('input file does not exist: ' + filepath)
+        song_data = parser.parse_source(source, shared=True)
+    render_leadsheet = song_view_type in LEADSHEET_VIEW_TYPES
+    if transpose_to_root and render_leadsheet:
+        song_data = transposer.transpose_song(song_data, transpose_to_root)
+    song_data = _make_song_view(song_data, resolve=render_leadsheet)
     _add_multipliers_to_song_data(song_data)
     _add_max_measures_per_row_to_song_data(song_data, condense_measures)
-    for progression in song_data['progressions']:
-        progression['rows'] = _make_rows(
-            progression['chords'],
-            song_data['multipliers'],
-            song_data['max_measures_per_row']
-        )
+    if render_leadsheet:
+        for progression in song_data['progressions']:
+            progression['rows'] = _get_rows(
+                progression['chords'],
+                song_data['multipliers'],
+                song_data['max_measures_per_row']
+            )
     for form_section in song_data['form']:
         _prepare_form_section_lyrics(form_section)
-    _prepend_global_comments(song_data)
-    _prepend_continuation_comments(song_data['form'])
+    if render_leadsheet:
+        _prepend_global_comments(song_data)
+        _prepend_continuation_comments(song_data['form'])
     return _with_universal_view_kwargs({
         'song': song_data,
         'num_subdivisions': song_data['multipliers'][constants.DURATION_UNIT_MEASURE],
-        'render_leadsheet': song_view_type in ('complete', 'leadsheet'),
+        'render_leadsheet': render_leadsheet,
         'render_lyrics': song_view_type in ('complete', 'lyrics'),
         'transpose_root': transpose_to_root,
-        'transposable_roots': song_data['key'].transposable_roots,
+        'transposable_roots': song_data['key'].transposable_roots if render_leadsheet else [],
         'condense_measures': condense_measures
     })
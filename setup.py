@@ -30,7 +30,6 @@ setup(
         'funcy',
         'pyyaml',
         'jinja2',
-        'wkhtmltopdf-wrapper',
         'flask'
     ],
     classifiers=[
@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def user_cache_dir(monkeypatch, tmp_path):
+    # keep the song catalogs written by default out of the real user cache dir
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    return tmp_path / 'cache'
@@ -0,0 +1,87 @@
+import os
+import shutil
+import docopt
+import tempfile
+from pyleadsheet import main
+from pyleadsheet import parser
+from pyleadsheet import server
+from pyleadsheet import catalog
+
+BAD_PROGRESSION = """title: Bad Progression
+key: C
+time: 4/4
+progressions:
+  - name: A
+    chords: "[C] not a chord [G]"
+form:
+  - progression: A
+"""
+BAD_CHORD = BAD_PROGRESSION.replace('[C] not a chord [G]', '[C][H7]')
+
+
+def _write_song(dirpath, filename, content):
+    filepath = os.path.join(dirpath, filename)
+    with open(filepath, 'w') as song_file:
+        song_file.write(content)
+    return filepath
+
+
+def test_parse_many_reports_bad_progressions():
+    dirpath = tempfile.mkdtemp()
+    try:
+        results = parser.parse_many([
+            _write_song(dirpath, 'progression.yaml', BAD_PROGRESSION),
+            _write_song(dirpath, 'chord.yaml', BAD_CHORD)
+        ])
+    finally:
+        shutil.rmtree(dirpath)
+    assert [result.song for result in results] == [None, None]
+    assert results[0].error.startswith('ValueError: found garbage characters in progression')
+    assert results[1].error == 'ValueError: "H" is not a valid pyleadsheet note'
+
+
+def test_server_reports_bad_songs(monkeypatch):
+    dirpath = tempfile.mkdtemp()
+    try:
+        _write_song(dirpath, 'bad.yaml', BAD_PROGRESSION)
+        monkeypatch.setattr(server.app, 'song_files_dir', dirpath, raising=False)
+        monkeypatch.setattr(server.app, 'catalog', catalog.SongCatalog(), raising=False)
+        client = server.app.test_client()
+        response = client.get(server._get_song_view_url('complete', 'bad'))
+        assert response.status_code == 400
+        assert 'found garbage characters' in response.get_data(as_text=True)
+        assert client.get(server._get_song_view_url('complete', 'missing')).status_code == 404
+    finally:
+        shutil.rmtree(dirpath)
+
+
+def test_generate_fails_on_bad_songs():
+    dirpath = tempfile.mkdtemp()
+    try:
+        _write_song(dirpath, 'good.yaml', BAD_PROGRESSION.replace('not a chord ', ''))
+        outputdir = os.path.join(dirpath, 'output')
+        argv = ['generate', dirpath, '--output=' + outputdir]
+        assert main.generate(docopt.docopt(main.__doc__, argv=argv)) == 0
+        _write_song(dirpath, 'bad.yaml', BAD_PROGRESSION)
+        assert main.generate(docopt.docopt(main.__doc__, argv=argv)) == 1
+        assert os.path.isfile(os.path.join(outputdir, 'html', 'bad_progression_complete.html'))
+    finally:
+        shutil.rmtree(dirpath)
+
+
+def test_check_many_reports_undecodable_files():
+    dirpath = tempfile.mkdtemp()
+    try:
+        filepaths = [
+            os.path.join(dirpath, filename) for filename in ('bad.yaml', 'bad.songbook.yaml')
+        ]
+        for filepath in filepaths:
+            with open(filepath, 'wb') as song_file:
+                song_file.write(b'title: \xff\xfe\n')
+        results = parser.check_many(filepaths + [_write_song(dirpath, 'bad2.yaml', BAD_CHORD)])
+    finally:
+        shutil.rmtree(dirpath)
+    for result in results[:2]:
+        assert [error.path for error in result.errors] == ['']
+        assert isinstance(result.errors[0].error, UnicodeDecodeError)
+    assert [error.path for error in results[2].errors] == ['progressions[0].chords']
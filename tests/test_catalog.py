@@ -0,0 +1,124 @@
+import os
+import shutil
+import logging
+import tempfile
+from pyleadsheet import catalog
+
+SONG = 'title: {0}\nkey: C\ntime: 4/4\nprogressions:\n  - name: A\n    chords: "[C][G]"\n' \
+       'form:\n  - progression: A\n    lyrics: la\n'
+
+
+def _write_song(dirpath, filename, title):
+    filepath = os.path.join(dirpath, filename)
+    with open(filepath, 'w') as song_file:
+        song_file.write(SONG.format(title))
+    return filepath
+
+
+def test_update_without_prune_keeps_other_files():
+    dirpath = tempfile.mkdtemp()
+    try:
+        one = _write_song(dirpath, 'one.yaml', 'One')
+        two = _write_song(dirpath, 'two.yaml', 'Two')
+        song_catalog = catalog.SongCatalog.in_dir(dirpath)
+        song_catalog.update([one, two])
+        assert song_catalog.update([one], prune=False) == 0
+        assert song_catalog.get_song_ref('two').title == 'Two'
+        # files which have gone are still dropped
+        os.remove(two)
+        assert song_catalog.update([one], prune=False) == 1
+        assert song_catalog.get_song_ref('two') is None
+    finally:
+        shutil.rmtree(dirpath)
+
+
+def test_song_id_collision_is_logged_not_replaced(caplog):
+    dirpath = tempfile.mkdtemp()
+    try:
+        first = _write_song(dirpath, 'same.yaml', 'First')
+        os.mkdir(os.path.join(dirpath, 'sub'))
+        second = _write_song(os.path.join(dirpath, 'sub'), 'same.yaml', 'Second')
+        song_catalog = catalog.SongCatalog()
+        with caplog.at_level(logging.WARNING, logger=catalog.__name__):
+            song_catalog.update([first, second])
+        assert song_catalog.get_song_ref('same').title == 'First'
+        assert second in caplog.text and first in caplog.text
+        # once the first song has gone, the second takes its id
+        os.remove(first)
+        song_catalog.update([second])
+        assert song_catalog.get_song_ref('same').title == 'Second'
+    finally:
+        shutil.rmtree(dirpath)
+
+
+def test_search_keeps_catalog_in_user_cache_dir(monkeypatch, capsys):
+    from pyleadsheet import main, parser
+    dirpath = tempfile.mkdtemp()
+    try:
+        song_dir = os.path.join(dirpath, 'songs')
+        os.mkdir(song_dir)
+        _write_song(song_dir, 'one.yaml', 'One')
+        monkeypatch.setenv('XDG_CACHE_HOME', os.path.join(dirpath, 'cache'))
+        args = {'<inputdir>': song_dir, '<query>': ['one'], '--cache-dir': None}
+        assert main.search(args) == 0
+        assert os.path.isfile(catalog.get_user_catalog_path(song_dir))
+        assert os.listdir(song_dir) == ['one.yaml']
+
+        # nothing has changed, so the second search does not read the song again
+        def fail(filepath):
+            raise AssertionError('read ' + filepath)
+        monkeypatch.setattr(parser, 'iter_song_documents', fail)
+        assert main.search(args) == 0
+        assert capsys.readouterr().out == 'one: One\none: One\n'
+    finally:
+        shutil.rmtree(dirpath)
+
+
+def test_server_refreshes_catalog_sparingly(monkeypatch):
+    from pyleadsheet import server
+    dirpath = tempfile.mkdtemp()
+    try:
+        _write_song(dirpath, 'short.yml', 'Short Suffix')
+        song_catalog = catalog.SongCatalog()
+        updates = []
+        update = song_catalog.update
+        monkeypatch.setattr(song_catalog, 'update', lambda filepaths: updates.append(
+            update(filepaths)
+        ))
+        monkeypatch.setattr(server.app, 'song_files_dir', dirpath, raising=False)
+        monkeypatch.setattr(server.app, 'catalog', song_catalog, raising=False)
+        client = server.app.test_client()
+        assert 'Short Suffix' in client.get('/').get_data(as_text=True)
+        assert client.get('/static/pyleadsheet.css').status_code == 200
+        assert client.get(server._get_song_view_url('lyrics', 'short')).status_code == 200
+        assert updates == [1]
+        monkeypatch.setattr(server, 'CATALOG_REFRESH_INTERVAL', 0)
+        _write_song(dirpath, 'other.yaml', 'Other')
+        assert 'Other' in client.get('/').get_data(as_text=True)
+        assert updates == [1, 1]
+    finally:
+        shutil.rmtree(dirpath)
+
+
+def test_generate_indexes_from_headers_without_persistent_catalog(monkeypatch):
+    import docopt
+    from pyleadsheet import main, parser
+    dirpath = tempfile.mkdtemp()
+    try:
+        song_dir = os.path.join(dirpath, 'songs')
+        os.mkdir(song_dir)
+        _write_song(song_dir, 'one.yaml', 'One')
+        # a file where the user cache dir should be, so no catalog can be kept there
+        open(os.path.join(dirpath, 'cache'), 'w').close()
+        monkeypatch.setenv('XDG_CACHE_HOME', os.path.join(dirpath, 'cache'))
+
+        def fail(filepath):
+            raise AssertionError('loaded ' + filepath)
+        monkeypatch.setattr(parser, 'iter_song_documents', fail)
+        outputdir = os.path.join(dirpath, 'output')
+        argv = ['generate', song_dir, '--output=' + outputdir]
+        assert main.generate(docopt.docopt(main.__doc__, argv=argv)) == 0
+        with open(os.path.join(outputdir, 'html', 'index.html')) as index_file:
+            assert 'one_complete.html' in index_file.read()
+    finally:
+        shutil.rmtree(dirpath)
@@ -0,0 +1,32 @@
+import os
+import shutil
+import tempfile
+from pyleadsheet import parser
+
+SONGS = {
+    'header.yaml': 'title: T\nkey: C\ntime: 4/4\nprogressions: []\nform: []\n',
+    'after_blocks.yaml': 'title: T\nprogressions:\n  - name: a\n    chords: "[C]"\n'
+                         'time: 4/4\nform:\n- progression: a\n  key: not metadata\n'
+                         'key: G\nfeel: swing\n',
+    'folded.yaml': 'feel: >\n  slow\n  swing\nprogressions: []\ntitle: T\n',
+}
+
+
+def test_metadata_matches_full_load():
+    dirpath = tempfile.mkdtemp()
+    try:
+        metadata = {}
+        for filename, content in SONGS.items():
+            filepath = os.path.join(dirpath, filename)
+            with open(filepath, 'w') as song_file:
+                song_file.write(content)
+            metadata[filename] = parser.get_metadata_from_song_file(filepath)
+            document = parser._load_yaml(content)
+            assert metadata[filename] == dict(
+                (k, v) for k, v in document.items() if k in parser.METADATA_KEYS
+            )
+    finally:
+        shutil.rmtree(dirpath)
+    assert metadata['after_blocks.yaml'] == {
+        'title': 'T', 'time': '4/4', 'key': 'G', 'feel': 'swing'
+    }
@@ -0,0 +1,171 @@
+import os
+import sys
+import shutil
+import docopt
+import tempfile
+from pyleadsheet import main
+from pyleadsheet import renderer
+
+# stands in for wkhtmltopdf: logs each launch and each document, then fails the first
+# FAILURES calls for each document whose url contains FAIL_MATCH, sleeps for SLEEP seconds
+# and writes a placeholder pdf.  Like wkhtmltopdf, it reads documents from stdin, one per
+# line, if it is given --read-args-from-stdin
+STUB_CONVERTER = """#!{python}
+import sys, time, shlex
+if sys.argv[1:] == ['--read-args-from-stdin']:
+    documents = [shlex.split(line) for line in sys.stdin if line.strip()]
+else:
+    documents = [sys.argv[1:]]
+with open({log!r} + '.launches', 'a') as launches_file:
+    launches_file.write('%d\\n' % len(documents))
+status = 0
+for url, outputfilepath in documents:
+    with open({log!r}, 'a') as log_file:
+        log_file.write(url + '\\n')
+    with open({log!r}) as log_file:
+        calls = log_file.read().splitlines().count(url)
+    if {fail_match!r} in url and calls <= {failures}:
+        sys.stderr.write('stub failure')
+        status = 1
+        continue
+    time.sleep({sleep})
+    with open(outputfilepath, 'w') as pdf_file:
+        pdf_file.write('%PDF ' + url)
+sys.exit(status)
+"""
+SONG = 'title: Song {0}\nkey: C\ntime: 4/4\nprogressions:\n  - name: A\n    chords: "[C][G]"\n' \
+       'form:\n  - progression: A\n    lyrics: la\n'
+
+
+class _Build(object):
+
+    def __init__(self, num_songs=3, failures=0, fail_match='', sleep=0, **converter_kwargs):
+        self.dirpath = tempfile.mkdtemp()
+        self.log = os.path.join(self.dirpath, 'calls.log')
+        self.command = os.path.join(self.dirpath, 'stub-converter')
+        with open(self.command, 'w') as command_file:
+            command_file.write(STUB_CONVERTER.format(
+                python=sys.executable, log=self.log, failures=failures, fail_match=fail_match,
+                sleep=sleep
+            ))
+        os.chmod(self.command, 0o755)
+        self.songs = []
+        for i in range(num_songs):
+            filepath = os.path.join(self.dirpath, 'song{0}.yaml'.format(i))
+            with open(filepath, 'w') as song_file:
+                song_file.write(SONG.format(i))
+            self.songs.append((filepath, None))
+        self.outputdir = os.path.join(self.dirpath, 'output')
+        self.converter_kwargs = converter_kwargs
+
+    def run(self):
+        html_renderer = renderer.HTMLRenderer(self.outputdir)
+        pdf_converter = renderer.HTMLToPDFConverter(
+            self.outputdir, html_renderer=html_renderer, command=self.command,
+            **self.converter_kwargs
+        )
+        html_renderer.render_songs(self.songs, pdf_converter=pdf_converter)
+        return pdf_converter.convert_songs()
+
+    def get_calls(self):
+        if not os.path.isfile(self.log):
+            return []
+        with open(self.log) as log_file:
+            return log_file.read().splitlines()
+
+    def get_launches(self):
+        if not os.path.isfile(self.log + '.launches'):
+            return []
+        with open(self.log + '.launches') as launches_file:
+            return [int(line) for line in launches_file.read().splitlines()]
+
+    def get_pdfs(self):
+        return sorted(os.listdir(os.path.join(self.outputdir, 'pdf')))
+
+    def close(self):
+        shutil.rmtree(self.dirpath)
+
+
+def test_converts_every_page_once():
+    build = _Build(jobs=3)
+    try:
+        assert build.run() == 0
+        assert len(build.get_calls()) == 9
+        assert build.get_pdfs() == [
+            'song_{0}_{1}.pdf'.format(i, view)
+            for i in range(3) for view in ('complete', 'leadsheet', 'lyrics')
+        ]
+        # nothing has changed, so nothing is converted again
+        assert build.run() == 0
+        assert len(build.get_calls()) == 9
+    finally:
+        build.close()
+
+
+def test_retries_failed_conversions():
+    build = _Build(num_songs=1, failures=2, jobs=2, retries=2)
+    try:
+        assert build.run() == 0
+        assert len(build.get_calls()) == 9
+        assert len(build.get_pdfs()) == 3
+    finally:
+        build.close()
+
+
+def test_gives_up_after_retries():
+    build = _Build(num_songs=1, failures=5, retries=1)
+    try:
+        assert build.run() == 3
+        assert len(build.get_calls()) == 6
+        assert build.get_pdfs() == []
+        # failed pdfs are not recorded, so they are tried again next time
+        build.run()
+        assert len(build.get_calls()) == 12
+    finally:
+        build.close()
+
+
+def test_times_out_slow_conversions():
+    build = _Build(num_songs=1, sleep=30, jobs=3, timeout=1, retries=0)
+    try:
+        assert build.run() == 3
+        assert build.get_pdfs() == []
+    finally:
+        build.close()
+
+
+def test_batches_pages_per_converter_process():
+    build = _Build(jobs=2, batch_size=4)
+    try:
+        assert build.run() == 0
+        assert sorted(build.get_launches()) == [1, 4, 4]
+        assert len(build.get_pdfs()) == 9
+        with open(os.path.join(build.outputdir, 'pdf', 'song_1_lyrics.pdf')) as pdf_file:
+            assert pdf_file.read().endswith('/song_1_lyrics.html')
+    finally:
+        build.close()
+
+
+def test_retries_only_failed_pages_of_a_batch():
+    build = _Build(num_songs=1, failures=1, fail_match='lyrics', batch_size=3)
+    try:
+        assert build.run() == 0
+        assert build.get_launches() == [3, 1]
+        assert len(build.get_pdfs()) == 3
+    finally:
+        build.close()
+
+
+def test_generate_fails_on_failed_conversions(monkeypatch):
+    build = _Build(num_songs=1, failures=5, fail_match='lyrics')
+    try:
+        # generate runs the converter found on the path
+        bindir = os.path.join(build.dirpath, 'bin')
+        os.mkdir(bindir)
+        os.symlink(build.command, os.path.join(bindir, renderer.PDF_CONVERTER_COMMAND))
+        monkeypatch.setenv('PATH', bindir + os.pathsep + os.environ['PATH'])
+        argv = ['generate', build.dirpath, '--output=' + build.outputdir, '--pdf']
+        assert main.generate(docopt.docopt(main.__doc__, argv=argv)) == 1
+        assert len(build.get_pdfs()) == 2
+    finally:
+        build.close()
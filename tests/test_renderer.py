@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import tracemalloc
+from pyleadsheet import renderer
+
+PROGRESSION = '  - name: P{0}\n    chords: "[C][F][G7][C] [A-7][D-7][G7][C:2b][C7:2b]"\n'
+FORM_SECTION = '  - progression: P{0}\n    lyrics: la la la\n'
+
+
+def _write_song(dirpath, num_progressions):
+    filepath = os.path.join(dirpath, 'long{0}.yaml'.format(num_progressions))
+    with open(filepath, 'w') as song_file:
+        song_file.write('title: Long {0}\nkey: C\ntime: 4/4\n'.format(num_progressions))
+        song_file.write('progressions:\n')
+        for i in range(num_progressions):
+            song_file.write(PROGRESSION.format(i))
+        song_file.write('form:\n')
+        for i in range(num_progressions):
+            song_file.write(FORM_SECTION.format(i))
+    return filepath
+
+
+def _measure_render(dirpath, num_progressions):
+    """ Return the peak memory allocated while rendering a song, and the size of the
+        largest page written.  The song is rendered once beforehand, so that parsing it
+        and filling the caches are not counted
+    """
+    filepath = _write_song(dirpath, num_progressions)
+    outputdir = os.path.join(dirpath, 'output{0}'.format(num_progressions))
+    html_renderer = renderer.HTMLRenderer(outputdir)
+    html_renderer.render_song(filepath)
+    tracemalloc.start()
+    try:
+        html_renderer.render_song(filepath)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    htmldir = os.path.join(outputdir, renderer.HTMLRenderer.OUTPUT_SUBDIR)
+    page_size = max(
+        os.path.getsize(os.path.join(htmldir, filename))
+        for filename in os.listdir(htmldir) if filename.endswith('.html')
+    )
+    return peak, page_size
+
+
+def test_render_memory_does_not_grow_with_page():
+    dirpath = tempfile.mkdtemp()
+    try:
+        small_peak, small_page = _measure_render(dirpath, 20)
+        large_peak, large_page = _measure_render(dirpath, 200)
+    finally:
+        shutil.rmtree(dirpath)
+    # pages are streamed to their files, so neither a page nor its measures are held whole
+    assert large_peak < large_page / 10
+    assert large_peak - small_peak < (large_page - small_page) / 10
+
+
+def test_keys_only_hold_views_with_chords(monkeypatch):
+    dirpath = tempfile.mkdtemp()
+    try:
+        filepath = _write_song(dirpath, 2)
+        outputdir = os.path.join(dirpath, 'output')
+        html_renderer = renderer.HTMLRenderer(outputdir)
+
+        title_reads = []
+        get_title = renderer.parser.get_title_from_song_file
+        monkeypatch.setattr(renderer.parser, 'get_title_from_song_file', lambda filepath: (
+            title_reads.append(filepath) or get_title(filepath)
+        ))
+        assert html_renderer.render_songs([(filepath, None)], roots=['D', 'Eb']) == 0
+        # the title is read once, to name the output files, rather than again for every key
+        assert title_reads == [filepath]
+        htmldir = os.path.join(outputdir, renderer.HTMLRenderer.OUTPUT_SUBDIR)
+        assert sorted(os.listdir(os.path.join(htmldir, 'D'))) == [
+            'long_2_complete.html', 'long_2_leadsheet.html'
+        ]
+        lyrics_links = html_renderer._get_index_links('long2', 'Long 2')[2]
+        assert [link['href'] for link in lyrics_links] == ['long_2_lyrics.html']
+    finally:
+        shutil.rmtree(dirpath)
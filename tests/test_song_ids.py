@@ -0,0 +1,57 @@
+import os
+import shutil
+import tempfile
+from pyleadsheet import main
+from pyleadsheet import server
+from pyleadsheet import catalog
+from pyleadsheet import renderer
+
+SONGBOOK = """---
+title: "AC/DC Blues? #1 Ünïcode"
+key: C
+time: 4/4
+progressions:
+  - name: A
+    chords: "[C][G]"
+form:
+  - progression: A
+    lyrics: la
+"""
+SONG_ID = 'hymns.ac_dc_blues_1_ünïcode'
+
+
+def _write_songbook(dirpath):
+    filepath = os.path.join(dirpath, 'hymns.songbook.yaml')
+    with open(filepath, 'w') as songbook:
+        songbook.write(SONGBOOK)
+    return filepath
+
+
+def test_songbook_song_ids_are_safe_filenames():
+    dirpath = tempfile.mkdtemp()
+    try:
+        filepath = _write_songbook(dirpath)
+        outputdir = os.path.join(dirpath, 'output')
+        html_renderer = renderer.HTMLRenderer(outputdir)
+        assert html_renderer.render_songs(main._iter_songs([filepath])) == 0
+        htmldir = os.path.join(outputdir, renderer.HTMLRenderer.OUTPUT_SUBDIR)
+        # written at the top of the html dir, next to the static files it links to
+        assert os.path.isfile(os.path.join(htmldir, SONG_ID + '_complete.html'))
+    finally:
+        shutil.rmtree(dirpath)
+
+
+def test_songbook_song_ids_are_safe_routes(monkeypatch):
+    dirpath = tempfile.mkdtemp()
+    try:
+        _write_songbook(dirpath)
+        monkeypatch.setattr(server.app, 'song_files_dir', dirpath, raising=False)
+        monkeypatch.setattr(server.app, 'catalog', catalog.SongCatalog(), raising=False)
+        client = server.app.test_client()
+        url = server._get_song_view_url('complete', SONG_ID)
+        assert url in client.get('/').get_data(as_text=True)
+        response = client.get(url)
+        assert response.status_code == 200
+        assert 'AC/DC Blues? #1 Ünïcode' in response.get_data(as_text=True)
+    finally:
+        shutil.rmtree(dirpath)